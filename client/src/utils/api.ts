@@ -136,32 +136,45 @@ export const getCalendarEvents = async (
   }
 };
 
+// Status events are returned a page at a time; follows Next-Page-Token until every page is loaded
 export const getStatusEvents = async (): Promise<StatusEvent[]> => {
   try {
-    const resp = await fetch(`${STATUS_SYNCER_SERVER_URL}/status-events`, {
-      headers: await getAuthHeaders(),
-    });
-    if (!resp.ok) {
-      throw new Error("Failed fetching status events");
-    }
-    const data = await resp.json();
-    return (
-      data &&
-      Array.isArray(data) &&
-      data.map((statusEvent: any) => {
-        return {
-          id: statusEvent.id,
-          user_id: statusEvent.user_id,
-          calendar_id: statusEvent.calendar_id,
-          event_id: statusEvent.event_id,
-          start: statusEvent.start,
-          end: statusEvent.end,
-          status_text: statusEvent.status_text,
-          status_emoji: statusEvent.status_emoji,
-          status_expiration: statusEvent.status_expiration,
-        } as StatusEvent;
-      })
-    );
+    const statusEvents: StatusEvent[] = [];
+    let pageToken: string | null = null;
+    do {
+      const query = pageToken
+        ? `?page_token=${encodeURIComponent(pageToken)}`
+        : "";
+      const resp = await fetch(
+        `${STATUS_SYNCER_SERVER_URL}/status-events${query}`,
+        {
+          headers: await getAuthHeaders(),
+        }
+      );
+      if (!resp.ok) {
+        throw new Error("Failed fetching status events");
+      }
+      const data = await resp.json();
+      if (data && Array.isArray(data)) {
+        statusEvents.push(
+          ...data.map((statusEvent: any) => {
+            return {
+              id: statusEvent.id,
+              user_id: statusEvent.user_id,
+              calendar_id: statusEvent.calendar_id,
+              event_id: statusEvent.event_id,
+              start: statusEvent.start,
+              end: statusEvent.end,
+              status_text: statusEvent.status_text,
+              status_emoji: statusEvent.status_emoji,
+              status_expiration: statusEvent.status_expiration,
+            } as StatusEvent;
+          })
+        );
+      }
+      pageToken = resp.headers.get("Next-Page-Token");
+    } while (pageToken);
+    return statusEvents;
   } catch (error) {
     console.error("Error fetching status events:", error);
     throw error;
@@ -0,0 +1,64 @@
+# Benchmarks the per-request overhead of getting a Google Calendar request ready to execute:
+# building a new service per request (the old path), vs. binding the prebuilt service to the
+# request's credentials (src.google_calendar)
+# no requests are sent, so this only measures the CPU/allocation cost on our side
+#
+# usage (from server/):
+#   python -m bench.calendar_service [--iterations N]
+import argparse
+import statistics
+import time
+from google.oauth2 import credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
+from src.google_calendar import calendar_service, http_pool
+
+
+def per_request_build(token: str):
+    cred = credentials.Credentials(token=token)
+    service = build("calendar", "v3", credentials=cred)
+    return service.events().list(calendarId="primary")
+
+
+def prebuilt_service(token: str):
+    cred = credentials.Credentials(token=token)
+    request = calendar_service().events().list(calendarId="primary")
+    with http_pool.connection() as http:
+        AuthorizedHttp(cred, http=http)
+    return request
+
+
+def run(fn, iterations: int) -> list[float]:
+    # warm up once, so one-time costs (i.e., building the template) aren't counted per request
+    fn("warmup")
+    timings = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(f"token-{i}")
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name: str, timings: list[float]):
+    timings = sorted(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(
+        f"{name:<20} mean {statistics.mean(timings):8.3f} ms   "
+        f"p50 {statistics.median(timings):8.3f} ms   p99 {p99:8.3f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    before = run(per_request_build, args.iterations)
+    after = run(prebuilt_service, args.iterations)
+    report("build() per request", before)
+    report("prebuilt service", after)
+    print(f"speedup: {statistics.mean(before) / statistics.mean(after):.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# Sends Google Calendar push notifications to a locally running server,
+# the same way Google does for a watched calendar (see server.watch_calendar_channel)
+# the channel id and token are the ones stored for the channel in the calendar_channels collection
+#
+# usage (from server/):
+#   python -m bench.fake_calendar_notifier --channel-id ID --token TOKEN [--server URL] [--state exists]
+import argparse
+import itertools
+import httpx
+
+_message_numbers = itertools.count(1)
+
+
+def notify(
+    server: str, channel_id: str, token: str, state: str = "exists"
+) -> httpx.Response:
+    return httpx.post(
+        f"{server}/calendar/notifications",
+        headers={
+            "X-Goog-Channel-ID": channel_id,
+            "X-Goog-Channel-Token": token,
+            "X-Goog-Resource-State": state,
+            "X-Goog-Message-Number": str(next(_message_numbers)),
+        },
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", default="http://localhost:8080")
+    parser.add_argument("--channel-id", required=True)
+    parser.add_argument("--token", required=True)
+    parser.add_argument(
+        "--state", default="exists", choices=["sync", "exists", "not_exists"]
+    )
+    args = parser.parse_args()
+
+    response = notify(args.server, args.channel_id, args.token, args.state)
+    print(response.status_code, response.text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# In-memory stand-in for the Cloud Tasks client CloudTasksScheduler uses (create_task, get_task and delete_task)
+# like Cloud Tasks, task names stay reserved after a task is deleted or dispatched, so they can't be reused
+# dispatching is left to the caller: take the due tasks with pop_due(), and send each one's request to the server
+#
+# usage:
+#   server.scheduler.tasks_client = FakeCloudTasks(latency_ms=10)
+import asyncio
+import itertools
+from datetime import datetime
+from urllib.parse import urlsplit
+from google.api_core import exceptions as google_exceptions
+from google.cloud import tasks_v2
+
+
+class FakeCloudTasks:
+    def __init__(self, latency_ms: float = 0):
+        self.latency = latency_ms / 1000
+        # task name -> task
+        self.tasks: dict[str, tasks_v2.Task] = {}
+        # names of deleted and dispatched tasks
+        self.tombstones: set[str] = set()
+        self._ids = itertools.count(1)
+
+    async def create_task(self, request: tasks_v2.CreateTaskRequest) -> tasks_v2.Task:
+        await asyncio.sleep(self.latency)
+        task = request.task
+        if not task.name:
+            task.name = f"{request.parent}/tasks/{next(self._ids)}"
+        if task.name in self.tasks or task.name in self.tombstones:
+            raise google_exceptions.AlreadyExists(f"{task.name} already exists")
+        self.tasks[task.name] = task
+        return task
+
+    async def get_task(self, request: tasks_v2.GetTaskRequest) -> tasks_v2.Task:
+        await asyncio.sleep(self.latency)
+        if request.name not in self.tasks:
+            raise google_exceptions.NotFound(f"{request.name} not found")
+        return self.tasks[request.name]
+
+    async def delete_task(self, request: tasks_v2.DeleteTaskRequest):
+        await asyncio.sleep(self.latency)
+        if request.name not in self.tasks:
+            raise google_exceptions.NotFound(f"{request.name} not found")
+        del self.tasks[request.name]
+        self.tombstones.add(request.name)
+
+    # Removes the tasks due by a given time, returning the path each one's request is sent to
+    def pop_due(self, before: datetime) -> list[str]:
+        due = [
+            name
+            for name, task in self.tasks.items()
+            if task.schedule_time.timestamp() <= before.timestamp()
+        ]
+        paths = []
+        for name in due:
+            task = self.tasks.pop(name)
+            self.tombstones.add(name)
+            paths.append(urlsplit(task.http_request.url).path)
+        return paths
@@ -0,0 +1,263 @@
+# In-memory stand-in for the parts of google.cloud.firestore's AsyncClient the server uses
+# (documents, queries with filters, ordering, cursors and field masks, get_all, batched writes and
+# transactions), so the server can be load tested without the Firestore emulator
+# every round trip waits latency_ms, like a call to Firestore would; transactions are optimistic,
+# and fail with Aborted (so firestore.async_transactional retries them) if a document they read changed
+# stored documents are replaced on every write, never changed in place, so reads and writes only make
+# shallow copies (the server doesn't modify nested values of the data it reads or writes); the load
+# test measures the server, so the fake should cost as little as possible
+#
+# usage:
+#   src.database.db = FakeFirestore(latency_ms=3)
+import asyncio
+import itertools
+import secrets
+import string
+from typing import Any, Optional
+from google.api_core import exceptions as google_exceptions
+
+DOCUMENT_ID_ALPHABET = string.ascii_letters + string.digits
+OPERATORS = {
+    "==": lambda a, b: a == b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+class FakeFirestore:
+    def __init__(self, latency_ms: float = 0):
+        self.latency = latency_ms / 1000
+        # collection -> document id -> (version, data)
+        self.collections: dict[str, dict[str, tuple[int, dict]]] = {}
+        self.round_trips = 0
+        self._versions = itertools.count(1)
+
+    def collection(self, name: str) -> "FakeQuery":
+        return FakeQuery(self, name)
+
+    def batch(self) -> "FakeWriteBatch":
+        return FakeWriteBatch(self)
+
+    def transaction(self) -> "FakeTransaction":
+        return FakeTransaction(self)
+
+    async def get_all(
+        self,
+        refs: list["FakeDocumentReference"],
+        field_paths: Optional[list[str]] = None,
+    ):
+        await self._round_trip()
+        for ref in refs:
+            yield ref._snapshot(field_paths)
+
+    async def _round_trip(self):
+        self.round_trips += 1
+        # always yield to the event loop, like a real round trip would
+        await asyncio.sleep(self.latency)
+
+    def _documents(self, collection: str) -> dict[str, tuple[int, dict]]:
+        return self.collections.setdefault(collection, {})
+
+    def _version(self, ref: "FakeDocumentReference") -> int:
+        stored = self._documents(ref.collection).get(ref.id)
+        return stored[0] if stored else 0
+
+    # Applies writes all at once, failing without applying any if an update is for a missing document
+    def _apply(self, writes: list[tuple[str, "FakeDocumentReference", Optional[dict]]]):
+        for op, ref, _ in writes:
+            if op == "update" and ref.id not in self._documents(ref.collection):
+                raise google_exceptions.NotFound(f"No document to update: {ref.path}")
+        for op, ref, data in writes:
+            documents = self._documents(ref.collection)
+            if op == "delete":
+                documents.pop(ref.id, None)
+                continue
+            if op == "update":
+                data = {**documents[ref.id][1], **data}
+            documents[ref.id] = (next(self._versions), dict(data))
+
+
+class FakeDocumentReference:
+    def __init__(self, client: FakeFirestore, collection: str, id: str):
+        self._client = client
+        self.collection = collection
+        self.id = id
+
+    @property
+    def path(self) -> str:
+        return f"{self.collection}/{self.id}"
+
+    async def get(self, transaction: Optional["FakeTransaction"] = None):
+        await self._client._round_trip()
+        if transaction is not None:
+            transaction._reads[self.path] = (self, self._client._version(self))
+        return self._snapshot()
+
+    async def set(self, data: dict):
+        await self._client._round_trip()
+        self._client._apply([("set", self, data)])
+
+    async def update(self, data: dict):
+        await self._client._round_trip()
+        self._client._apply([("update", self, data)])
+
+    async def delete(self):
+        await self._client._round_trip()
+        self._client._apply([("delete", self, None)])
+
+    def _snapshot(self, fields: Optional[list[str]] = None) -> "FakeSnapshot":
+        stored = self._client._documents(self.collection).get(self.id)
+        data = stored[1] if stored else None
+        if data is not None and fields is not None:
+            data = {field: data[field] for field in fields if field in data}
+        return FakeSnapshot(self, data)
+
+
+class FakeSnapshot:
+    def __init__(self, reference: FakeDocumentReference, data: Optional[dict]):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[dict]:
+        return dict(self._data) if self._data is not None else None
+
+    # like Firestore, raises KeyError for fields the document doesn't have
+    def get(self, field: str) -> Any:
+        return self._data[field]
+
+
+# A collection, or a query on one
+class FakeQuery:
+    def __init__(
+        self,
+        client: FakeFirestore,
+        collection: str,
+        filters: tuple = (),
+        orders: tuple = (),
+        limit: Optional[int] = None,
+        cursor: Optional[dict] = None,
+        fields: Optional[list[str]] = None,
+    ):
+        self._client = client
+        self._collection = collection
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._cursor = cursor
+        self._fields = fields
+
+    def _copy(self, **changes) -> "FakeQuery":
+        query = {
+            "filters": self._filters,
+            "orders": self._orders,
+            "limit": self._limit,
+            "cursor": self._cursor,
+            "fields": self._fields,
+            **changes,
+        }
+        return FakeQuery(self._client, self._collection, **query)
+
+    def document(self, id: Optional[str] = None) -> FakeDocumentReference:
+        if id is None:
+            id = "".join(secrets.choice(DOCUMENT_ID_ALPHABET) for _ in range(20))
+        return FakeDocumentReference(self._client, self._collection, id)
+
+    def where(self, field: str, op: str, value: Any) -> "FakeQuery":
+        return self._copy(filters=(*self._filters, (field, OPERATORS[op], value)))
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "FakeQuery":
+        return self._copy(orders=(*self._orders, field))
+
+    def limit(self, count: int) -> "FakeQuery":
+        return self._copy(limit=count)
+
+    def start_after(self, cursor: dict) -> "FakeQuery":
+        return self._copy(cursor=cursor)
+
+    def select(self, fields: list[str]) -> "FakeQuery":
+        return self._copy(fields=list(fields))
+
+    async def stream(self):
+        await self._client._round_trip()
+        orders = [*self._orders]
+        if "__name__" not in orders:
+            orders.append("__name__")
+        # like Firestore, documents missing a filtered or ordered field aren't matched
+        fields = {field for field, _, _ in self._filters} | set(orders) - {"__name__"}
+
+        matches = []
+        for id, (_, data) in self._client._documents(self._collection).items():
+            if any(field not in data for field in fields):
+                continue
+            if not all(op(data[field], value) for field, op, value in self._filters):
+                continue
+            matches.append(
+                (tuple(id if f == "__name__" else data[f] for f in orders), id)
+            )
+        matches.sort()
+        if self._cursor is not None:
+            cursor = tuple(self._cursor[field] for field in orders)
+            matches = [match for match in matches if match[0] > cursor]
+        if self._limit is not None:
+            matches = matches[: self._limit]
+        for _, id in matches:
+            yield self.document(id)._snapshot(self._fields)
+
+
+class FakeWriteBatch:
+    def __init__(self, client: FakeFirestore):
+        self._client = client
+        self._writes = []
+
+    def set(self, ref: FakeDocumentReference, data: dict):
+        self._writes.append(("set", ref, data))
+
+    def update(self, ref: FakeDocumentReference, data: dict):
+        self._writes.append(("update", ref, data))
+
+    def delete(self, ref: FakeDocumentReference):
+        self._writes.append(("delete", ref, None))
+
+    async def commit(self):
+        await self._client._round_trip()
+        self._client._apply(self._writes)
+
+
+# Implements the hooks firestore.async_transactional drives a transaction through
+class FakeTransaction(FakeWriteBatch):
+    _read_only = False
+    _max_attempts = 5
+
+    def __init__(self, client: FakeFirestore):
+        super().__init__(client)
+        self._id = None
+        # path -> (reference, version read)
+        self._reads = {}
+
+    def _clean_up(self):
+        self._writes = []
+        self._reads = {}
+        self._id = None
+
+    async def _begin(self, retry_id: Optional[bytes] = None):
+        await self._client._round_trip()
+        self._id = secrets.token_bytes(8)
+
+    async def _commit(self):
+        await self._client._round_trip()
+        for ref, version in self._reads.values():
+            if self._client._version(ref) != version:
+                self._clean_up()
+                raise google_exceptions.Aborted(f"{ref.path} changed")
+        self._client._apply(self._writes)
+        self._clean_up()
+
+    async def _rollback(self):
+        self._clean_up()
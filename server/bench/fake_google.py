@@ -0,0 +1,268 @@
+# Local stand-ins for the Google services the server calls: the Calendar API (as an httplib2 transport
+# pool for src.google_calendar), the tokeninfo endpoint and Firebase's signing keys (as httpx transports),
+# and Firebase ID tokens signed with a local key, so requests go through the server's real token verification
+# every call waits latency_ms, like a call to Google would
+#
+# usage:
+#   src.google_calendar.http_pool = FakeCalendarPool(FakeCalendar(latency_ms=40))
+#   server.http_client = httpx.AsyncClient(transport=tokeninfo_transport(client_id))
+#   firebase = FakeFirebase(project_id)
+#   FirebaseTokenVerifier(project_id, keys=firebase.signing_keys()).verify(firebase.id_token(uid))
+import asyncio
+import json
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+import httplib2
+import httpx
+import jwt
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from src.firebase_tokens import FIREBASE_ISSUER_PREFIX, SigningKeys
+
+CALENDAR_API_PATH = "/calendar/v3/"
+EVENT_SUMMARIES = [
+    "Standup",
+    "1:1",
+    "Focus time",
+    "Lunch",
+    "Design review",
+    "Interview",
+]
+
+
+# Every user has the same calendars, each with `events_per_calendar` upcoming events
+# (one every few hours, starting at the next hour); sync tokens are always valid and report no changes
+class FakeCalendar:
+    def __init__(
+        self,
+        calendar_ids: tuple[str, ...] = ("primary", "work"),
+        events_per_calendar: int = 300,
+        latency_ms: float = 0,
+    ):
+        self.calendar_ids = calendar_ids
+        self.latency = latency_ms / 1000
+        self.requests = 0
+        start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        start += timedelta(hours=1)
+        self.events = {
+            calendar_id: [
+                {
+                    "id": f"{calendar_id}-{i}",
+                    "status": "confirmed",
+                    "summary": EVENT_SUMMARIES[i % len(EVENT_SUMMARIES)],
+                    "colorId": str(i % 11 + 1),
+                    "start": {"dateTime": (start + timedelta(hours=3 * i)).isoformat()},
+                    "end": {
+                        "dateTime": (
+                            start + timedelta(hours=3 * i, minutes=30 + 30 * (i % 2))
+                        ).isoformat()
+                    },
+                }
+                for i in range(events_per_calendar)
+            ]
+            for calendar_id in calendar_ids
+        }
+
+    def calendar(self, calendar_id: str) -> dict:
+        return {
+            "id": calendar_id,
+            "summary": calendar_id.title(),
+            "backgroundColor": "#9fe1e7",
+            "foregroundColor": "#000000",
+            "timeZone": "America/New_York",
+        }
+
+    # Returns (status, body) for a Calendar API request
+    def handle(self, method: str, uri: str, body: Optional[str]) -> tuple[int, dict]:
+        self.requests += 1
+        url = urlsplit(uri)
+        path = [
+            unquote(part) for part in url.path.split(CALENDAR_API_PATH, 1)[1].split("/")
+        ]
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if path == ["users", "me", "calendarList"]:
+            return 200, {"items": [self.calendar(id) for id in self.calendar_ids]}
+        if path[:3] == ["users", "me", "calendarList"]:
+            return 200, self.calendar(path[3])
+        if path == ["colors"]:
+            return 200, {
+                "event": {
+                    str(i): {"background": "#a4bdfc", "foreground": "#1d1d1d"}
+                    for i in range(1, 12)
+                }
+            }
+        if path[0] == "calendars" and path[2:] == ["events"]:
+            return 200, self.list_events(path[1], query)
+        if path[0] == "calendars" and path[2:] == ["events", "watch"]:
+            expiration = datetime.now(timezone.utc) + timedelta(days=7)
+            return 200, {
+                "kind": "api#channel",
+                "id": json.loads(body)["id"],
+                "resourceId": f"resource-{path[1]}",
+                "expiration": str(int(expiration.timestamp() * 1000)),
+            }
+        if path == ["channels", "stop"]:
+            return 204, {}
+        return 404, {"error": {"code": 404, "message": "Not Found"}}
+
+    def list_events(self, calendar_id: str, query: dict) -> dict:
+        if calendar_id not in self.events:
+            return {"items": []}
+        if "syncToken" in query:
+            return {"items": [], "nextSyncToken": secrets.token_hex(8)}
+        time_min = datetime.fromisoformat(query["timeMin"])
+        time_max = datetime.fromisoformat(query["timeMax"])
+        events = [
+            event
+            for event in self.events[calendar_id]
+            if datetime.fromisoformat(event["end"]["dateTime"]) > time_min
+            and datetime.fromisoformat(event["start"]["dateTime"]) < time_max
+        ]
+        offset = int(query.get("pageToken", 0))
+        page_size = int(query.get("maxResults", 250))
+        page = {"items": events[offset : offset + page_size]}
+        if offset + page_size < len(events):
+            page["nextPageToken"] = str(offset + page_size)
+        else:
+            page["nextSyncToken"] = secrets.token_hex(8)
+        return page
+
+
+# httplib2.Http stand-in, answering requests from a FakeCalendar
+# requests are executed in the threadpool, so latency blocks the thread like a real request would
+class FakeCalendarHttp:
+    def __init__(self, calendar: FakeCalendar):
+        self.calendar = calendar
+        self.timeout = 10
+        self.connections = {}
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        if self.calendar.latency:
+            time.sleep(self.calendar.latency)
+        status, data = self.calendar.handle(method, uri, body)
+        response = httplib2.Response(
+            {"status": str(status), "content-type": "application/json"}
+        )
+        return response, (json.dumps(data).encode() if status != 204 else b"")
+
+
+# Drop-in for src.google_calendar.http_pool
+class FakeCalendarPool:
+    def __init__(self, calendar: FakeCalendar):
+        self.calendar = calendar
+        self._local = threading.local()
+
+    @contextmanager
+    def connection(self):
+        if not hasattr(self._local, "http"):
+            self._local.http = FakeCalendarHttp(self.calendar)
+        yield self._local.http
+
+
+# Transport for the server's http_client, answering tokeninfo requests for any access token
+def tokeninfo_transport(client_id: str, latency_ms: float = 0) -> httpx.MockTransport:
+    async def handle(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency_ms / 1000)
+        expires_in = 3600
+        return httpx.Response(
+            200,
+            json={
+                "aud": client_id,
+                "azp": client_id,
+                "scope": "https://www.googleapis.com/auth/calendar",
+                "exp": str(int(time.time()) + expires_in),
+                "expires_in": str(expires_in),
+            },
+        )
+
+    return httpx.MockTransport(handle)
+
+
+# Signs Firebase ID tokens with a local key, and serves its certificate the way Google serves its keys
+class FakeFirebase:
+    def __init__(self, project_id: str, latency_ms: float = 0):
+        self.project_id = project_id
+        self.latency = latency_ms / 1000
+        self.kid = secrets.token_hex(20)
+        self.private_key = rsa.generate_private_key(
+            public_exponent=65537, key_size=2048
+        )
+        self.certificate = self_signed_certificate(self.private_key, "securetoken")
+
+    def id_token(self, uid: str, email: Optional[str] = None, ttl: int = 3600) -> str:
+        now = int(time.time())
+        claims = {
+            "iss": FIREBASE_ISSUER_PREFIX + self.project_id,
+            "aud": self.project_id,
+            "sub": uid,
+            "user_id": uid,
+            "email": email or f"{uid}@example.com",
+            "name": uid,
+            "iat": now,
+            "auth_time": now,
+            "exp": now + ttl,
+        }
+        return jwt.encode(
+            claims, self.private_key, algorithm="RS256", headers={"kid": self.kid}
+        )
+
+    def signing_keys(self) -> SigningKeys:
+        async def handle(request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(self.latency)
+            pem = self.certificate.public_bytes(serialization.Encoding.PEM).decode()
+            return httpx.Response(
+                200,
+                json={self.kid: pem},
+                headers={"Cache-Control": "public, max-age=3600"},
+            )
+
+        keys = SigningKeys(url="https://firebase.bench/keys")
+        keys._http = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+        return keys
+
+
+def self_signed_certificate(key: rsa.RSAPrivateKey, name: str) -> x509.Certificate:
+    subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)])
+    now = datetime.now(timezone.utc)
+    return (
+        x509.CertificateBuilder()
+        .subject_name(subject)
+        .issuer_name(subject)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+
+
+# Writes a service account key file that isn't valid with Google, so clients that look up
+# default credentials when they're created (i.e., Cloud Tasks) can be created without real credentials
+def write_service_account(path: str, project_id: str):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    with open(path, "w") as file:
+        json.dump(
+            {
+                "type": "service_account",
+                "project_id": project_id,
+                "private_key_id": secrets.token_hex(20),
+                "private_key": pem,
+                "client_email": f"bench@{project_id}.iam.gserviceaccount.com",
+                "client_id": "1",
+                "token_uri": "https://oauth2.googleapis.com/token",
+            },
+            file,
+        )
@@ -0,0 +1,121 @@
+# Local stand-in for the parts of the Slack Web API the server uses
+# (oauth.v2.access, emoji.list and users.profile.set), with Slack-style rate limiting
+# point the server at it with SLACK_API_BASE_URL=http://localhost:<port>
+#
+# usage (from server/):
+#   python -m bench.fake_slack [--port 8091] [--rate-limit 10] [--emojis 2000] [--latency-ms 0]
+import argparse
+import asyncio
+import time
+from collections import defaultdict, deque
+from urllib.parse import parse_qs
+from fastapi import FastAPI, Header, Request
+from fastapi.responses import JSONResponse
+
+
+def create_app(
+    rate_limit: int = 0, emoji_count: int = 2000, latency_ms: float = 0
+) -> FastAPI:
+    app = FastAPI()
+    # token -> times of recent users.profile.set calls, for rate limiting
+    calls = defaultdict(deque)
+    # token -> latest profile set, so runs can check what was applied
+    app.state.profiles = {}
+    app.state.profile_sets = 0
+
+    def token_from(authorization: str) -> str:
+        return (authorization or "").removeprefix("Bearer ")
+
+    # Slack's limits are per minute; responds with a 429 and Retry-After once the limit is hit
+    def rate_limited(token: str):
+        if not rate_limit:
+            return None
+        now = time.monotonic()
+        recent = calls[token]
+        while recent and recent[0] <= now - 60:
+            recent.popleft()
+        if len(recent) >= rate_limit:
+            retry_after = int(60 - (now - recent[0])) + 1
+            return JSONResponse(
+                {"ok": False, "error": "ratelimited"},
+                status_code=429,
+                headers={"Retry-After": str(retry_after)},
+            )
+        recent.append(now)
+        return None
+
+    @app.middleware("http")
+    async def add_latency(request: Request, call_next):
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        return await call_next(request)
+
+    @app.post("/oauth.v2.access")
+    async def oauth_access(request: Request):
+        # form encoded, parsed by hand so python-multipart isn't needed
+        code = parse_qs((await request.body()).decode())["code"][0]
+        return {
+            "ok": True,
+            "authed_user": {"id": f"U{code}", "access_token": f"xoxp-{code}"},
+            "team": {"id": "T0001"},
+        }
+
+    @app.get("/emoji.list")
+    async def emoji_list(
+        include_categories: str = None, authorization: str = Header(None)
+    ):
+        if not token_from(authorization):
+            return {"ok": False, "error": "not_authed"}
+        data = {
+            "ok": True,
+            "emoji": {
+                f"custom_{i}": f"https://emoji.slack-edge.com/T0001/custom_{i}.png"
+                for i in range(emoji_count)
+            },
+        }
+        if include_categories:
+            data["categories"] = [
+                {"name": "smileys_people", "emoji_names": ["smile", "wave", "tada"]},
+                {"name": "objects", "emoji_names": ["calendar", "palm_tree"]},
+            ]
+        return data
+
+    @app.post("/users.profile.set")
+    async def profile_set(request: Request, authorization: str = Header(None)):
+        token = token_from(authorization)
+        if not token:
+            return {"ok": False, "error": "not_authed"}
+        limited = rate_limited(token)
+        if limited:
+            return limited
+        body = await request.json()
+        app.state.profiles[token] = body["profile"]
+        app.state.profile_sets += 1
+        return {"ok": True, "profile": body["profile"]}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument(
+        "--rate-limit",
+        type=int,
+        default=0,
+        help="users.profile.set calls allowed per token per minute (0 for no limit)",
+    )
+    parser.add_argument("--emojis", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(args.rate_limit, args.emojis, args.latency_ms),
+        port=args.port,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
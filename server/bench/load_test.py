@@ -0,0 +1,452 @@
+# Load tests the server in-process, with every service it calls replaced by a local fake:
+# Firestore (in memory, or the emulator at FIRESTORE_EMULATOR_HOST), Slack (bench.fake_slack),
+# Google Calendar, tokeninfo and Firebase's signing keys (bench.fake_google), and Cloud Tasks (bench.fake_cloud_tasks)
+# requests go through the whole app (middleware, token verification, routes) over an in-process ASGI transport;
+# only the Cloud Tasks OIDC check on the sync endpoint is skipped, since those tokens can't be signed locally
+#
+# workloads:
+#   dashboard:  every user loads the dashboard (user, calendars, events, status events, rules, emojis), a few times
+#   bulk:       every user creates a batch of status events for their calendar events, plus a few one at a time
+#   sync_storm: every user has a status starting at the same moment (i.e., 9:00 AM); once it's due,
+#               all of their syncs are dispatched at once, the way Cloud Tasks would
+#
+# reports throughput and p50/p95/p99 latency per endpoint; with --baseline, exits with 1 if any endpoint
+# is slower, slower to get through, or failing more than the baseline (save one from a known good run with --save-baseline)
+#
+# usage (from server/):
+#   python -m bench.load_test [--users 50] [--workloads dashboard,bulk,sync_storm] [--firestore memory|emulator]
+#                             [--baseline PATH] [--save-baseline PATH] [--tolerance 0.5]
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+import httpx
+from bench import fake_slack
+from bench.fake_cloud_tasks import FakeCloudTasks
+from bench.fake_firestore import FakeFirestore
+from bench.fake_google import (
+    FakeCalendar,
+    FakeCalendarPool,
+    FakeFirebase,
+    tokeninfo_transport,
+    write_service_account,
+)
+
+PROJECT_ID = "bench-project"
+GOOGLE_CLIENT_ID = "bench-client-id"
+SERVER_BASE_URL = "http://server.bench"
+WORKLOADS = ["dashboard", "bulk", "sync_storm"]
+# Users are spread across this many Slack workspaces, like they would be in production
+# (Slack's per-workspace rate limits would otherwise throttle a storm of users in a single one)
+SLACK_WORKSPACES = 10
+# Latencies that are more than the tolerance above the baseline, but by less than this, aren't regressions
+# (so sub-millisecond endpoints don't fail runs on noise)
+REGRESSION_MIN_MS = 2.0
+
+
+class BenchUser(NamedTuple):
+    uid: str
+    headers: dict
+
+
+class Sample(NamedTuple):
+    start: float
+    end: float
+    ok: bool
+
+
+# The server reads its configuration from the environment when it's imported, so this runs first
+def configure_environment(firestore: str):
+    credentials = os.path.join(tempfile.mkdtemp(), "service-account.json")
+    write_service_account(credentials, PROJECT_ID)
+    # never pick up real credentials, so nothing can reach Google by accident
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials
+    os.environ["SCHEDULER_BACKEND"] = "cloud_tasks"
+    # the Firebase Auth emulator would skip the server's own token verification
+    os.environ.pop("FIREBASE_AUTH_EMULATOR_HOST", None)
+    for name, value in {
+        "GOOGLE_CLOUD_PROJECT": PROJECT_ID,
+        "FIREBASE_PROJECT_ID": PROJECT_ID,
+        "GOOGLE_CLIENT_ID": GOOGLE_CLIENT_ID,
+        "SERVER_BASE_URL": SERVER_BASE_URL,
+        "CLIENT_BASE_URL": "http://client.bench",
+        "GOOGLE_CLOUD_PROJECT_ID": PROJECT_ID,
+        "GOOGLE_CLOUD_LOCATION": "us-central1",
+        "GOOGLE_CLOUD_QUEUE_NAME": "status-syncs",
+        "GOOGLE_CLOUD_SERVICE_ACCOUNT": f"tasks@{PROJECT_ID}.iam.gserviceaccount.com",
+    }.items():
+        os.environ.setdefault(name, value)
+    if firestore == "emulator" and not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        sys.exit("--firestore emulator needs FIRESTORE_EMULATOR_HOST to be set")
+
+
+class LoadTest:
+    def __init__(self, args):
+        # imported here, once the environment is configured
+        import src.database as database
+        import src.google_calendar as google_calendar
+        import src.server as server
+        from src.firebase_tokens import FirebaseTokenVerifier
+        from src.slack import slack_client
+
+        self.args = args
+        self.server = server
+        self.database = database
+        if args.firestore == "memory":
+            database.db = FakeFirestore(args.firestore_latency_ms)
+        self.calendar = FakeCalendar(latency_ms=args.calendar_latency_ms)
+        google_calendar.http_pool = FakeCalendarPool(self.calendar)
+        server.http_client = httpx.AsyncClient(
+            transport=tokeninfo_transport(GOOGLE_CLIENT_ID, args.tokeninfo_latency_ms)
+        )
+        self.firebase = FakeFirebase(PROJECT_ID)
+        server.firebase_token_verifier = FirebaseTokenVerifier(
+            PROJECT_ID, keys=self.firebase.signing_keys()
+        )
+        self.slack = fake_slack.create_app(latency_ms=args.slack_latency_ms)
+        slack_client._http = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=self.slack), base_url="http://slack.bench"
+        )
+        self.tasks = FakeCloudTasks(args.tasks_latency_ms)
+        server.scheduler.tasks_client = self.tasks
+        server.app.dependency_overrides[server.verify_google_cloud_auth] = lambda: {
+            "email": os.environ["GOOGLE_CLOUD_SERVICE_ACCOUNT"]
+        }
+
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=server.app),
+            base_url=SERVER_BASE_URL,
+            timeout=120,
+        )
+        self.users: list[BenchUser] = []
+        # (workload, endpoint) -> samples
+        self.samples: dict[tuple[str, str], list[Sample]] = defaultdict(list)
+        self.workload = "setup"
+        self.failures: list[str] = []
+
+    async def request(
+        self, endpoint: str, method: str, url: str, user: BenchUser = None, **kwargs
+    ) -> httpx.Response:
+        if user:
+            kwargs["headers"] = user.headers
+        start = time.perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        if self.workload != "setup":
+            self.samples[(self.workload, endpoint)].append(
+                Sample(start, time.perf_counter(), response.status_code < 400)
+            )
+        return response
+
+    # Signs every user up, and connects them to Slack; half of them also get a status rule
+    async def setup(self):
+        for i in range(self.args.users):
+            uid = f"bench-user-{i}"
+            self.users.append(
+                BenchUser(
+                    uid,
+                    {
+                        "Authorization": f"Bearer {self.firebase.id_token(uid)}",
+                        "X-OAuth-Access-Token": f"bench-access-token-{i}",
+                    },
+                )
+            )
+
+        async def setup_user(i: int, user: BenchUser):
+            response = await self.request("", "GET", "/users/me", user)
+            response.raise_for_status()
+            stored = await self.database.get_user_by_id(response.json()["id"])
+            stored.slack_user_id = f"U{i:06d}"
+            stored.slack_access_token = f"xoxp-bench-{i}"
+            stored.slack_team_id = f"T{i % SLACK_WORKSPACES:04d}"
+            await self.database.update_user(stored)
+            if i % 2 == 0:
+                rules = [
+                    {
+                        "summary_pattern": "lunch",
+                        "status_text": "Out to lunch",
+                        "status_emoji": {"name": "sandwich"},
+                    }
+                ]
+                response = await self.request(
+                    "", "PUT", "/status-rules", user, json=rules
+                )
+                response.raise_for_status()
+
+        await asyncio.gather(
+            *[setup_user(i, user) for i, user in enumerate(self.users)]
+        )
+
+    async def dashboard(self):
+        async def load(user: BenchUser):
+            calendar_ids = [("calendar_ids", id) for id in self.calendar.calendar_ids]
+            await asyncio.gather(
+                self.request("GET /users/me", "GET", "/users/me", user),
+                self.request("GET /calendars", "GET", "/calendars", user),
+                self.request(
+                    "GET /events", "GET", "/events", user, params=calendar_ids
+                ),
+                self.request("GET /status-events", "GET", "/status-events", user),
+                self.request("GET /status-rules", "GET", "/status-rules", user),
+                self.request("GET /slack/emojis", "GET", "/slack/emojis", user),
+            )
+
+        # the first round loads everything from the fakes, later ones sync from what's stored
+        for _ in range(self.args.rounds):
+            await asyncio.gather(*[load(user) for user in self.users])
+
+    async def bulk(self):
+        batch_events, *other_calendars = [
+            self.calendar.events[id] for id in self.calendar.calendar_ids
+        ]
+        single_events = [event for events in other_calendars for event in events]
+
+        def status_event(calendar_id: str, event: dict) -> dict:
+            return {
+                "calendar_id": calendar_id,
+                "event_id": event["id"],
+                "start": event["start"]["dateTime"],
+                "end": event["end"]["dateTime"],
+                "status_text": "In a meeting",
+                "status_emoji": {"name": "calendar"},
+            }
+
+        async def create(user: BenchUser):
+            batch = [
+                status_event(self.calendar.calendar_ids[0], event)
+                for event in batch_events[: self.args.events_per_user]
+            ]
+            response = await self.request(
+                "POST /status-events:batch",
+                "POST",
+                "/status-events:batch",
+                user,
+                json={"status_events": batch},
+            )
+            if response.status_code == 200:
+                failed = [r for r in response.json() if r["status"] != 200]
+                if failed:
+                    self.failures.append(
+                        f"{len(failed)} batch items failed for {user.uid}"
+                    )
+            await asyncio.gather(
+                *[
+                    self.request(
+                        "POST /status-events",
+                        "POST",
+                        "/status-events",
+                        user,
+                        json=status_event(event["id"].split("-")[0], event),
+                    )
+                    for event in single_events[: self.args.single_events_per_user]
+                ]
+            )
+
+        await asyncio.gather(*[create(user) for user in self.users])
+
+    async def sync_storm(self):
+        # whole seconds, like a meeting starting on the hour
+        at = (
+            datetime.now(timezone.utc) + timedelta(seconds=self.args.storm_lead)
+        ).replace(microsecond=0)
+
+        async def create(user: BenchUser):
+            response = await self.request(
+                "POST /status-events",
+                "POST",
+                "/status-events",
+                user,
+                json={
+                    "calendar_id": "primary",
+                    "event_id": "storm",
+                    "start": at.isoformat(),
+                    "end": (at + timedelta(minutes=30)).isoformat(),
+                    "status_text": "Standup",
+                    "status_emoji": {"name": "speaking_head_in_silhouette"},
+                },
+            )
+            response.raise_for_status()
+
+        await asyncio.gather(*[create(user) for user in self.users])
+        await asyncio.sleep(max((at - datetime.now(timezone.utc)).total_seconds(), 0))
+
+        paths = self.tasks.pop_due(datetime.now(timezone.utc))
+        profile_sets = self.slack.state.profile_sets
+        await asyncio.gather(
+            *[
+                self.request(
+                    "POST /status-events/{id}/sync",
+                    "POST",
+                    path,
+                    headers={"Authorization": "Bearer cloud-tasks"},
+                )
+                for path in paths
+            ]
+        )
+        applied = self.slack.state.profile_sets - profile_sets
+        if applied != len(self.users):
+            self.failures.append(
+                f"sync storm set {applied} Slack statuses for {len(self.users)} users"
+            )
+
+    async def run(self) -> dict:
+        async with self.server.app.router.lifespan_context(self.server.app):
+            await self.setup()
+            for workload in self.args.workloads:
+                self.workload = workload
+                await getattr(self, workload)()
+        return summarize(self.samples)
+
+
+def percentile(timings: list[float], fraction: float) -> float:
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+# "<workload> <endpoint>" -> count, errors, p50/p95/p99 latency (ms), and throughput (requests per second
+# over the span from the endpoint's first request starting to its last one finishing)
+def summarize(samples: dict[tuple[str, str], list[Sample]]) -> dict:
+    results = {}
+    for (workload, endpoint), endpoint_samples in samples.items():
+        timings = sorted((s.end - s.start) * 1000 for s in endpoint_samples)
+        span = max(s.end for s in endpoint_samples) - min(
+            s.start for s in endpoint_samples
+        )
+        results[f"{workload} {endpoint}"] = {
+            "count": len(timings),
+            "errors": sum(not s.ok for s in endpoint_samples),
+            "p50_ms": round(percentile(timings, 0.50), 3),
+            "p95_ms": round(percentile(timings, 0.95), 3),
+            "p99_ms": round(percentile(timings, 0.99), 3),
+            "throughput": round(len(timings) / span, 2) if span else 0.0,
+        }
+    return results
+
+
+def report(results: dict):
+    print(
+        f"{'endpoint':<48} {'count':>6} {'errors':>6} {'p50 ms':>9} "
+        f"{'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:<48} {result['count']:>6} {result['errors']:>6} {result['p50_ms']:>9.1f} "
+            f"{result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['throughput']:>9.1f}"
+        )
+
+
+# Returns a description of every endpoint that did worse than the baseline by more than the tolerance
+def regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    found = []
+    for name, base in baseline.items():
+        result = results.get(name)
+        if result is None:
+            continue
+        for field in ("p95_ms", "p99_ms"):
+            limit = max(base[field] * (1 + tolerance), base[field] + REGRESSION_MIN_MS)
+            if result[field] > limit:
+                found.append(f"{name}: {field} {result[field]:.1f} > {limit:.1f}")
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            found.append(
+                f"{name}: throughput {result['throughput']:.1f} < "
+                f"{base['throughput'] * (1 - tolerance):.1f} req/s"
+            )
+        if result["errors"] > base["errors"]:
+            found.append(
+                f"{name}: {result['errors']} errors (baseline {base['errors']})"
+            )
+    return found
+
+
+# Settings that change the results, stored with baselines so runs are only compared to like runs
+def run_config(args) -> dict:
+    return {
+        name: getattr(args, name)
+        for name in (
+            "workloads",
+            "users",
+            "rounds",
+            "events_per_user",
+            "single_events_per_user",
+            "firestore",
+            "firestore_latency_ms",
+            "calendar_latency_ms",
+            "slack_latency_ms",
+            "tokeninfo_latency_ms",
+            "tasks_latency_ms",
+        )
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument(
+        "--workloads",
+        default=",".join(WORKLOADS),
+        help=f"comma separated, run in order (from {', '.join(WORKLOADS)})",
+    )
+    parser.add_argument(
+        "--rounds", type=int, default=3, help="dashboard loads per user"
+    )
+    parser.add_argument("--events-per-user", type=int, default=100)
+    parser.add_argument("--single-events-per-user", type=int, default=5)
+    parser.add_argument(
+        "--storm-lead",
+        type=float,
+        default=3,
+        help="seconds between creating the sync storm's status events and their start",
+    )
+    parser.add_argument("--firestore", choices=["memory", "emulator"], default="memory")
+    parser.add_argument("--firestore-latency-ms", type=float, default=3)
+    parser.add_argument("--calendar-latency-ms", type=float, default=40)
+    parser.add_argument("--slack-latency-ms", type=float, default=30)
+    parser.add_argument("--tokeninfo-latency-ms", type=float, default=20)
+    parser.add_argument("--tasks-latency-ms", type=float, default=10)
+    parser.add_argument(
+        "--baseline", help="fail if results regressed from this baseline"
+    )
+    parser.add_argument("--save-baseline", help="save results as a baseline here")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="fraction latency or throughput can be worse than the baseline by",
+    )
+    args = parser.parse_args()
+    args.workloads = [name for name in args.workloads.split(",") if name]
+    unknown = set(args.workloads) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(sorted(unknown))}")
+
+    configure_environment(args.firestore)
+    load_test = LoadTest(args)
+    results = asyncio.run(load_test.run())
+    report(results)
+
+    failed = False
+    for failure in load_test.failures:
+        print(f"FAILED: {failure}")
+        failed = True
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as file:
+            json.dump({"config": run_config(args), "results": results}, file, indent=2)
+            file.write("\n")
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline["config"] != run_config(args):
+            print("warning: baseline was saved with different settings")
+        found = regressions(results, baseline["results"], args.tolerance)
+        for regression in found:
+            print(f"REGRESSION: {regression}")
+        failed = failed or bool(found)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# Measures what a cold start costs: Cloud Run scales to zero, so a new instance starts a fresh interpreter,
+# imports the server, runs its startup, and only then answers its first request
+#
+# import profile: imports the server once with `python -X importtime`, and reports the total import time,
+#                 the time spent in each package, and the slowest modules
+# startup:        starts the server in --runs fresh processes, each timing the interpreter starting, importing
+#                 the server, its startup (lifespan), and its first response; for GET / and for an authenticated
+#                 GET /users/me (token verification, then Firestore), which is what a cold instance usually gets first
+#                 the first response also waits on anything startup kicked off in the background
+#                 (i.e., the rule evaluator's first pass, which imports Firestore), like it would on a real instance
+#
+# services the server calls are replaced by the fakes load_test.py uses, but only once the server is imported,
+# so nothing they import is counted (the child processes don't import load_test.py until then);
+# with --firestore emulator, the first request uses a real Firestore client (against FIRESTORE_EMULATOR_HOST),
+# so it includes importing and creating it, like it would on a real instance
+#
+# usage (from server/):
+#   python -m bench.startup [--runs 5] [--top 20] [--firestore memory|emulator]
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+# Line the child process reports its timings on (anything the server prints is ignored)
+RESULT_PREFIX = "startup-result "
+PHASES = ["interpreter", "import", "startup", "first_response", "first_user_response"]
+IMPORTTIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+# Namespace packages, whose modules are grouped by their first two components (i.e., google.cloud)
+NAMESPACE_PACKAGES = {"google", "google.cloud"}
+
+
+# Returns (module, self ms, cumulative ms, depth) for every module `import src.server` imports
+def import_profile() -> list[tuple[str, float, float, int]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.server"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"importing the server failed:\n{result.stderr}")
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            modules.append(
+                (
+                    module,
+                    int(self_us) / 1000,
+                    int(cumulative_us) / 1000,
+                    len(indent) // 2,
+                )
+            )
+    return modules
+
+
+def package(module: str) -> str:
+    parts = module.split(".")
+    name = parts[0]
+    for part in parts[1:]:
+        if name not in NAMESPACE_PACKAGES:
+            break
+        name += "." + part
+    return name
+
+
+def report_import_profile(modules: list[tuple[str, float, float, int]], top: int):
+    total = next(
+        cumulative for module, _, cumulative, _ in modules if module == "src.server"
+    )
+    print(f"import src.server: {total:.0f} ms, {len(modules)} modules\n")
+
+    packages = defaultdict(float)
+    for module, self_ms, _, _ in modules:
+        packages[package(module)] += self_ms
+    print(f"{'package':<40} {'ms':>8} {'share':>7}")
+    for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"{name:<40} {ms:>8.1f} {ms / total:>7.1%}")
+
+    print(f"\n{'module':<48} {'self ms':>8} {'cumulative ms':>14}")
+    slowest = sorted(modules, key=lambda module: -module[1])[:top]
+    for module, self_ms, cumulative, _ in slowest:
+        print(f"{module:<48} {self_ms:>8.1f} {cumulative:>14.1f}")
+
+
+# Runs in a fresh process: imports and starts the server, then sends it its first requests
+# spawned_at is when the parent started the process, so interpreter startup is included
+async def measure_startup(spawned_at: float, firestore: str) -> dict:
+    timings = {"interpreter": (time.time() - spawned_at) * 1000}
+    start = time.perf_counter()
+    import src.server as server
+
+    timings["import"] = (time.perf_counter() - start) * 1000
+
+    # not timed: these import and set up the fakes, which a real instance never does
+    import httpx
+    import src.database as database
+    from bench.load_test import GOOGLE_CLIENT_ID, PROJECT_ID, SERVER_BASE_URL
+    from bench.fake_cloud_tasks import FakeCloudTasks
+    from bench.fake_firestore import FakeFirestore
+    from bench.fake_google import FakeFirebase, tokeninfo_transport
+    from src.firebase_tokens import FirebaseTokenVerifier
+
+    if firestore == "memory":
+        database.db = FakeFirestore()
+    firebase = FakeFirebase(PROJECT_ID)
+    server.firebase_token_verifier = FirebaseTokenVerifier(
+        PROJECT_ID, keys=firebase.signing_keys()
+    )
+    server.http_client = httpx.AsyncClient(
+        transport=tokeninfo_transport(GOOGLE_CLIENT_ID)
+    )
+    server.scheduler.tasks_client = FakeCloudTasks()
+    headers = {
+        "Authorization": f"Bearer {firebase.id_token('startup-user')}",
+        "X-OAuth-Access-Token": "startup-access-token",
+    }
+    client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=server.app), base_url=SERVER_BASE_URL
+    )
+
+    start = time.perf_counter()
+    async with server.app.router.lifespan_context(server.app):
+        timings["startup"] = (time.perf_counter() - start) * 1000
+        for phase, path, request_headers in (
+            ("first_response", "/", None),
+            ("first_user_response", "/users/me", headers),
+        ):
+            start = time.perf_counter()
+            response = await client.get(path, headers=request_headers)
+            timings[phase] = (time.perf_counter() - start) * 1000
+            if response.status_code >= 400:
+                raise RuntimeError(f"GET {path} failed: {response.status_code}")
+    return timings
+
+
+def run_child(firestore: str) -> dict:
+    spawned_at = time.time()
+    result = subprocess.run(
+        [sys.executable, "-m", "bench.startup", "--child", "--firestore", firestore],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "BENCH_SPAWNED_AT": repr(spawned_at)},
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX) :])
+    sys.exit(f"starting the server failed:\n{result.stdout}{result.stderr}")
+
+
+def report_startup(runs: list[dict]):
+    print(f"{'phase':<24} {'median ms':>10} {'min ms':>9} {'max ms':>9}")
+    for phase in PHASES + ["total"]:
+        values = [
+            sum(run[name] for name in PHASES) if phase == "total" else run[phase]
+            for run in runs
+        ]
+        print(
+            f"{phase:<24} {statistics.median(values):>10.1f} "
+            f"{min(values):>9.1f} {max(values):>9.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to start")
+    parser.add_argument(
+        "--top", type=int, default=20, help="packages and modules to list"
+    )
+    parser.add_argument("--firestore", choices=["memory", "emulator"], default="memory")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # the environment is set up by the parent, and inherited by every process it starts
+    if args.child:
+        spawned_at = float(os.environ["BENCH_SPAWNED_AT"])
+        timings = asyncio.run(measure_startup(spawned_at, args.firestore))
+        print(RESULT_PREFIX + json.dumps(timings), flush=True)
+        return
+
+    from bench.load_test import configure_environment
+
+    configure_environment(args.firestore)
+    report_import_profile(import_profile(), args.top)
+    print()
+    report_startup([run_child(args.firestore) for _ in range(args.runs)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, Union
+from src.metrics import CACHE_LOOKUPS
+
+_MISSING = object()
+
+
+# Key for caching anything derived from a secret (i.e., tokens),
+# so the raw secret is never held as a dict key
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+# Bounded in-process cache where each entry expires at its own deadline;
+# once full, the least recently used entry is evicted
+# hits and misses are counted in the cache_lookups_total metric, under the cache's name
+class TTLCache:
+    def __init__(self, name: str, max_size: int, ttl: Optional[float] = None):
+        self.name = name
+        self.max_size = max_size
+        # default time to live (in seconds) for entries set without one
+        self.ttl = ttl
+        self._hits = CACHE_LOOKUPS.labels(name, "hit")
+        self._misses = CACHE_LOOKUPS.labels(name, "miss")
+        # key -> (monotonic expiry, value), ordered from least to most recently used
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        # key -> load in progress, so concurrent misses share a single call
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses.inc()
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self._misses.inc()
+            return default
+        self._entries.move_to_end(key)
+        self._hits.inc()
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        # nothing to cache if the value is already expired
+        if ttl is None or ttl <= 0:
+            self._entries.pop(key, None)
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    # Returns the cached value for key, or awaits load() to fill it
+    # concurrent callers for the same key wait on the same load instead of each making the call,
+    # and failed loads are never cached
+    # ttl may be a callable, for values that carry their own expiry (i.e., tokens)
+    async def get_or_load(
+        self,
+        key: Hashable,
+        load: Callable[[], Awaitable[Any]],
+        ttl: Union[float, Callable[[Any], float], None] = None,
+    ) -> Any:
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._load(key, load, ttl))
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield the shared load, so one caller disconnecting doesn't cancel it for everyone else
+        return await asyncio.shield(inflight)
+
+    async def _load(self, key, load, ttl):
+        value = await load()
+        self.set(key, value, ttl(value) if callable(ttl) else ttl)
+        return value
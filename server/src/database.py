@@ -1,10 +1,95 @@
-from src.models import User, StatusEvent
-from google.cloud import firestore
+from src.models import User, StatusEvent, StatusRule, CalendarSync, CalendarChannel
+from src.cache import TTLCache
+from src.utils import to_utc
+from src.metrics import timed
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import os
 
-db = firestore.Client()
 
+# google.cloud.firestore is one of the slowest imports on a cold start, so it's imported
+# (and the client created) on first use, instead of when the server starts
+def firestore_module():
+    from google.cloud import firestore
 
-def put_user(user: User) -> User:
+    return firestore
+
+
+# Async client, so Firestore round trips don't block the event loop
+# created on first use; anything done with it (i.e., db.collection(...)) is passed through to the client
+class LazyFirestoreClient:
+    def __init__(self):
+        self._client = None
+
+    def __getattr__(self, name: str):
+        if self._client is None:
+            self._client = firestore_module().AsyncClient()
+        return getattr(self._client, name)
+
+
+db = LazyFirestoreClient()
+
+
+# firestore.async_transactional, without importing Firestore until a transaction is run
+def async_transactional(fn):
+    return firestore_module().async_transactional(fn)
+
+
+# Every Firestore call is timed (see metrics.py); functions backed by a cache only time their reads
+
+# Max number of writes in a single Firestore batched write
+FIRESTORE_MAX_BATCH_WRITES = 500
+
+# How long (in days) status events are kept after they end, before they're archived or deleted
+# (by the retention job in retention.py, or by a Firestore TTL policy on expire_at)
+STATUS_EVENT_RETENTION = timedelta(
+    days=int(os.environ.get("STATUS_EVENT_RETENTION_DAYS", 30))
+)
+
+# Whether backfill_status_event_times has run, so every status event has start_at and end_at
+# until it has, queries on them would miss older status events; rechecked every minute until it's done
+migrations_cache = TTLCache("migrations", max_size=1)
+MIGRATION_RECHECK_SECONDS = 60
+
+# Users are read on every authenticated request, but rarely change;
+# cache them in-process, keyed by both their document id and firebase user id
+# entries on other instances may be stale for up to USER_CACHE_TTL seconds after an update
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 300))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10000))
+user_cache = TTLCache("users", max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+def cache_user(user: User):
+    user_cache.set(("id", user.id), user)
+    user_cache.set(("firebase_user_id", user.firebase_user_id), user)
+
+
+def invalidate_user(user: User):
+    user_cache.invalidate(("id", user.id))
+    user_cache.invalidate(("firebase_user_id", user.firebase_user_id))
+
+
+# Calendar syncs are read on every calendar event request, and sync tokens stay valid
+# even once a newer one has been issued, so a sync cached on this instance is still
+# safe to sync from after another instance has updated the stored one
+CALENDAR_SYNC_CACHE_TTL = float(os.environ.get("CALENDAR_SYNC_CACHE_TTL", 600))
+CALENDAR_SYNC_CACHE_SIZE = int(os.environ.get("CALENDAR_SYNC_CACHE_SIZE", 1000))
+calendar_sync_cache = TTLCache(
+    "calendar_syncs", max_size=CALENDAR_SYNC_CACHE_SIZE, ttl=CALENDAR_SYNC_CACHE_TTL
+)
+
+
+# Returns a copy of a cached user, so callers can modify the user they get back
+# (i.e., stripping the access token) without modifying the cache
+def get_cached_user(key: tuple) -> User:
+    user = user_cache.get(key)
+    return user.model_copy() if user else None
+
+
+@timed("firestore")
+async def put_user(user: User) -> User:
     # create new user
     new_user = db.collection("users").document()
     user_data = {
@@ -12,11 +97,14 @@ def put_user(user: User) -> User:
         "email": user.email,
         "display_name": user.display_name,
     }
-    new_user.set(user_data)
-    return User(id=new_user.id, **user_data)
+    await new_user.set(user_data)
+    user = User(id=new_user.id, **user_data)
+    cache_user(user)
+    return user.model_copy()
 
 
-def update_user(user: User) -> User:
+@timed("firestore")
+async def update_user(user: User) -> User:
     # update user
     db_user = db.collection("users").document(user.id)
     user_data = {
@@ -25,40 +113,64 @@ def update_user(user: User) -> User:
         "display_name": user.display_name,
         "slack_user_id": user.slack_user_id,
         "slack_access_token": user.slack_access_token,
+        "slack_team_id": user.slack_team_id,
     }
-    db_user.update(user_data)
-    return User(id=user.id, **user_data)
+    try:
+        await db_user.update(user_data)
+    except Exception:
+        # the stored user is unknown if the update failed, so don't serve it from the cache
+        invalidate_user(user)
+        raise
+    user = User(id=user.id, **user_data)
+    cache_user(user)
+    return user.model_copy()
 
 
-def get_user_by_id(user_id: str) -> User:
-    user = db.collection("users").document(user_id).get()
-    return User(id=user.id, **user.to_dict()) if user.exists else None
+async def get_user_by_id(user_id: str) -> User:
+    cached = get_cached_user(("id", user_id))
+    if cached:
+        return cached
+    # only time the Firestore read, not cache hits
+    async with timed("firestore", "get_user_by_id"):
+        doc = await db.collection("users").document(user_id).get()
+    if not doc.exists:
+        return None
+    user = User(id=doc.id, **doc.to_dict())
+    cache_user(user)
+    return user.model_copy()
 
 
 # Get user by their email (should be unique)
-def get_user_by_email(email: str) -> User:
+@timed("firestore")
+async def get_user_by_email(email: str) -> User:
     users = db.collection("users").where("email", "==", email).limit(1).stream()
-    for doc in users:
+    async for doc in users:
         return User(id=doc.id, **doc.to_dict())
     return None
 
 
 # Get user by their auth user_id
-def get_user_by_firebase_user_id(firebase_user_id: str) -> User:
+async def get_user_by_firebase_user_id(firebase_user_id: str) -> User:
+    cached = get_cached_user(("firebase_user_id", firebase_user_id))
+    if cached:
+        return cached
     users = (
         db.collection("users")
         .where("firebase_user_id", "==", firebase_user_id)
         .limit(1)
         .stream()
     )
-    for doc in users:
-        return User(id=doc.id, **doc.to_dict())
+    async with timed("firestore", "get_user_by_firebase_user_id"):
+        docs = [doc async for doc in users]
+    for doc in docs:
+        user = User(id=doc.id, **doc.to_dict())
+        cache_user(user)
+        return user.model_copy()
     return None
 
 
-def put_status_event(event: StatusEvent) -> StatusEvent:
-    new_status_event = db.collection("status_events").document()
-    status_event_data = {
+def get_status_event_data(event: StatusEvent) -> dict:
+    return {
         "user_id": event.user_id,
         "calendar_id": event.calendar_id,
         "event_id": event.event_id,
@@ -68,38 +180,779 @@ def put_status_event(event: StatusEvent) -> StatusEvent:
         "start": event.start.isoformat(),  # Store timestamps as strings
         "end": event.end.isoformat(),
         "task_id": event.task_id if event.task_id else None,
+        **get_status_event_times(event.start, event.end),
     }
-    new_status_event.set(status_event_data)
-    return StatusEvent(id=new_status_event.id, **status_event_data)
 
 
-def update_status_event(event: StatusEvent) -> StatusEvent:
-    db_event = db.collection("status_events").document(event.id)
-    status_event_data = {
-        "user_id": event.user_id,
-        "calendar_id": event.calendar_id,
-        "event_id": event.event_id,
-        "status_text": event.status_text,
-        "status_emoji": event.status_emoji.model_dump() if event.status_emoji else None,
-        "status_expiration": event.status_expiration,
-        "start": event.start.isoformat(),  # Store timestamps as strings
-        "end": event.end.isoformat(),
-        "task_id": event.task_id if event.task_id else None,
+# The string timestamps keep each event's own utc offset, so they don't sort by time;
+# start_at and end_at are stored as utc timestamps for querying, and expire_at for retention
+def get_status_event_times(start: datetime, end: datetime) -> dict:
+    return {
+        "start_at": to_utc(start),
+        "end_at": to_utc(end),
+        "expire_at": to_utc(end) + STATUS_EVENT_RETENTION,
     }
-    db_event.update(status_event_data)
+
+
+# Allocates an id for a new status event, without a round trip to Firestore
+# so anything derived from the id (i.e., task names) can be created before the status event is saved
+def new_status_event_id() -> str:
+    return db.collection("status_events").document().id
+
+
+@timed("firestore")
+async def update_status_event(event: StatusEvent) -> StatusEvent:
+    db_event = db.collection("status_events").document(event.id)
+    status_event_data = get_status_event_data(event)
+    await db_event.update(status_event_data)
     return StatusEvent(id=event.id, **status_event_data)
 
 
-def get_status_events_by_user(user_id: str):
-    events = db.collection("status_events").where("user_id", "==", user_id).stream()
-    return [StatusEvent(id=doc.id, **doc.to_dict()) for doc in events]
+# Returns the user's status events, or only the ones that haven't ended by ending_after
+# (filtered here instead of in the query, until older status events have been backfilled with end_at)
+@timed("firestore")
+async def get_status_events_by_user(
+    user_id: str, ending_after: Optional[datetime] = None
+):
+    events = db.collection("status_events").where("user_id", "==", user_id)
+    if ending_after and await status_event_times_backfilled():
+        events = events.where("end_at", ">", to_utc(ending_after))
+    status_events = [
+        StatusEvent(id=doc.id, **doc.to_dict()) async for doc in events.stream()
+    ]
+    if ending_after:
+        status_events = [
+            event for event in status_events if to_utc(event.end) > to_utc(ending_after)
+        ]
+    return status_events
+
+
+# Returns a page of the user's status events ordered by start time, and the cursor of the next page (if any)
+# start_after and end_before narrow the query on (user_id, start_at), so each page only reads
+# about page_size documents; fields limits which fields are read (the id is always included)
+# Until older status events have been backfilled with start_at and end_at, all of the user's
+# status events are read and paged in-process instead, so none are left out
+@timed("firestore")
+async def get_status_events_page(
+    user_id: str,
+    page_size: int,
+    cursor: Optional[tuple[datetime, str]] = None,
+    start_after: Optional[datetime] = None,
+    end_before: Optional[datetime] = None,
+    fields: Optional[list[str]] = None,
+) -> tuple[list[dict], Optional[tuple[datetime, str]]]:
+    if await status_event_times_backfilled():
+        rows = await query_status_events_page(
+            user_id, page_size, cursor, start_after, end_before, fields
+        )
+    else:
+        rows = await sort_status_events_page(
+            user_id, page_size, cursor, start_after, end_before, fields
+        )
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = (rows[-1][0], rows[-1][2])
 
+    events = []
+    for _, end_at, id, data in rows:
+        if end_before and end_at > to_utc(end_before):
+            continue
+        data = {"id": id, **data}
+        if fields is not None:
+            data = {field: data.get(field) for field in ["id", *fields]}
+        else:
+            data = StatusEvent(**data).model_dump(mode="json")
+        events.append(data)
+    return events, next_cursor
 
-def get_status_event_by_id(id: str) -> StatusEvent:
-    event = db.collection("status_events").document(id).get()
+
+# Reads up to page_size + 1 rows of (start_at, end_at, id, data) with the (user_id, start_at) query
+async def query_status_events_page(
+    user_id: str,
+    page_size: int,
+    cursor: Optional[tuple[datetime, str]],
+    start_after: Optional[datetime],
+    end_before: Optional[datetime],
+    fields: Optional[list[str]],
+) -> list[tuple[datetime, datetime, str, dict]]:
+    query = db.collection("status_events").where("user_id", "==", user_id)
+    if start_after:
+        query = query.where("start_at", ">=", to_utc(start_after))
+    if end_before:
+        # events that end before end_before also start before it
+        query = query.where("start_at", "<", to_utc(end_before))
+    query = query.order_by("start_at").order_by("__name__")
+    if cursor:
+        query = query.start_after({"start_at": cursor[0], "__name__": cursor[1]})
+    if fields is not None:
+        # start_at and end_at are needed for the cursor and the end_before filter
+        query = query.select(list({*fields, "start_at", "end_at"}))
+
+    rows = []
+    async for doc in query.limit(page_size + 1).stream():
+        data = doc.to_dict()
+        rows.append((data["start_at"], data["end_at"], doc.id, data))
+    return rows
+
+
+# Reads the same rows as query_status_events_page from all of the user's status events,
+# using the string start and end times that every status event has
+async def sort_status_events_page(
+    user_id: str,
+    page_size: int,
+    cursor: Optional[tuple[datetime, str]],
+    start_after: Optional[datetime],
+    end_before: Optional[datetime],
+    fields: Optional[list[str]],
+) -> list[tuple[datetime, datetime, str, dict]]:
+    query = db.collection("status_events").where("user_id", "==", user_id)
+    if fields is not None:
+        query = query.select(list({*fields, "start", "end"}))
+
+    rows = []
+    async for doc in query.stream():
+        data = doc.to_dict()
+        start_at = to_utc(datetime.fromisoformat(data["start"]))
+        end_at = to_utc(datetime.fromisoformat(data["end"]))
+        if start_after and start_at < to_utc(start_after):
+            continue
+        if end_before and start_at >= to_utc(end_before):
+            continue
+        if cursor and (start_at, doc.id) <= (to_utc(cursor[0]), cursor[1]):
+            continue
+        rows.append((start_at, end_at, doc.id, data))
+    rows.sort(key=lambda row: (row[0], row[2]))
+    return rows[: page_size + 1]
+
+
+@timed("firestore")
+async def get_status_event_by_id(id: str) -> StatusEvent:
+    event = await db.collection("status_events").document(id).get()
     return StatusEvent(id=event.id, **event.to_dict()) if event.exists else None
 
 
-def delete_status_event(id: str):
-    db.collection("status_events").document(id).delete()
+@timed("firestore")
+async def delete_status_event(id: str):
+    await db.collection("status_events").document(id).delete()
+    await db.collection("sync_executions").document(id).delete()
     return True
+
+
+# Calendar ids can contain characters that aren't valid in a document id (i.e., "/"),
+# so syncs are stored under a hash of the user and calendar ids
+def calendar_sync_id(user_id: str, calendar_id: str) -> str:
+    return hashlib.sha256(f"{user_id}:{calendar_id}".encode()).hexdigest()
+
+
+# The returned sync is the one held by the cache, so it's never modified in place;
+# to change it, save a copy with a new events dict (its events are frozen, so they can be shared)
+async def get_calendar_sync(user_id: str, calendar_id: str) -> CalendarSync:
+    id = calendar_sync_id(user_id, calendar_id)
+    cached = calendar_sync_cache.get(id)
+    if cached:
+        return cached
+    async with timed("firestore", "get_calendar_sync"):
+        sync = await db.collection("calendar_syncs").document(id).get()
+    if not sync.exists:
+        return None
+    calendar_sync = CalendarSync(id=sync.id, **sync.to_dict())
+    calendar_sync_cache.set(id, calendar_sync)
+    return calendar_sync
+
+
+# Saves a calendar sync, and caches it; the sync shouldn't be modified after (see get_calendar_sync)
+@timed("firestore")
+async def put_calendar_sync(sync: CalendarSync) -> CalendarSync:
+    sync = sync.model_copy(
+        update={"id": calendar_sync_id(sync.user_id, sync.calendar_id)}
+    )
+    sync_data = {
+        "user_id": sync.user_id,
+        "calendar_id": sync.calendar_id,
+        "sync_token": sync.sync_token,
+        "window_end": sync.window_end.isoformat(),  # Store timestamps as strings
+        "events": {
+            id: event.model_dump(mode="json") for id, event in sync.events.items()
+        },
+    }
+    await db.collection("calendar_syncs").document(sync.id).set(sync_data)
+    calendar_sync_cache.set(sync.id, sync)
+    return sync
+
+
+@timed("firestore")
+async def get_calendar_syncs_by_user(user_id: str) -> list[CalendarSync]:
+    syncs = db.collection("calendar_syncs").where("user_id", "==", user_id).stream()
+    return [CalendarSync(id=doc.id, **doc.to_dict()) async for doc in syncs]
+
+
+# Watch channel ids are limited to 64 characters, and are prefixed with this id,
+# so only a (still collision resistant) prefix of the hash is used
+def calendar_channel_id(user_id: str, calendar_id: str) -> str:
+    return calendar_sync_id(user_id, calendar_id)[:40]
+
+
+@timed("firestore")
+async def get_calendar_channel(id: str) -> CalendarChannel:
+    channel = await db.collection("calendar_channels").document(id).get()
+    return (
+        CalendarChannel(id=channel.id, **channel.to_dict()) if channel.exists else None
+    )
+
+
+@timed("firestore")
+async def put_calendar_channel(channel: CalendarChannel) -> CalendarChannel:
+    channel_data = {
+        "channel_id": channel.channel_id,
+        "user_id": channel.user_id,
+        "calendar_id": channel.calendar_id,
+        "resource_id": channel.resource_id,
+        "token": channel.token,
+        "expiration": channel.expiration.isoformat(),  # Store timestamps as strings
+        "access_token": channel.access_token,
+        "access_token_expiration": (
+            channel.access_token_expiration.isoformat()
+            if channel.access_token_expiration
+            else None
+        ),
+    }
+    await db.collection("calendar_channels").document(channel.id).set(channel_data)
+    return CalendarChannel(id=channel.id, **channel_data)
+
+
+@timed("firestore")
+async def get_status_events_by_calendar(user_id: str, calendar_id: str):
+    events = (
+        db.collection("status_events")
+        .where("user_id", "==", user_id)
+        .where("calendar_id", "==", calendar_id)
+        .stream()
+    )
+    return [StatusEvent(id=doc.id, **doc.to_dict()) async for doc in events]
+
+
+# Bulk reads, for syncing many status events at once
+
+
+@timed("firestore")
+async def get_status_events_by_ids(ids: list[str]) -> dict[str, StatusEvent]:
+    refs = [db.collection("status_events").document(id) for id in ids]
+    return {
+        doc.id: StatusEvent(id=doc.id, **doc.to_dict())
+        async for doc in db.get_all(refs)
+        if doc.exists
+    }
+
+
+async def get_users_by_ids(ids: list[str]) -> dict[str, User]:
+    users = {}
+    missing = []
+    for id in ids:
+        cached = get_cached_user(("id", id))
+        if cached:
+            users[id] = cached
+        else:
+            missing.append(id)
+    if missing:
+        refs = [db.collection("users").document(id) for id in missing]
+        async with timed("firestore", "get_users_by_ids"):
+            docs = [doc async for doc in db.get_all(refs)]
+        for doc in docs:
+            if not doc.exists:
+                continue
+            user = User(id=doc.id, **doc.to_dict())
+            cache_user(user)
+            users[doc.id] = user.model_copy()
+    return users
+
+
+# Scheduled syncs, for the time wheel scheduler (see scheduler.py)
+
+
+@timed("firestore")
+async def put_scheduled_sync(
+    task_id: str, status_event_id: str, due_at: datetime, attempts: int = 0
+):
+    await db.collection("scheduled_syncs").document(task_id).set(
+        {
+            "status_event_id": status_event_id,
+            # Stored as a fixed width utc timestamp string, so due syncs can be queried by string comparison
+            "due_at": due_at.astimezone(timezone.utc).isoformat(
+                timespec="microseconds"
+            ),
+            "attempts": attempts,
+        }
+    )
+
+
+@timed("firestore")
+async def delete_scheduled_sync(task_id: str):
+    await db.collection("scheduled_syncs").document(task_id).delete()
+
+
+# Returns (task_id, status_event_id, due_at, attempts) for every sync due before a given time
+@timed("firestore")
+async def get_scheduled_syncs_due_before(before: datetime, limit: int):
+    syncs = (
+        db.collection("scheduled_syncs")
+        .where(
+            "due_at",
+            "<=",
+            before.astimezone(timezone.utc).isoformat(timespec="microseconds"),
+        )
+        .order_by("due_at")
+        .limit(limit)
+        .stream()
+    )
+    return [
+        (
+            doc.id,
+            doc.get("status_event_id"),
+            datetime.fromisoformat(doc.get("due_at")),
+            doc.get("attempts") or 0,
+        )
+        async for doc in syncs
+    ]
+
+
+# Removes a scheduled sync, returning True only for the one caller that removed it
+# so a sync is only fired once, even if it's claimed by more than one instance
+@timed("firestore")
+async def claim_scheduled_sync(task_id: str) -> bool:
+    ref = db.collection("scheduled_syncs").document(task_id)
+
+    @async_transactional
+    async def claim(transaction):
+        doc = await ref.get(transaction=transaction)
+        if not doc.exists:
+            return False
+        transaction.delete(ref)
+        return True
+
+    return await claim(db.transaction())
+
+
+# Acquires (or renews) a named lease for an owner, returning whether the owner holds it
+# the lease is held until it expires, or is renewed by its owner
+@timed("firestore")
+async def acquire_lease(name: str, owner: str, ttl: timedelta) -> bool:
+    ref = db.collection("leases").document(name)
+
+    @async_transactional
+    async def acquire(transaction):
+        doc = await ref.get(transaction=transaction)
+        now = datetime.now(timezone.utc)
+        if doc.exists:
+            lease = doc.to_dict()
+            held_by_other = lease["owner"] != owner
+            if held_by_other and datetime.fromisoformat(lease["expires_at"]) > now:
+                return False
+        transaction.set(ref, {"owner": owner, "expires_at": (now + ttl).isoformat()})
+        return True
+
+    return await acquire(db.transaction())
+
+
+# Sync executions and Slack status watermarks, so syncs are only sent to Slack once
+# each status event has an execution record of the last sync run for it (keyed by the version of the status timeline
+# it was resolved from, its start, and a digest of the profile it sets), and each user has a watermark of the
+# last profile applied to their Slack status
+# syncs are ordered by timeline version, then start: a sync resolved from a newer timeline always wins, even if its
+# segment started earlier (i.e., once an overlapping status event is deleted, the one under it is shown again)
+
+
+def sync_order(version: int, start: datetime) -> tuple[int, datetime]:
+    return (version, start)
+
+
+# Watermarks from before timelines were versioned count as version 0
+def watermark_order(watermark: dict) -> tuple[int, datetime]:
+    return sync_order(
+        watermark.get("version", 0), datetime.fromisoformat(watermark["start"])
+    )
+
+
+# Execution records only matter while their sync can still be retried; they're removed along with their
+# status event, and otherwise (i.e., for statuses created by rules, which aren't stored) once expire_at
+# has passed, by the retention job or a Firestore TTL policy on sync_executions.expire_at
+def sync_execution_expire_at(now: datetime) -> datetime:
+    return now + STATUS_EVENT_RETENTION
+
+
+# Claims the sync of a status event, returning "claimed" if the caller should update Slack,
+# or why it shouldn't:
+# "applied": this exact sync already ran (i.e., a retry of a sync that succeeded)
+# "in_progress": another caller claimed this sync less than claim_ttl ago, and hasn't finished
+# "superseded": a sync resolved from a newer timeline (or, from the same one, starting later) was already applied
+# "unchanged": the user's status was already set to this profile
+@timed("firestore")
+async def claim_sync_execution(
+    status_event_id: str,
+    user_id: str,
+    version: int,
+    start: datetime,
+    digest: str,
+    claim_ttl: timedelta,
+) -> str:
+    execution_ref = db.collection("sync_executions").document(status_event_id)
+    watermark_ref = db.collection("slack_watermarks").document(user_id)
+
+    @async_transactional
+    async def claim(transaction):
+        execution = await execution_ref.get(transaction=transaction)
+        watermark = await watermark_ref.get(transaction=transaction)
+        now = datetime.now(timezone.utc)
+
+        execution = execution.to_dict() if execution.exists else {}
+        if (
+            execution.get("digest") == digest
+            and execution.get("start") == start.isoformat()
+            and execution.get("version", 0) == version
+        ):
+            if execution["state"] != "pending":
+                return "applied"
+            if datetime.fromisoformat(execution["claimed_until"]) > now:
+                return "in_progress"
+
+        outcome = "claimed"
+        if watermark.exists:
+            applied = watermark.to_dict()
+            # statuses without an expiration stay set until they're replaced
+            active = (
+                not applied["expiration"] or applied["expiration"] > now.timestamp()
+            )
+            if active and watermark_order(applied) > sync_order(version, start):
+                outcome = "superseded"
+            elif active and applied["digest"] == digest:
+                outcome = "unchanged"
+
+        transaction.set(
+            execution_ref,
+            {
+                "digest": digest,
+                "start": start.isoformat(),
+                "version": version,
+                "state": "pending" if outcome == "claimed" else outcome,
+                "claimed_until": (now + claim_ttl).isoformat(),
+                "expire_at": sync_execution_expire_at(now),
+            },
+        )
+        return outcome
+
+    return await claim(db.transaction())
+
+
+# Marks a claimed sync as applied, and moves the user's watermark up to it
+# (unless a sync ordered after it was applied in the meantime)
+@timed("firestore")
+async def complete_sync_execution(
+    status_event_id: str,
+    user_id: str,
+    version: int,
+    start: datetime,
+    digest: str,
+    expiration: float,
+):
+    execution_ref = db.collection("sync_executions").document(status_event_id)
+    watermark_ref = db.collection("slack_watermarks").document(user_id)
+
+    @async_transactional
+    async def complete(transaction):
+        watermark = await watermark_ref.get(transaction=transaction)
+        transaction.set(
+            execution_ref,
+            {
+                "digest": digest,
+                "start": start.isoformat(),
+                "version": version,
+                "state": "applied",
+                "expire_at": sync_execution_expire_at(datetime.now(timezone.utc)),
+            },
+        )
+        if watermark.exists and watermark_order(watermark.to_dict()) > sync_order(
+            version, start
+        ):
+            return
+        transaction.set(
+            watermark_ref,
+            {
+                "status_event_id": status_event_id,
+                "digest": digest,
+                "start": start.isoformat(),
+                "version": version,
+                "expiration": expiration,
+            },
+        )
+
+    await complete(db.transaction())
+
+
+# Releases a claimed sync that failed, so it can be retried right away
+@timed("firestore")
+async def release_sync_execution(status_event_id: str):
+    await db.collection("sync_executions").document(status_event_id).delete()
+
+
+# Syncs scheduled for each segment of a user's status timeline (see timeline.py), as segment key -> task id,
+# along with the timeline's version, which goes up every time its syncs are saved (see sync_order),
+# and the digest of the status events they were scheduled from (see StatusTimeline.digest)
+
+
+@timed("firestore")
+async def get_status_timeline_syncs(
+    user_id: str,
+) -> tuple[dict[str, str], int, Optional[str]]:
+    doc = await db.collection("status_timelines").document(user_id).get()
+    if not doc.exists:
+        return {}, 0, None
+    data = doc.to_dict()
+    return data["syncs"], data.get("version", 0), data.get("digest")
+
+
+# Returns the version of each user's status timeline (0 for users without one), with a single bulk read
+# only the versions are read, not the syncs
+@timed("firestore")
+async def get_status_timeline_versions(user_ids: list[str]) -> dict[str, int]:
+    refs = [db.collection("status_timelines").document(id) for id in user_ids]
+    versions = {id: 0 for id in user_ids}
+    async for doc in db.get_all(refs, field_paths=["version"]):
+        if doc.exists:
+            versions[doc.id] = doc.to_dict().get("version", 0)
+    return versions
+
+
+@timed("firestore")
+async def put_status_timeline_syncs(
+    user_id: str, syncs: dict[str, str], version: int, digest: str
+):
+    await db.collection("status_timelines").document(user_id).set(
+        {"syncs": syncs, "version": version, "digest": digest}
+    )
+
+
+# Saves new status events along with the user's timeline syncs
+# writes are grouped into as few batched writes as Firestore allows; if any of them fails,
+# the status events that were saved are deleted again, so either every status event is saved or none are
+@timed("firestore")
+async def put_status_events_with_timeline_syncs(
+    events: list[StatusEvent],
+    user_id: str,
+    syncs: dict[str, str],
+    version: int,
+    digest: str,
+) -> list[StatusEvent]:
+    refs = [db.collection("status_events").document(event.id) for event in events]
+    writes = [(ref, get_status_event_data(event)) for ref, event in zip(refs, events)]
+    writes.append(
+        (
+            db.collection("status_timelines").document(user_id),
+            {"syncs": syncs, "version": version, "digest": digest},
+        )
+    )
+
+    async def commit(chunk):
+        batch = db.batch()
+        for ref, data in chunk:
+            batch.set(ref, data)
+        await batch.commit()
+
+    chunks = [
+        writes[i : i + FIRESTORE_MAX_BATCH_WRITES]
+        for i in range(0, len(writes), FIRESTORE_MAX_BATCH_WRITES)
+    ]
+    results = await asyncio.gather(
+        *[commit(chunk) for chunk in chunks], return_exceptions=True
+    )
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        if len(errors) < len(chunks):
+            await delete_documents(refs)
+        raise errors[0]
+    return events
+
+
+# Deletes status events (and their sync execution records), in batched writes
+@timed("firestore")
+async def delete_status_events(ids: list[str]):
+    refs = [db.collection("status_events").document(id) for id in ids]
+    refs += [db.collection("sync_executions").document(id) for id in ids]
+    await delete_documents(refs)
+
+
+@timed("firestore")
+async def delete_documents(refs: list):
+    async def commit(chunk):
+        batch = db.batch()
+        for ref in chunk:
+            batch.delete(ref)
+        await batch.commit()
+
+    await asyncio.gather(
+        *[
+            commit(refs[i : i + FIRESTORE_MAX_BATCH_WRITES])
+            for i in range(0, len(refs), FIRESTORE_MAX_BATCH_WRITES)
+        ]
+    )
+
+
+# Status rules, stored as a single document per user
+
+
+# rules are read whenever a user's status timeline is loaded, so they're cached like users
+status_rules_cache = TTLCache(
+    "status_rules", max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL
+)
+
+
+async def get_status_rules(user_id: str) -> list[StatusRule]:
+    cached = status_rules_cache.get(user_id)
+    if cached is not None:
+        return list(cached)
+    async with timed("firestore", "get_status_rules"):
+        doc = await db.collection("status_rules").document(user_id).get()
+    rules = [StatusRule(**rule) for rule in doc.get("rules")] if doc.exists else []
+    status_rules_cache.set(user_id, rules)
+    return list(rules)
+
+
+@timed("firestore")
+async def put_status_rules(user_id: str, rules: list[StatusRule]) -> list[StatusRule]:
+    try:
+        await db.collection("status_rules").document(user_id).set(
+            {"rules": [rule.model_dump(mode="json") for rule in rules]}
+        )
+    except Exception:
+        status_rules_cache.invalidate(user_id)
+        raise
+    status_rules_cache.set(user_id, list(rules))
+    return rules
+
+
+# Returns the rules of every user that has any, as user id -> rules
+@timed("firestore")
+async def get_all_status_rules() -> dict[str, list[StatusRule]]:
+    return {
+        doc.id: [StatusRule(**rule) for rule in doc.get("rules")]
+        async for doc in db.collection("status_rules").stream()
+        if doc.get("rules")
+    }
+
+
+# Retention, see retention.py
+
+
+# Archives (or just deletes) up to `limit` status events that ended before a given time,
+# returning how many were removed; each status event is removed along with its sync execution record
+@timed("firestore")
+async def remove_status_events_ending_before(
+    before: datetime, limit: int, archive: bool
+) -> int:
+    docs = [
+        doc
+        async for doc in db.collection("status_events")
+        .where("end_at", "<", to_utc(before))
+        .limit(limit)
+        .stream()
+    ]
+    if not docs:
+        return 0
+    batch = db.batch()
+    for doc in docs:
+        if archive:
+            batch.set(
+                db.collection("status_events_archive").document(doc.id), doc.to_dict()
+            )
+        batch.delete(doc.reference)
+        batch.delete(db.collection("sync_executions").document(doc.id))
+    await batch.commit()
+    return len(docs)
+
+
+# Deletes up to `limit` sync execution records whose expire_at has passed (see sync_execution_expire_at),
+# returning how many were deleted
+@timed("firestore")
+async def remove_sync_executions_expiring_before(before: datetime, limit: int) -> int:
+    docs = [
+        doc
+        async for doc in db.collection("sync_executions")
+        .where("expire_at", "<", to_utc(before))
+        .limit(limit)
+        .select([])
+        .stream()
+    ]
+    if not docs:
+        return 0
+    batch = db.batch()
+    for doc in docs:
+        batch.delete(doc.reference)
+    await batch.commit()
+    return len(docs)
+
+
+# Adds expire_at to sync execution records written before it was stored, returning how many were updated
+@timed("firestore")
+async def backfill_sync_execution_expiry() -> int:
+    expire_at = sync_execution_expire_at(datetime.now(timezone.utc))
+    updated = 0
+    batch = db.batch()
+    writes = 0
+    async for doc in db.collection("sync_executions").stream():
+        if "expire_at" in doc.to_dict():
+            continue
+        batch.update(doc.reference, {"expire_at": expire_at})
+        writes += 1
+        if writes == FIRESTORE_MAX_BATCH_WRITES:
+            await batch.commit()
+            updated += writes
+            batch = db.batch()
+            writes = 0
+    if writes:
+        await batch.commit()
+        updated += writes
+    return updated
+
+
+# Adds start_at, end_at and expire_at to status events saved before they were stored,
+# returning how many status events were updated
+@timed("firestore")
+async def backfill_status_event_times() -> int:
+    updated = 0
+    batch = db.batch()
+    writes = 0
+    async for doc in db.collection("status_events").stream():
+        data = doc.to_dict()
+        if "start_at" in data:
+            continue
+        start = datetime.fromisoformat(data["start"])
+        end = datetime.fromisoformat(data["end"])
+        batch.update(doc.reference, get_status_event_times(start, end))
+        writes += 1
+        if writes == FIRESTORE_MAX_BATCH_WRITES:
+            await batch.commit()
+            updated += writes
+            batch = db.batch()
+            writes = 0
+    if writes:
+        await batch.commit()
+        updated += writes
+    await db.collection("migrations").document("status_event_times").set(
+        {"completed_at": datetime.now(timezone.utc)}
+    )
+    migrations_cache.invalidate("status_event_times")
+    return updated
+
+
+async def status_event_times_backfilled() -> bool:
+    async def load() -> bool:
+        migration = (
+            await db.collection("migrations").document("status_event_times").get()
+        )
+        return migration.exists
+
+    return await migrations_cache.get_or_load(
+        "status_event_times",
+        load,
+        ttl=lambda done: float("inf") if done else MIGRATION_RECHECK_SECONDS,
+    )
@@ -0,0 +1,96 @@
+import hashlib
+import heapq
+import os
+from bisect import bisect_left
+from functools import cached_property
+from typing import Optional
+from pydantic import TypeAdapter
+from src.cache import TTLCache
+from src.models import Emoji
+
+# Emojis rarely change, so each workspace's emojis are cached for a while
+# custom emojis added in the meantime show up once the entry expires
+EMOJI_CACHE_TTL = float(os.environ.get("EMOJI_CACHE_TTL", 60 * 60))
+EMOJI_CACHE_SIZE = int(os.environ.get("EMOJI_CACHE_SIZE", 500))
+emoji_cache = TTLCache("emojis", max_size=EMOJI_CACHE_SIZE, ttl=EMOJI_CACHE_TTL)
+
+emoji_list_adapter = TypeAdapter(list[Emoji])
+
+# Base (standard) emojis are the same for every workspace, so they're parsed once from the
+# first emoji.list response with categories, and reused for every workspace after that
+_base_emojis: Optional[list[Emoji]] = None
+
+
+def get_base_emojis() -> Optional[list[Emoji]]:
+    return _base_emojis
+
+
+def set_base_emojis(categories: list[dict]):
+    global _base_emojis
+    _base_emojis = [
+        Emoji(name=emoji_name)
+        for category in categories
+        for emoji_name in category["emoji_names"]
+    ]
+
+
+# Custom emojis for a workspace, from an emoji.list response
+def parse_custom_emojis(emoji: dict) -> list[Emoji]:
+    return [
+        Emoji(name=k, path=v)
+        for k, v in emoji.items()
+        # some emojis are aliases for other emojis... ignore these for now
+        if v.startswith("http")
+    ]
+
+
+# All emojis available in a workspace, serialized once so cached responses are sent as is
+class EmojiSet:
+    def __init__(self, emojis: list[Emoji]):
+        self.emojis = emojis
+        self.body = emoji_list_adapter.dump_json(emojis)
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+
+    # built on first search, since most workspaces are only ever listed
+    @cached_property
+    def index(self) -> "EmojiIndex":
+        return EmojiIndex(self.emojis)
+
+
+# Search index over a workspace's emojis, by name
+# names are kept sorted, so prefix matches are found with a binary search,
+# and only matches elsewhere in a name need a scan
+class EmojiIndex:
+    def __init__(self, emojis: list[Emoji]):
+        entries = sorted((emoji.name.lower(), i) for i, emoji in enumerate(emojis))
+        self._emojis = emojis
+        self._names = [name for name, _ in entries]
+        self._positions = [i for _, i in entries]
+
+    # Returns the top matches for a query, ranked by:
+    # exact match, then prefix match, then match at the start of a word (after "_" or "-"),
+    # then match anywhere; ties go to the shorter name
+    def search(self, query: str, limit: int) -> list[Emoji]:
+        query = query.strip().strip(":").lower()
+        if not query:
+            return self._emojis[:limit]
+
+        names = self._names
+        start = bisect_left(names, query)
+        end = bisect_left(names, query + "\uffff")
+        matches = [
+            (0 if names[i] == query else 1, len(names[i]), names[i], i)
+            for i in range(start, end)
+        ]
+        for i, name in enumerate(names):
+            if start <= i < end:
+                continue
+            found = name.find(query)
+            if found > 0:
+                rank = 2 if name[found - 1] in "_-" else 3
+                matches.append((rank, len(name), name, i))
+
+        return [
+            self._emojis[self._positions[match[3]]]
+            for match in heapq.nsmallest(limit, matches)
+        ]
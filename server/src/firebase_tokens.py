@@ -0,0 +1,150 @@
+import asyncio
+import os
+import re
+import time
+from typing import Optional
+import httpx
+import jwt
+from cryptography import x509
+from src.cache import TTLCache, token_key
+from src.metrics import timed
+from src.utils import ssl_context
+
+# Google's public keys for Firebase ID tokens, as x509 certificates keyed by key id
+FIREBASE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+FIREBASE_ISSUER_PREFIX = "https://securetoken.google.com/"
+# keys are refreshed this many seconds before Google says they expire
+FIREBASE_KEYS_REFRESH_MARGIN = 300
+# failed refreshes are retried after this many seconds
+FIREBASE_KEYS_RETRY_INTERVAL = 30
+# tokens signed with an unknown key refresh the keys at most this often (in seconds),
+# so a flood of bad tokens can't turn into a flood of downloads
+FIREBASE_KEYS_MIN_REFRESH_INTERVAL = 60
+# max number of verified Firebase ID tokens kept in memory
+FIREBASE_TOKEN_CACHE_SIZE = int(os.environ.get("FIREBASE_TOKEN_CACHE_SIZE", 10000))
+
+
+# Google's signing keys for Firebase ID tokens, kept parsed in memory
+# keys are refreshed in the background before they expire, so requests never wait on a download
+# (only the very first request does, if it comes in before the keys are prefetched)
+class SigningKeys:
+    def __init__(self, url: str = FIREBASE_CERTS_URL):
+        self.url = url
+        self._http = httpx.AsyncClient(timeout=10.0, verify=ssl_context())
+        # key id -> public key
+        self._keys: dict = {}
+        self._expires_at = 0.0
+        self._refreshed_at = float("-inf")
+        self._lock = asyncio.Lock()
+        self._runner: Optional[asyncio.Task] = None
+
+    async def get(self) -> dict:
+        if not self._keys or time.monotonic() >= self._expires_at:
+            await self.refresh(only_if_stale=True)
+        return self._keys
+
+    # Downloads the keys; with only_if_stale, only if they've expired,
+    # and with min_interval, only if they weren't downloaded in the last min_interval seconds
+    async def refresh(self, only_if_stale: bool = False, min_interval: float = 0.0):
+        async with self._lock:
+            # another caller refreshed the keys while this one was waiting
+            if only_if_stale and self._keys and time.monotonic() < self._expires_at:
+                return
+            if time.monotonic() - self._refreshed_at < min_interval:
+                return
+            async with timed("firebase_keys", "refresh"):
+                response = await self._http.get(self.url)
+                response.raise_for_status()
+            self._keys = {
+                kid: x509.load_pem_x509_certificate(cert.encode()).public_key()
+                for kid, cert in response.json().items()
+            }
+            self._refreshed_at = time.monotonic()
+            self._expires_at = self._refreshed_at + max_age(response)
+
+    async def start(self):
+        self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._runner:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+        await self._http.aclose()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+                delay = (
+                    self._expires_at - time.monotonic() - FIREBASE_KEYS_REFRESH_MARGIN
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(e)
+                delay = FIREBASE_KEYS_RETRY_INTERVAL
+            await asyncio.sleep(max(delay, FIREBASE_KEYS_RETRY_INTERVAL))
+
+
+# Seconds the keys can be used for, from the response's Cache-Control header
+def max_age(response: httpx.Response) -> float:
+    match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+    return float(match.group(1)) if match else 0.0
+
+
+# Verifies Firebase ID tokens the same way firebase_admin's auth.verify_id_token does, but with
+# keys that are already parsed in memory; verified claims are cached (by token hash) until the token expires,
+# so each token is only verified once
+class FirebaseTokenVerifier:
+    def __init__(self, project_id: str, keys: Optional[SigningKeys] = None):
+        self.project_id = project_id
+        self.keys = keys or SigningKeys()
+        self.cache = TTLCache("firebase_tokens", max_size=FIREBASE_TOKEN_CACHE_SIZE)
+
+    # Returns the token's claims, or raises ValueError if the token isn't valid
+    async def verify(self, token: str) -> dict:
+        claims = await self.cache.get_or_load(
+            token_key(token),
+            lambda: self._verify(token),
+            ttl=lambda claims: float(claims["exp"]) - time.time(),
+        )
+        # callers get their own copy, so cached claims can't be changed
+        return dict(claims)
+
+    async def _verify(self, token: str) -> dict:
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.PyJWTError as e:
+            raise ValueError(f"Malformed Firebase ID token: {e}")
+        if header.get("alg") != "RS256":
+            raise ValueError("Firebase ID token has incorrect algorithm")
+        kid = header.get("kid")
+        keys = await self.keys.get()
+        if kid not in keys:
+            # Google may have rotated its keys since they were last refreshed
+            await self.keys.refresh(min_interval=FIREBASE_KEYS_MIN_REFRESH_INTERVAL)
+            keys = await self.keys.get()
+        if kid not in keys:
+            raise ValueError("Firebase ID token was signed with an unknown key")
+
+        try:
+            claims = jwt.decode(
+                token,
+                keys[kid],
+                algorithms=["RS256"],
+                audience=self.project_id,
+                issuer=FIREBASE_ISSUER_PREFIX + self.project_id,
+                options={"require": ["exp", "iat", "sub"]},
+            )
+        except jwt.PyJWTError as e:
+            raise ValueError(f"Invalid Firebase ID token: {e}")
+        subject = claims["sub"]
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise ValueError('Firebase ID token has an invalid "sub" (subject) claim')
+        if float(claims.get("auth_time", 0)) > time.time():
+            raise ValueError("Firebase ID token has an auth_time in the future")
+        claims["uid"] = subject
+        return claims
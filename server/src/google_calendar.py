@@ -0,0 +1,130 @@
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+from fastapi.concurrency import run_in_threadpool
+from src.cache import TTLCache
+from src.metrics import timed
+
+# Matches the default size of the threadpool requests are executed in,
+# so a thread never waits on a connection
+CALENDAR_HTTP_POOL_SIZE = int(os.environ.get("CALENDAR_HTTP_POOL_SIZE", 40))
+CALENDAR_HTTP_TIMEOUT = 10
+
+# googleapiclient (and httplib2 with it) is slow to import, so it's only imported once a Calendar request is made,
+# instead of on every cold start
+if TYPE_CHECKING:
+    import httplib2
+
+_service = None
+_service_lock = threading.Lock()
+
+
+# Google Calendar resources used by the server, built once
+# googleapiclient re-parses the discovery document every time a resource is accessed
+# (i.e., service.events()), so each one is built up front and reused for every request
+class CalendarService:
+    def __init__(self, service):
+        self._calendar_list = service.calendarList()
+        self._colors = service.colors()
+        self._events = service.events()
+        self._channels = service.channels()
+
+    def calendarList(self):
+        return self._calendar_list
+
+    def colors(self):
+        return self._colors
+
+    def events(self):
+        return self._events
+
+    def channels(self):
+        return self._channels
+
+
+# Process-wide Google Calendar service, built once from the static discovery document
+# the service isn't bound to any credentials; requests built from it are executed
+# with the caller's access token via execute()
+def calendar_service() -> CalendarService:
+    global _service
+    if _service is None:
+        import httplib2
+        from googleapiclient.discovery import build
+
+        with _service_lock:
+            if _service is None:
+                # passing an http skips looking up default credentials while building
+                service = build(
+                    "calendar",
+                    "v3",
+                    http=httplib2.Http(timeout=CALENDAR_HTTP_TIMEOUT),
+                    static_discovery=True,
+                    cache_discovery=False,
+                )
+                _service = CalendarService(service)
+    return _service
+
+
+# Pool of httplib2 transports, so connections are kept alive between requests
+# httplib2.Http isn't thread safe, so each transport is only used by one thread at a time
+class HttpPool:
+    def __init__(self, size: int):
+        self.size = size
+        self._created = 0
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        http = self._checkout()
+        try:
+            yield http
+        finally:
+            self._idle.put(http)
+
+    def _checkout(self) -> "httplib2.Http":
+        import httplib2
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return httplib2.Http(timeout=CALENDAR_HTTP_TIMEOUT)
+        # pool is exhausted, wait for a transport to be returned
+        return self._idle.get()
+
+
+http_pool = HttpPool(CALENDAR_HTTP_POOL_SIZE)
+
+
+def _execute(request, access_token: str):
+    from google.oauth2 import credentials
+    from google_auth_httplib2 import AuthorizedHttp
+
+    cred = credentials.Credentials(token=access_token)
+    with http_pool.connection() as http:
+        return request.execute(http=AuthorizedHttp(cred, http=http))
+
+
+# Executes a request built from calendar_service() with a user's Google Access Token
+# googleapiclient is sync only, so this is run off the event loop
+async def execute(request, access_token: str) -> dict:
+    async with timed("calendar", getattr(request, "methodId", None)):
+        return await run_in_threadpool(_execute, request, access_token)
+
+
+# The Calendar color palette is the same for every user and rarely changes,
+# so it's fetched once (with whichever user's token is at hand) and shared across requests
+CALENDAR_COLORS_TTL = 24 * 60 * 60
+colors_cache = TTLCache("calendar_colors", max_size=1, ttl=CALENDAR_COLORS_TTL)
+
+
+async def get_colors(access_token: str) -> dict:
+    return await colors_cache.get_or_load(
+        "colors", lambda: execute(calendar_service().colors().get(), access_token)
+    )
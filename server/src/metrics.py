@@ -0,0 +1,115 @@
+import functools
+import time
+from typing import Optional
+from prometheus_client import Counter, Histogram
+from src.tracing import record_upstream
+
+# Buckets (in seconds) for request and upstream latencies, from cache hits up to timeouts
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling requests, by route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Time spent waiting on calls to other services (Firestore, Google APIs, Cloud Tasks, Slack)",
+    ["upstream", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_errors_total",
+    "Calls to other services that raised, by exception type",
+    ["upstream", "operation", "error"],
+)
+# Outcome of each request to Slack: ok, error, ratelimited, server_error, transport_error,
+# or throttled (failed on our side, without being sent, see slack.SLACK_MAX_WAIT)
+SLACK_REQUESTS = Counter(
+    "slack_requests_total",
+    "Requests to Slack's Web API, by method and outcome",
+    ["method", "outcome"],
+)
+SLACK_RATE_LIMIT_WAIT = Counter(
+    "slack_rate_limit_wait_seconds_total",
+    "Time requests to Slack spent waiting on our own rate limits before being sent",
+    ["method"],
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Lookups in in-process caches (see cache.py), by cache and whether they hit",
+    ["cache", "result"],
+)
+# How late each sync fires, compared to the start of the status it applies
+SYNC_LAG = Histogram(
+    "status_sync_lag_seconds",
+    "Time between a status event's start and its sync running",
+    buckets=(0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0),
+)
+
+
+# Times a call to another service, recording its latency and any exception it raises
+# (and adding it to the current request's Server-Timing header and trace, see tracing.py)
+# works as an async context manager around a call:
+#   async with timed("slack", "users.profile.set"):
+# or as a decorator for an async function, named after the function unless an operation is given:
+#   @timed("firestore")
+class timed:
+    def __init__(self, upstream: str, operation: Optional[str] = None):
+        self.upstream = upstream
+        self.operation = operation
+        self._start = 0.0
+
+    async def __aenter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        record(self.upstream, self.operation, time.perf_counter() - self._start, exc)
+        return False
+
+    def __call__(self, fn):
+        upstream = self.upstream
+        operation = self.operation or fn.__name__
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            except BaseException as e:
+                record(upstream, operation, time.perf_counter() - start, e)
+                raise
+            record(upstream, operation, time.perf_counter() - start, None)
+            return result
+
+        return wrapper
+
+
+def record(
+    upstream: str,
+    operation: Optional[str],
+    seconds: float,
+    exception: Optional[BaseException],
+):
+    operation = operation or "unknown"
+    UPSTREAM_LATENCY.labels(upstream, operation).observe(seconds)
+    if exception is not None:
+        UPSTREAM_ERRORS.labels(upstream, operation, type(exception).__name__).inc()
+    record_upstream(upstream, operation, seconds, exception)
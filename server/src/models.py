@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
 from datetime import datetime
 
@@ -16,10 +16,13 @@ class User(BaseModel):
     display_name: str
     slack_user_id: Optional[str] = None
     slack_access_token: Optional[str] = None
+    slack_team_id: Optional[str] = None
 
 
 # Google Calendar objects
 class CalendarColor(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     background: str
     foreground: str
 
@@ -33,7 +36,10 @@ class Calendar(BaseModel):
     timezone: str
 
 
+# frozen, so calendar syncs can share their events with the cache (see database.get_calendar_sync)
 class CalendarEvent(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     id: str
     calendar_id: str
     summary: str
@@ -71,3 +77,70 @@ class StatusEventRequest(BaseModel):
     end: datetime
     status_text: str
     status_emoji: Optional[Emoji] = None
+
+
+class StatusEventBatchRequest(BaseModel):
+    status_events: list[StatusEventRequest]
+
+
+class StatusEventBatchDeleteRequest(BaseModel):
+    ids: list[str]
+
+
+# Rule that sets a user's status for every calendar event it matches, without a status event per calendar event
+# each condition that's set has to match
+class StatusRule(BaseModel):
+    id: str
+    # glob matched anywhere in the event's summary, case insensitive (see rules.compile_summary_pattern)
+    summary_pattern: Optional[str] = None
+    # only match all-day events (True), or only events with a start and end time (False)
+    all_day: Optional[bool] = None
+    # only match events from this calendar
+    calendar_id: Optional[str] = None
+    status_text: str
+    status_emoji: Optional[Emoji] = None
+
+
+class StatusRuleRequest(BaseModel):
+    summary_pattern: Optional[str] = None
+    all_day: Optional[bool] = None
+    calendar_id: Optional[str] = None
+    status_text: str
+    status_emoji: Optional[Emoji] = None
+
+
+# Outcome of a single item of a batch request, in the same order as the request
+class StatusEventBatchResult(BaseModel):
+    # http status code the item would have gotten as a single request
+    status: int
+    id: Optional[str] = None
+    status_event: Optional[StatusEvent] = None
+    detail: Optional[str] = None
+
+
+# Locally stored events for a user's Google Calendar, kept up to date with Google's sync tokens
+class CalendarSync(BaseModel):
+    id: str
+    # firebase user id of the user the calendar belongs to
+    user_id: str
+    calendar_id: str
+    sync_token: Optional[str] = None
+    # end of the time window the events were fully synced for
+    window_end: datetime
+    events: dict[str, CalendarEvent] = {}
+
+
+# Google Calendar push notification channel, watching a user's calendar for changes
+class CalendarChannel(BaseModel):
+    id: str
+    channel_id: str
+    # firebase user id of the user the calendar belongs to
+    user_id: str
+    calendar_id: str
+    resource_id: str
+    # secret Google sends back with every notification, to verify it came from this channel
+    token: str
+    expiration: datetime
+    # latest Google Access Token for the user, used to sync the calendar when notified
+    access_token: Optional[str] = None
+    access_token_expiration: Optional[datetime] = None
@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import os
+from datetime import datetime, timezone
+from src.database import (
+    FIRESTORE_MAX_BATCH_WRITES,
+    STATUS_EVENT_RETENTION,
+    remove_status_events_ending_before,
+    remove_sync_executions_expiring_before,
+    backfill_status_event_times,
+    backfill_sync_execution_expiry,
+)
+
+# What happens to status events once they're past retention:
+# "archive": moved to the status_events_archive collection
+# "delete": deleted
+# "ttl": left to a Firestore TTL policy on status_events.expire_at, so this job does nothing
+STATUS_EVENT_RETENTION_MODE = os.environ.get("STATUS_EVENT_RETENTION_MODE", "archive")
+
+
+# Archives or deletes every status event that ended more than STATUS_EVENT_RETENTION ago,
+# a batched write at a time, returning how many were removed
+# meant to be run periodically (i.e., as a Cloud Run job, triggered by Cloud Scheduler)
+async def remove_expired_status_events(mode: str = STATUS_EVENT_RETENTION_MODE) -> int:
+    if mode == "ttl":
+        return 0
+    if mode not in ("archive", "delete"):
+        raise ValueError(f"Unknown retention mode: {mode}")
+    before = datetime.now(timezone.utc) - STATUS_EVENT_RETENTION
+    # each status event takes up to 3 writes: archive, delete, and delete its sync execution record
+    limit = FIRESTORE_MAX_BATCH_WRITES // 3
+    removed = 0
+    while True:
+        count = await remove_status_events_ending_before(
+            before, limit, archive=mode == "archive"
+        )
+        removed += count
+        if count < limit:
+            return removed
+
+
+# Deletes every sync execution record past its expire_at, a batched write at a time, returning how many
+# were removed; most are removed along with their status event, but statuses created by status rules
+# aren't stored, so theirs are only removed here (or by a TTL policy on sync_executions.expire_at)
+async def remove_expired_sync_executions(
+    mode: str = STATUS_EVENT_RETENTION_MODE,
+) -> int:
+    if mode == "ttl":
+        return 0
+    limit = FIRESTORE_MAX_BATCH_WRITES
+    removed = 0
+    while True:
+        count = await remove_sync_executions_expiring_before(
+            datetime.now(timezone.utc), limit
+        )
+        removed += count
+        if count < limit:
+            return removed
+
+
+# Runs the retention job, after the backfill (if asked for)
+# both run on the same event loop, since the Firestore client is bound to the loop it's first used on
+async def run(backfill: bool):
+    if backfill:
+        updated = await backfill_status_event_times()
+        print(f"backfilled {updated} status events")
+        updated = await backfill_sync_execution_expiry()
+        print(f"backfilled {updated} sync execution records")
+    removed = await remove_expired_status_events()
+    print(f"removed {removed} expired status events ({STATUS_EVENT_RETENTION_MODE})")
+    removed = await remove_expired_sync_executions()
+    print(f"removed {removed} expired sync execution records")
+
+
+# Usage, from server/:
+#   python -m src.retention             archive or delete expired status events
+#   python -m src.retention --backfill  add the fields retention and paging rely on to older status events
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backfill", action="store_true")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.backfill))
+
+
+if __name__ == "__main__":
+    main()
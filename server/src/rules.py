@@ -0,0 +1,225 @@
+import asyncio
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Optional
+from src.models import CalendarEvent, StatusEvent, StatusRule, StatusRuleRequest
+from src.cache import TTLCache
+from src.database import (
+    acquire_lease,
+    get_all_status_rules,
+    get_calendar_syncs_by_user,
+    get_status_rules,
+    get_user_by_id,
+)
+from src.utils import to_utc
+
+# How often (in seconds) every user's rules are evaluated against their upcoming calendar events
+# rules are also evaluated as soon as they're saved, and whenever a calendar sync finds changed events
+STATUS_RULE_EVALUATION_INTERVAL = float(
+    os.environ.get("STATUS_RULE_EVALUATION_INTERVAL", 300)
+)
+# How far ahead calendar events are matched against rules
+STATUS_RULE_HORIZON = timedelta(days=int(os.environ.get("STATUS_RULE_HORIZON_DAYS", 7)))
+# Max number of users whose rules are evaluated at once
+STATUS_RULE_CONCURRENCY = int(os.environ.get("STATUS_RULE_CONCURRENCY", 16))
+MAX_STATUS_RULES = 50
+MAX_SUMMARY_PATTERN_LENGTH = 200
+
+# Status events created by rules are never stored, and their ids name the user they're for,
+# so their syncs can still be resolved to a user
+RULE_STATUS_EVENT_PREFIX = "rule_"
+
+EvaluateRules = Callable[[str, list[StatusRule]], Awaitable[Any]]
+
+
+# Rules are identified by their content, so saving the same rules again doesn't change any ids
+# (and doesn't reschedule any syncs)
+def status_rule_id(rule: StatusRuleRequest) -> str:
+    return hashlib.sha256(rule.model_dump_json().encode()).hexdigest()[:12]
+
+
+def rule_status_event_id(user_id: str, rule_id: str, event: CalendarEvent) -> str:
+    digest = hashlib.sha256(
+        f"{rule_id}:{event.calendar_id}:{event.id}".encode()
+    ).hexdigest()[:16]
+    return f"{RULE_STATUS_EVENT_PREFIX}{user_id}_{digest}"
+
+
+def is_rule_status_event_id(id: str) -> bool:
+    return id.startswith(RULE_STATUS_EVENT_PREFIX)
+
+
+# Returns the user id a rule's status event is for, or None if the id isn't for a rule's status event
+def rule_status_event_user_id(id: str) -> Optional[str]:
+    if not is_rule_status_event_id(id):
+        return None
+    return id[len(RULE_STATUS_EVENT_PREFIX) :].rsplit("_", 1)[0]
+
+
+# Summary patterns are globs (`*` matches any run of characters, `?` any one character),
+# matched case insensitively anywhere in an event's summary
+# not regular expressions, since summaries come from whoever sends the invite, and a pattern like `(a+)+$`
+# can backtrack for seconds on a short summary; fnmatch's translation of a glob always matches in linear time
+def compile_summary_pattern(pattern: str) -> re.Pattern:
+    return re.compile(fnmatch.translate(f"*{pattern.lower()}*"))
+
+
+# A user's rules, with their patterns compiled
+# the first rule (in the user's order) that matches an event sets the status for it
+class CompiledRules:
+    def __init__(self, rules: list[StatusRule]):
+        self.rules = [
+            (
+                rule,
+                (
+                    compile_summary_pattern(rule.summary_pattern)
+                    if rule.summary_pattern
+                    else None
+                ),
+            )
+            for rule in rules
+        ]
+
+    def match(self, event: CalendarEvent) -> Optional[StatusRule]:
+        for rule, pattern in self.rules:
+            if rule.all_day is not None and rule.all_day != event.all_day:
+                continue
+            if rule.calendar_id and rule.calendar_id != event.calendar_id:
+                continue
+            if pattern and not pattern.match(event.summary.lower()):
+                continue
+            return rule
+        return None
+
+    # Returns a status event for every event (ending after `after`, and starting before `before`) a rule matches
+    def status_events(
+        self,
+        user_id: str,
+        events: list[CalendarEvent],
+        after: datetime,
+        before: datetime,
+    ) -> list[StatusEvent]:
+        status_events = []
+        for event in events:
+            if to_utc(event.end) <= after or to_utc(event.start) >= before:
+                continue
+            rule = self.match(event)
+            if not rule:
+                continue
+            status_events.append(
+                StatusEvent(
+                    id=rule_status_event_id(user_id, rule.id, event),
+                    user_id=user_id,
+                    calendar_id=event.calendar_id,
+                    event_id=event.id,
+                    start=event.start,
+                    end=event.end,
+                    status_text=rule.status_text,
+                    status_emoji=rule.status_emoji,
+                    status_expiration=event.end.timestamp(),  # Unix timestamp of end
+                )
+            )
+        return status_events
+
+
+# Compiled rules, keyed by a digest of the rules, so each set of rules is only compiled once
+# (users with the same rules share them)
+compiled_rules_cache = TTLCache("compiled_rules", max_size=10000, ttl=60 * 60)
+
+
+def compile_rules(rules: list[StatusRule]) -> CompiledRules:
+    key = hashlib.sha256(
+        json.dumps([rule.model_dump(mode="json") for rule in rules]).encode()
+    ).hexdigest()
+    compiled = compiled_rules_cache.get(key)
+    if compiled is None:
+        compiled = CompiledRules(rules)
+        compiled_rules_cache.set(key, compiled)
+    return compiled
+
+
+# Returns the status events the user's rules create for their upcoming calendar events
+# events are matched against the user's stored calendar syncs, which are kept up to date
+# (by sync tokens and watch channels) whenever the user's calendars are loaded
+async def get_rule_status_events(
+    user_id: str, rules: Optional[list[StatusRule]] = None
+) -> list[StatusEvent]:
+    if rules is None:
+        rules = await get_status_rules(user_id)
+    if not rules:
+        return []
+    user = await get_user_by_id(user_id)
+    if not user:
+        return []
+    # calendar syncs are stored by firebase user id
+    syncs = await get_calendar_syncs_by_user(user.firebase_user_id)
+    time_now = datetime.now(timezone.utc)
+    return compile_rules(rules).status_events(
+        user_id,
+        [event for sync in syncs for event in sync.events.values()],
+        time_now,
+        time_now + STATUS_RULE_HORIZON,
+    )
+
+
+# Periodically evaluates every user's rules, so statuses follow calendar events as they come into the horizon
+# all rules are loaded with a single query, and users are evaluated concurrently;
+# one instance at a time (the holder of a lease) runs the evaluation
+class RuleEvaluator:
+    LEASE_NAME = "status_rule_evaluator"
+
+    def __init__(
+        self,
+        evaluate: EvaluateRules,
+        interval: float = STATUS_RULE_EVALUATION_INTERVAL,
+        concurrency: int = STATUS_RULE_CONCURRENCY,
+    ):
+        self.evaluate = evaluate
+        self.interval = interval
+        self.concurrency = concurrency
+        self.owner = uuid.uuid4().hex
+        self._runner: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._runner:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            try:
+                await self.evaluate_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(e)
+            await asyncio.sleep(self.interval)
+
+    async def evaluate_all(self):
+        lease_ttl = timedelta(seconds=self.interval * 2)
+        if not await acquire_lease(self.LEASE_NAME, self.owner, lease_ttl):
+            return
+        all_rules = await get_all_status_rules()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def evaluate_one(user_id: str, rules: list[StatusRule]):
+            async with semaphore:
+                try:
+                    await self.evaluate(user_id, rules)
+                except Exception as e:
+                    print(e)
+
+        await asyncio.gather(
+            *[evaluate_one(user_id, rules) for user_id, rules in all_rules.items()]
+        )
@@ -0,0 +1,328 @@
+import asyncio
+import math
+from abc import ABC, abstractmethod
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Optional
+from src.database import (
+    put_scheduled_sync,
+    delete_scheduled_sync,
+    get_scheduled_syncs_due_before,
+    claim_scheduled_sync,
+    acquire_lease,
+)
+from src.utils import to_utc
+from src.metrics import timed
+
+# Which scheduler backend queues status event syncs: "cloud_tasks" or "time_wheel"
+SCHEDULER_BACKEND = os.environ.get("SCHEDULER_BACKEND", "cloud_tasks")
+
+# Syncs a status event, by id; called by the time wheel scheduler when a sync is due
+FireSync = Callable[[str], Awaitable[Any]]
+
+
+# Schedules status events to be synced with Slack at their start time
+class Scheduler(ABC):
+    # how far in the future syncs can be scheduled, or None if there's no limit
+    max_horizon: Optional[timedelta] = None
+
+    # Schedules a status event to be synced at schedule_time, returning the task id
+    # given a task id, scheduling the same task again doesn't queue a second sync
+    @abstractmethod
+    async def schedule(
+        self,
+        status_event_id: str,
+        schedule_time: datetime,
+        task_id: Optional[str] = None,
+    ) -> str: ...
+
+    # Cancels a scheduled sync; cancelling a sync that already ran (or doesn't exist) does nothing
+    @abstractmethod
+    async def cancel(self, task_id: str): ...
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+# Queues each sync as a Google Cloud Task
+# when triggered (at the schedule_time), the task will hit the "/status-events/{status_event_id}/sync" endpoint
+# google.cloud.tasks_v2 is slow to import and its client slow to create, so both wait until the first
+# sync is scheduled or cancelled, instead of slowing down every cold start
+class CloudTasksScheduler(Scheduler):
+    # Cloud Tasks only allows scheduling tasks up to 30 days in the future
+    max_horizon = timedelta(days=30)
+
+    def __init__(
+        self,
+        project_id: str,
+        location: str,
+        queue_name: str,
+        service_account: str,
+        server_base_url: str,
+    ):
+        # created on first use, see client()
+        self.tasks_client = None
+        # the same path CloudTasksAsyncClient.queue_path builds
+        self.queue_path = (
+            f"projects/{project_id}/locations/{location}/queues/{queue_name}"
+        )
+        self.service_account = service_account
+        self.server_base_url = server_base_url
+
+    def client(self):
+        if self.tasks_client is None:
+            from google.cloud import tasks_v2
+
+            self.tasks_client = tasks_v2.CloudTasksAsyncClient()
+        return self.tasks_client
+
+    async def schedule(
+        self,
+        status_event_id: str,
+        schedule_time: datetime,
+        task_id: Optional[str] = None,
+    ) -> str:
+        from google.api_core import exceptions as google_exceptions
+        from google.cloud import tasks_v2
+        from google.protobuf import timestamp_pb2
+
+        # convert timestamp to protobuf for gcloud
+        timestamp = timestamp_pb2.Timestamp()
+        timestamp.FromDatetime(to_utc(schedule_time))
+
+        # define task payload
+        task = {
+            "http_request": {
+                "http_method": tasks_v2.HttpMethod.POST,
+                "url": f"{self.server_base_url}/status-events/{status_event_id}/sync",
+                # not necessarily needed since this request has no body, but good to have
+                "headers": {"Content-Type": "application/json"},
+                "oidc_token": {
+                    "service_account_email": self.service_account,
+                },
+            },
+            "schedule_time": timestamp,
+        }
+        if task_id:
+            task["name"] = self.task_path(task_id)
+        try:
+            async with timed("cloud_tasks", "create_task"):
+                task = await self.client().create_task(
+                    tasks_v2.CreateTaskRequest(parent=self.queue_path, task=task)
+                )
+        except google_exceptions.AlreadyExists:
+            # Cloud Tasks keeps the names of deleted (and finished) tasks reserved for a while;
+            # if this one was queued and is still there, it's the same sync, otherwise queue it under a new name
+            if await self._task_exists(task_id):
+                return task_id
+            return await self.schedule(
+                status_event_id, schedule_time, f"{task_id}-{uuid.uuid4().hex[:8]}"
+            )
+        return task.name.split("/")[-1]
+
+    def task_path(self, task_id: str) -> str:
+        return f"{self.queue_path}/tasks/{task_id}"
+
+    async def _task_exists(self, task_id: str) -> bool:
+        from google.api_core import exceptions as google_exceptions
+        from google.cloud import tasks_v2
+
+        try:
+            async with timed("cloud_tasks", "get_task"):
+                await self.client().get_task(
+                    tasks_v2.GetTaskRequest(name=self.task_path(task_id))
+                )
+            return True
+        except google_exceptions.NotFound:
+            return False
+
+    async def cancel(self, task_id: str):
+        from google.api_core import exceptions as google_exceptions
+        from google.cloud import tasks_v2
+
+        try:
+            async with timed("cloud_tasks", "delete_task"):
+                await self.client().delete_task(
+                    tasks_v2.DeleteTaskRequest(name=self.task_path(task_id))
+                )
+        # the task already ran, or was already deleted
+        except google_exceptions.NotFound:
+            pass
+
+
+# Schedules syncs in-process, on a hashed timing wheel
+# every scheduled sync is stored in Firestore (so none are lost when instances stop),
+# and one instance at a time (the holder of a lease) runs the wheel: every poll it loads the
+# syncs due within the lookahead into the wheel with a single query, then fires each one as its
+# tick comes up; syncs are claimed transactionally before firing, so each one only fires once
+# scheduling and cancelling are O(1) on the wheel, and there's no limit on how far ahead syncs go
+class TimeWheelScheduler(Scheduler):
+    max_horizon = None
+
+    # resolution of the wheel, in seconds
+    TICK = 1.0
+    # how often (in seconds) due syncs are loaded from Firestore, and how far ahead
+    POLL_INTERVAL = 15.0
+    LOOKAHEAD = timedelta(seconds=60)
+    # max number of syncs loaded per poll
+    POLL_LIMIT = 1000
+    LEASE_NAME = "time_wheel_scheduler"
+    LEASE_TTL = timedelta(seconds=30)
+    # failed syncs are retried with exponential backoff, up to this many times
+    MAX_ATTEMPTS = 5
+    RETRY_BACKOFF = timedelta(seconds=10)
+
+    def __init__(self, fire: FireSync):
+        self.fire = fire
+        self.owner = uuid.uuid4().hex
+        self.is_leader = False
+        # tick number -> {task_id: status_event_id}
+        self._slots: dict[int, dict[str, str]] = {}
+        # task_id -> (tick number, attempts), to cancel in O(1)
+        self._tasks: dict[str, tuple[int, int]] = {}
+        self._current_tick = self._tick_of(datetime.now(timezone.utc))
+        self._runner: Optional[asyncio.Task] = None
+        self._firing: set[asyncio.Task] = set()
+
+    def _tick_of(self, time: datetime) -> int:
+        return int(to_utc(time).timestamp() // self.TICK)
+
+    async def schedule(
+        self,
+        status_event_id: str,
+        schedule_time: datetime,
+        task_id: Optional[str] = None,
+    ) -> str:
+        task_id = task_id or uuid.uuid4().hex
+        await put_scheduled_sync(task_id, status_event_id, to_utc(schedule_time))
+        self._add(task_id, status_event_id, schedule_time)
+        return task_id
+
+    async def cancel(self, task_id: str):
+        self._remove(task_id)
+        await delete_scheduled_sync(task_id)
+
+    async def start(self):
+        self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._runner:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+
+    def _add(
+        self,
+        task_id: str,
+        status_event_id: str,
+        schedule_time: datetime,
+        attempts: int = 0,
+    ):
+        # only the wheel's owner keeps syncs in memory, and only those due soon;
+        # the rest are picked up from Firestore when they come within the lookahead
+        if not self.is_leader:
+            return
+        if schedule_time > datetime.now(timezone.utc) + self.LOOKAHEAD:
+            return
+        # syncs are never fired early (a sync applies the status shown at the time it fires),
+        # and syncs that are already due go in the next slot
+        tick = max(
+            math.ceil(to_utc(schedule_time).timestamp() / self.TICK),
+            self._current_tick,
+        )
+        self._remove(task_id)
+        self._slots.setdefault(tick, {})[task_id] = status_event_id
+        self._tasks[task_id] = (tick, attempts)
+
+    def _remove(self, task_id: str):
+        entry = self._tasks.pop(task_id, None)
+        if entry:
+            slot = self._slots.get(entry[0])
+            if slot:
+                slot.pop(task_id, None)
+
+    async def _run(self):
+        next_poll = 0.0
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                if loop.time() >= next_poll:
+                    next_poll = loop.time() + self.POLL_INTERVAL
+                    await self._poll()
+                self._advance()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(e)
+            await asyncio.sleep(self.TICK)
+
+    # Renews the lease, and loads syncs due within the lookahead into the wheel
+    async def _poll(self):
+        was_leader = self.is_leader
+        self.is_leader = await acquire_lease(
+            self.LEASE_NAME, self.owner, self.LEASE_TTL
+        )
+        if not self.is_leader:
+            if was_leader:
+                self._slots.clear()
+                self._tasks.clear()
+            return
+        due = await get_scheduled_syncs_due_before(
+            datetime.now(timezone.utc) + self.LOOKAHEAD, self.POLL_LIMIT
+        )
+        for task_id, status_event_id, due_at, attempts in due:
+            if task_id not in self._tasks:
+                self._add(task_id, status_event_id, due_at, attempts)
+
+    # Fires every sync in the slots up to the current tick
+    def _advance(self):
+        if not self.is_leader:
+            return
+        now_tick = self._tick_of(datetime.now(timezone.utc))
+        # after a long pause (i.e., the instance's CPU was throttled), jump straight to the
+        # slots that are due instead of stepping through every tick that was missed
+        if now_tick - self._current_tick > len(self._slots):
+            ticks = sorted(tick for tick in self._slots if tick <= now_tick)
+        else:
+            ticks = range(self._current_tick, now_tick + 1)
+        for tick in ticks:
+            slot = self._slots.pop(tick, {})
+            for task_id, status_event_id in slot.items():
+                _, attempts = self._tasks.pop(task_id, (None, 0))
+                task = asyncio.create_task(
+                    self._fire(task_id, status_event_id, attempts)
+                )
+                self._firing.add(task)
+                task.add_done_callback(self._firing.discard)
+        self._current_tick = max(self._current_tick, now_tick + 1)
+
+    async def _fire(self, task_id: str, status_event_id: str, attempts: int):
+        try:
+            if not await claim_scheduled_sync(task_id):
+                return
+            await self.fire(status_event_id)
+        except Exception as e:
+            print(e)
+            attempts += 1
+            if attempts >= self.MAX_ATTEMPTS:
+                return
+            # requeue the sync, the same way Cloud Tasks retries a failed task
+            retry_at = datetime.now(timezone.utc) + self.RETRY_BACKOFF * 2 ** (
+                attempts - 1
+            )
+            await put_scheduled_sync(task_id, status_event_id, retry_at, attempts)
+            self._add(task_id, status_event_id, retry_at, attempts)
+
+
+def create_scheduler(fire: FireSync, **cloud_tasks_config) -> Scheduler:
+    if SCHEDULER_BACKEND == "time_wheel":
+        return TimeWheelScheduler(fire)
+    if SCHEDULER_BACKEND == "cloud_tasks":
+        return CloudTasksScheduler(**cloud_tasks_config)
+    raise ValueError(f"Unknown scheduler backend: {SCHEDULER_BACKEND}")
@@ -1,35 +1,97 @@
-import requests
-from fastapi import FastAPI, HTTPException, Header, Depends, Request
-from fastapi.responses import RedirectResponse
+import asyncio
+import base64
+import json
+import httpx
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Header, Depends, Request, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import (
+    RedirectResponse,
+    StreamingResponse,
+    Response,
+    JSONResponse,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from google.oauth2 import id_token, credentials
-from google.cloud import tasks_v2
-from google.protobuf import timestamp_pb2
-from google.auth.transport import requests as google_requests
-from googleapiclient.discovery import build
-import firebase_admin
-from firebase_admin import auth
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 import os
+import secrets
+import time
+import weakref
+from typing import Optional
 from src.models import (
     Authorization,
     User,
     Calendar,
     CalendarEvent,
     CalendarColor,
+    CalendarSync,
+    CalendarChannel,
     Emoji,
     StatusEvent,
     StatusEventRequest,
+    StatusEventBatchRequest,
+    StatusEventBatchDeleteRequest,
+    StatusEventBatchResult,
+    StatusRule,
+    StatusRuleRequest,
+)
+from src.cache import TTLCache, token_key
+from src.metrics import REQUEST_LATENCY, SYNC_LAG, timed
+from src.tracing import finish_trace, span, start_trace
+from src.firebase_tokens import FirebaseTokenVerifier
+from src.slack import SlackError, slack_client
+from src.sync import SyncBatcher, SYNC_CLAIM_TTL, slack_profile, profile_digest
+from src.scheduler import create_scheduler
+from src.utils import to_utc, ssl_context
+from src.timeline import (
+    StatusTimeline,
+    get_status_timeline,
+    get_status_timelines,
+    load_status_timeline,
+)
+from src.rules import (
+    MAX_STATUS_RULES,
+    MAX_SUMMARY_PATTERN_LENGTH,
+    RuleEvaluator,
+    get_rule_status_events,
+    is_rule_status_event_id,
+    rule_status_event_user_id,
+    status_rule_id,
 )
+from src.emojis import (
+    EmojiSet,
+    emoji_cache,
+    get_base_emojis,
+    set_base_emojis,
+    parse_custom_emojis,
+)
+from src.google_calendar import calendar_service, execute, get_colors
 from src.database import (
     get_user_by_id,
     get_user_by_firebase_user_id,
     put_user,
     update_user,
-    put_status_event,
+    new_status_event_id,
     update_status_event,
     get_status_event_by_id,
-    get_status_events_by_user,
+    get_status_events_page,
     delete_status_event as delete_db_status_event,
+    get_calendar_sync,
+    put_calendar_sync,
+    calendar_channel_id,
+    get_calendar_channel,
+    put_calendar_channel,
+    get_status_events_by_calendar,
+    claim_sync_execution,
+    complete_sync_execution,
+    release_sync_execution,
+    get_status_timeline_syncs,
+    put_status_timeline_syncs,
+    put_status_events_with_timeline_syncs,
+    get_status_events_by_ids,
+    delete_status_events,
+    get_status_rules,
+    put_status_rules,
 )
 from datetime import datetime, timezone, timedelta
 from zoneinfo import ZoneInfo
@@ -39,42 +101,176 @@ CLIENT_BASE_URL = os.environ.get("CLIENT_BASE_URL")
 
 FIREBASE_PROJECT_ID = os.environ.get("FIREBASE_PROJECT_ID")
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID")
+GOOGLE_TOKENINFO_URL = "https://www.googleapis.com/oauth2/v3/tokeninfo"
+# max number of verified Google Access Tokens kept in memory
+GOOGLE_TOKEN_CACHE_SIZE = int(os.environ.get("GOOGLE_TOKEN_CACHE_SIZE", 10000))
 
 SLACK_CLIENT_ID = os.environ.get("SLACK_CLIENT_ID")
 SLACK_CLIENT_SECRET = os.environ.get("SLACK_CLIENT_SECRET")
 SLACK_OAUTH_BASE_URL = "https://slack.com/oauth/v2/authorize"
 SLACK_REDIRECT_URI = f"{SERVER_BASE_URL}/auth/slack/callback"
 SLACK_AUTH_SCOPES = "users.profile:read,users.profile:write,emoji:read"
+MAX_EMOJI_SEARCH_RESULTS = 100
+# max number of status events created or deleted in a single batch request
+MAX_STATUS_EVENTS_PER_BATCH = 500
+DEFAULT_STATUS_EVENTS_PAGE_SIZE = 250
+MAX_STATUS_EVENTS_PAGE_SIZE = 1000
+
+# max number of calendars that can be requested at once from /events
+MAX_CALENDARS_PER_REQUEST = 50
+# number of events requested per page from Google Calendar (max 2500)
+CALENDAR_EVENTS_PAGE_SIZE = 250
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# how far short of the current window stored calendar events can be before they're fully re-synced
+SYNC_WINDOW_SLACK = timedelta(days=1)
+# Google Calendar push notifications are sent here, for calendars being watched
+CALENDAR_NOTIFICATIONS_URL = f"{SERVER_BASE_URL}/calendar/notifications"
+# watch channels expiring within this time are replaced when the calendar is watched again
+CHANNEL_RENEWAL_WINDOW = timedelta(days=1)
 
 GOOGLE_CLOUD_PROJECT_ID = os.environ.get("GOOGLE_CLOUD_PROJECT_ID")
 GOOGLE_CLOUD_LOCATION = os.environ.get("GOOGLE_CLOUD_LOCATION")
 GOOGLE_CLOUD_QUEUE_NAME = os.environ.get("GOOGLE_CLOUD_QUEUE_NAME")
 GOOGLE_CLOUD_SERVICE_ACCOUNT = os.environ.get("GOOGLE_CLOUD_SERVICE_ACCOUNT")
 
+
+# Starts and stops background work (i.e., the time wheel scheduler, and status rule evaluation) with the server
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if firebase_token_verifier:
+        await firebase_token_verifier.keys.start()
+    await scheduler.start()
+    await rule_evaluator.start()
+    yield
+    await rule_evaluator.stop()
+    await scheduler.stop()
+    if firebase_token_verifier:
+        await firebase_token_verifier.keys.stop()
+
+
 origins = [
     "http://localhost",
     "http://localhost:3000",
     CLIENT_BASE_URL,
 ]
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Next-Page-Token", "Server-Timing"],
+)
+
+
+# Records the latency of every request, labelled by route template (not path),
+# so routes with ids in them are still a single series
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(
+            request.method, route.path if route else "unmatched", str(status)
+        ).observe(time.perf_counter() - start)
+
+
+# Adds a Server-Timing header to every response, breaking down the time spent on auth, resolving the user,
+# and each service called (i.e., `firestore;dur=20.4;desc="3 calls"`), and exports sampled requests' spans
+# streamed responses keep calling services after the header is sent, so their trace ends with the body
+@app.middleware("http")
+async def add_server_timing(request: Request, call_next):
+    trace = start_trace(
+        f"{request.method} {request.url.path}", request.headers.get("traceparent")
+    )
+    try:
+        response = await call_next(request)
+    except Exception as e:
+        finish_trace(trace, {"http.request.method": request.method}, e)
+        raise
+    response.headers["Server-Timing"] = trace.server_timing()
+
+    route = request.scope.get("route")
+    if route:
+        trace.name = f"{request.method} {route.path}"
+    attributes = {
+        "http.request.method": request.method,
+        "http.route": route.path if route else "unmatched",
+        "http.response.status_code": response.status_code,
+    }
+    body = response.body_iterator
+
+    async def body_then_finish():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            finish_trace(trace, attributes)
+
+    response.body_iterator = body_then_finish()
+    return response
+
+
+# Shared async clients, so outbound calls don't block the event loop
+# and connections are kept alive between requests
+http_client = httpx.AsyncClient(timeout=10.0, verify=ssl_context())
+
+# Queues status events to be synced with Slack at their start time (see scheduler.py)
+# the time wheel scheduler fires syncs in-process, through the same batcher as the sync endpoint
+scheduler = create_scheduler(
+    lambda status_event_id: sync_batcher.submit(status_event_id),
+    project_id=GOOGLE_CLOUD_PROJECT_ID,
+    location=GOOGLE_CLOUD_LOCATION,
+    queue_name=GOOGLE_CLOUD_QUEUE_NAME,
+    service_account=GOOGLE_CLOUD_SERVICE_ACCOUNT,
+    server_base_url=SERVER_BASE_URL,
 )
+# Only show calendar events as far ahead as status events can be scheduled
+CALENDAR_WINDOW = scheduler.max_horizon or timedelta(
+    days=int(os.environ.get("CALENDAR_WINDOW_DAYS", 90))
+)
+
+# Verified Google Access Tokens (keyed by token hash), cached until the token expires
+google_token_cache = TTLCache("google_tokens", max_size=GOOGLE_TOKEN_CACHE_SIZE)
+
+
+# The firebase_admin app, initialized on first use
+# firebase_admin is slow to import and only needed without FIREBASE_PROJECT_ID (or against the auth emulator),
+# so it isn't imported on every cold start
+def firebase_app():
+    import firebase_admin
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app()
+    return firebase_admin.get_app()
 
-if not firebase_admin._apps:
-    firebase_admin.initialize_app()
 
-tasks_client = tasks_v2.CloudTasksClient()
+# Verifies Firebase ID tokens with keys prefetched in the background, caching verified claims until
+# each token expires; so after a token's first request, verifying it is just a hash lookup
+# firebase_admin is still used against the auth emulator, or if the project id can't be found
+FIREBASE_PROJECT_ID = FIREBASE_PROJECT_ID or firebase_app().project_id
+firebase_token_verifier = (
+    FirebaseTokenVerifier(FIREBASE_PROJECT_ID)
+    if FIREBASE_PROJECT_ID and not os.environ.get("FIREBASE_AUTH_EMULATOR_HOST")
+    else None
+)
 
 
 # Verifies the Firebase ID token is valid for this app
-def verify_firebase_id_token(token: str):
+async def verify_firebase_id_token(token: str):
     try:
-        decoded = auth.verify_id_token(token)
+        if firebase_token_verifier:
+            return await firebase_token_verifier.verify(token)
+        from firebase_admin import auth
+
+        # firebase_admin is sync only (and may fetch public keys), so run it off the event loop
+        decoded = await run_in_threadpool(auth.verify_id_token, token, firebase_app())
         return decoded
     except Exception as e:
         print(e)
@@ -84,11 +280,34 @@ def verify_firebase_id_token(token: str):
 # Verifies the Google Access Token is valid for this app
 # this has to be done via API request since Google auth libraries don't support
 # opaque tokens (i.e., tokens not in JWT format)
-def verify_google_access_token(token: str):
+# verified tokens are cached until they expire, so the request is made about once per token,
+# instead of once per API call; concurrent requests with the same token share one request
+async def verify_google_access_token(token: str):
+    return await google_token_cache.get_or_load(
+        token_key(token),
+        lambda: fetch_google_token_info(token),
+        ttl=google_token_ttl,
+    )
+
+
+# Seconds until a verified token expires, from its "exp" (unix timestamp) and/or "expires_in" fields
+def google_token_ttl(data: dict) -> float:
+    ttls = []
+    if "exp" in data:
+        ttls.append(float(data["exp"]) - time.time())
+    if "expires_in" in data:
+        ttls.append(float(data["expires_in"]))
+    # don't cache tokens without a known expiry
+    return min(ttls) if ttls else 0
+
+
+async def fetch_google_token_info(token: str):
     try:
-        response = requests.get(
-            f"https://www.googleapis.com/oauth2/v3/tokeninfo?access_token={token}"
-        )
+        async with timed("tokeninfo", "tokeninfo"):
+            response = await http_client.get(
+                GOOGLE_TOKENINFO_URL,
+                params={"access_token": token},
+            )
         if response.status_code != 200:
             raise HTTPException(
                 status_code=401, detail="Failed verifying Google Access Token"
@@ -111,7 +330,7 @@ def verify_google_access_token(token: str):
 # Verifies requests made from Google Cloud Task API
 # this is verified separately from user requests since the Google Cloud Task API headers are slightly different
 # this is broken out from the verify_authorization function since the headers slightly differ
-def verify_google_cloud_auth(authorization: str = Header(None)):
+async def verify_google_cloud_auth(authorization: str = Header(None)):
     if not authorization:
         raise HTTPException(
             status_code=401,
@@ -123,8 +342,13 @@ def verify_google_cloud_auth(authorization: str = Header(None)):
             raise HTTPException(
                 status_code=401, detail="Google Cloud request is missing token"
             )
+        # imported here, since they're slow to import and only needed for Cloud Tasks requests
+        from google.oauth2 import id_token
+        from google.auth.transport import requests as google_requests
+
         # can use verify_oauth2_token since this token *is* a JWT
-        decoded = id_token.verify_oauth2_token(
+        decoded = await run_in_threadpool(
+            id_token.verify_oauth2_token,
             token,
             google_requests.Request(),
         )
@@ -149,7 +373,7 @@ def verify_google_cloud_auth(authorization: str = Header(None)):
 # Parses the "Authorization" header for a request, and verifies the token is valid with Firebase
 # Also parses the "X-OAuth-Access-Token" header for the Google (OAuth) Access Token
 # this token is required for making requests for making Google Calendar API requests
-def verify_authorization(
+async def verify_authorization(
     authorization: str = Header(None), x_oauth_access_token: str = Header(None)
 ) -> Authorization:
     if not authorization:
@@ -162,9 +386,13 @@ def verify_authorization(
         )
     try:
         token = authorization.split("Bearer ")[1]
-        decoded_id_token = verify_firebase_id_token(token)
-        # don't need to assign a value since we don't do anything with the decoded access token
-        verify_google_access_token(x_oauth_access_token)
+        # verify both tokens concurrently;
+        # don't need the decoded access token since we don't do anything with it
+        async with span("auth"):
+            decoded_id_token, _ = await asyncio.gather(
+                verify_firebase_id_token(token),
+                verify_google_access_token(x_oauth_access_token),
+            )
 
         return Authorization(
             id_token=token, access_token=x_oauth_access_token, data=decoded_id_token
@@ -179,8 +407,9 @@ def verify_authorization(
 
 # Resolve a user from their Authorization headers
 # This function is used to verify the user making the request is the user they claim to be
-def resolve_user(auth: Authorization) -> User:
-    user = get_user_by_firebase_user_id(auth.data["user_id"])
+async def resolve_user(auth: Authorization) -> User:
+    async with span("user"):
+        user = await get_user_by_firebase_user_id(auth.data["user_id"])
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -191,6 +420,12 @@ async def root():
     return {"message": "FastAPI Server running"}
 
 
+# Prometheus metrics: request latencies by route, latencies and errors of calls to other services, and sync lag
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 ############################################
 # SLACK ROUTES
 ############################################
@@ -201,9 +436,7 @@ async def root():
 # Slack will hit the REDIRECT_URI (which finishes the process) after the user approves in the browser
 @app.get("/auth/slack")
 async def auth_slack(auth: Authorization = Depends(verify_authorization)):
-    user = resolve_user(auth)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    user = await resolve_user(auth)
 
     auth_url = f"{SLACK_OAUTH_BASE_URL}?client_id={SLACK_CLIENT_ID}&user_scope={SLACK_AUTH_SCOPES}&redirect_uri={SLACK_REDIRECT_URI}&state={user.id}"
     return {"url": auth_url}
@@ -216,69 +449,72 @@ async def auth_slack(auth: Authorization = Depends(verify_authorization)):
 @app.get("/auth/slack/callback")
 async def auth_slack_callback(request: Request, code: str, state: str):
     # user id maintained in state param to verify user
-    user = get_user_by_id(state)
+    user = await get_user_by_id(state)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    path = "https://slack.com/api/oauth.v2.access"
     params = {
         "client_id": SLACK_CLIENT_ID,
         "client_secret": SLACK_CLIENT_SECRET,
         "code": code,
         "redirect_uri": SLACK_REDIRECT_URI,
     }
-    response = requests.post(path, data=params)
-    data = response.json()
-
-    if not data.get("ok"):
-        raise HTTPException(status_code=400, detail="Failed Authenticating with Slack")
+    try:
+        data = await slack_client.call("oauth.v2.access", data=params)
+    except SlackError as e:
+        print(e)
+        raise slack_http_exception(e, "Failed Authenticating with Slack")
 
     # Update user with slack user id and access token
     user.slack_user_id = data["authed_user"]["id"]
     user.slack_access_token = data["authed_user"]["access_token"]
-    update_user(user)
+    user.slack_team_id = data.get("team", {}).get("id")
+    await update_user(user)
 
     return RedirectResponse(url=f"{CLIENT_BASE_URL}?slack=success")
 
 
 # Gets all emojis in the slack workspace a user has approved access to
-@app.get("/slack/emojis")
-async def get_slack_emojis(auth: Authorization = Depends(verify_authorization)):
+# responses carry an ETag, so clients sending it back in If-None-Match get a 304 when nothing changed
+@app.get("/slack/emojis", response_model=list[Emoji])
+async def get_slack_emojis(
+    auth: Authorization = Depends(verify_authorization),
+    if_none_match: str = Header(None),
+):
     try:
         # resolve user from auth
-        user = resolve_user(auth)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        token = user.slack_access_token
-        if not token:
-            raise HTTPException(
-                status_code=400, detail="User has not authenticated with Slack"
-            )
-
-        path = "https://slack.com/api/emoji.list?include_categories=True&pretty=1"
-        headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(path, headers=headers)
-        data = response.json()
+        user = await resolve_user(auth)
+        emoji_set = await get_workspace_emojis(user)
+
+        headers = {"ETag": emoji_set.etag, "Cache-Control": "private, no-cache"}
+        if if_none_match == emoji_set.etag:
+            return Response(status_code=304, headers=headers)
+        return Response(
+            content=emoji_set.body, media_type="application/json", headers=headers
+        )
 
-        if not data.get("ok"):
-            raise HTTPException(
-                status_code=400, detail="Failed retrieving emojis from Slack"
-            )
+    # bubble up any specific exception raised in the try block
+    except HTTPException as http_exception:
+        raise http_exception
+    # catch all other exceptions, and raise as a 500
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail="Error retrieving slack emojis")
 
-        slack_emojis = [
-            Emoji(name=k, path=v)
-            for k, v in data["emoji"].items()
-            # some emojis are aliases for other emojis... ignore these for now
-            if v.startswith("http")
-        ]
-        base_emojis = []
-        for category in data["categories"]:
-            for emoji_name in category["emoji_names"]:
-                emoji = Emoji(name=emoji_name)
-                base_emojis.append(emoji)
 
-        return slack_emojis + base_emojis
+# GET /slack/emojis/search?q=...&limit=...
+# Searches the emojis in a user's slack workspace by name, returning the top matches
+@app.get("/slack/emojis/search", response_model=list[Emoji])
+async def search_slack_emojis(
+    q: str = "",
+    limit: int = Query(20, ge=1, le=MAX_EMOJI_SEARCH_RESULTS),
+    auth: Authorization = Depends(verify_authorization),
+):
+    try:
+        # resolve user from auth
+        user = await resolve_user(auth)
+        emoji_set = await get_workspace_emojis(user)
+        return emoji_set.index.search(q, limit)
 
     # bubble up any specific exception raised in the try block
     except HTTPException as http_exception:
@@ -286,7 +522,42 @@ async def get_slack_emojis(auth: Authorization = Depends(verify_authorization)):
     # catch all other exceptions, and raise as a 500
     except Exception as e:
         print(e)
-        raise HTTPException(status_code=500, detail="Error retrieving slack emojis")
+        raise HTTPException(status_code=500, detail="Error searching slack emojis")
+
+
+# Gets all emojis in a user's slack workspace, cached per workspace
+async def get_workspace_emojis(user: User) -> EmojiSet:
+    token = user.slack_access_token
+    if not token:
+        raise HTTPException(
+            status_code=400, detail="User has not authenticated with Slack"
+        )
+    # users who authenticated before workspaces were stored are cached by their token instead
+    key = user.slack_team_id or token_key(token)
+    return await emoji_cache.get_or_load(
+        key, lambda: fetch_slack_emojis(token, user.slack_team_id)
+    )
+
+
+async def fetch_slack_emojis(token: str, team_id: str = None) -> EmojiSet:
+    # categories are only needed until the base emojis have been parsed once
+    include_categories = get_base_emojis() is None
+    params = {"include_categories": "true"} if include_categories else {}
+    try:
+        data = await slack_client.call(
+            "emoji.list",
+            token=token,
+            team_id=team_id,
+            http_method="GET",
+            params=params,
+        )
+    except SlackError as e:
+        print(e)
+        raise slack_http_exception(e, "Failed retrieving emojis from Slack")
+
+    if include_categories:
+        set_base_emojis(data["categories"])
+    return EmojiSet(parse_custom_emojis(data["emoji"]) + get_base_emojis())
 
 
 ############################################
@@ -298,9 +569,9 @@ async def get_slack_emojis(auth: Authorization = Depends(verify_authorization)):
 @app.get("/users/me", response_model=User)
 async def get_user(auth: Authorization = Depends(verify_authorization)):
     try:
-        user = get_user_by_firebase_user_id(auth.data["user_id"])
+        user = await get_user_by_firebase_user_id(auth.data["user_id"])
         if not user:
-            return put_user(
+            return await put_user(
                 User(
                     id="",
                     firebase_user_id=auth.data["user_id"],
@@ -333,11 +604,11 @@ async def post_status_event(
 ):
     try:
         # resolve user from auth
-        user = resolve_user(auth)
+        user = await resolve_user(auth)
         # create status event from partial object
         status_event = StatusEvent(
-            # ID will be generated when event is created with firebase
-            id="",
+            # allocated up front, so its syncs can be queued (under names derived from it) before it's saved
+            id=new_status_event_id(),
             user_id=user.id,
             calendar_id=req.calendar_id,
             event_id=req.event_id,
@@ -348,18 +619,19 @@ async def post_status_event(
             status_expiration=req.end.timestamp(),  # Unix timestamp of end
         )
 
-        new_status_event = put_status_event(status_event)
-
-        # queue status event for syncing
-        schedule_time = new_status_event.start
-        task = create_task(new_status_event.id, schedule_time)
-        if not task:
-            raise HTTPException(status_code=500, detail="Error creating task")
-
-        # update new event with task id
-        new_status_event.task_id = task.name.split("/")[-1]
-        # update status event in db
-        return update_status_event(new_status_event)
+        # queue syncs for the parts of the user's status timeline the new event changes,
+        # then save the status event along with them in a single write
+        # if either fails, nothing is saved and no syncs are left queued
+        timeline = await get_status_timeline(user.id)
+        timeline.add(status_event)
+        try:
+            await reschedule_status_syncs(
+                user.id, timeline, new_status_events=[status_event]
+            )
+        except Exception:
+            timeline.remove(status_event.id)
+            raise
+        return status_event
 
     # bubble up any specific exception raised in the try block
     except HTTPException as http_exception:
@@ -380,9 +652,9 @@ async def patch_status_event(
 ):
     try:
         # resolve user from auth
-        user = resolve_user(auth)
+        user = await resolve_user(auth)
         # update status event
-        status_event = get_status_event_by_id(status_event_id)
+        status_event = await get_status_event_by_id(status_event_id)
         if not status_event:
             raise HTTPException(status_code=404, detail="Status event not found")
 
@@ -397,9 +669,15 @@ async def patch_status_event(
             status_text=req.status_text,
             status_emoji=req.status_emoji,
             status_expiration=status_event.end.timestamp(),  # Unix timestamp of end
+            task_id=status_event.task_id,
         )
 
-        return update_status_event(new_status_event)
+        updated_status_event = await update_status_event(new_status_event)
+        # the new text or emoji has to be synced again if the status event is being shown
+        timeline = await get_status_timeline(status_event.user_id)
+        timeline.add(updated_status_event)
+        await reschedule_status_syncs(status_event.user_id, timeline)
+        return updated_status_event
     # bubble up any specific exception raised in the try block
     except HTTPException as http_exception:
         raise http_exception
@@ -415,23 +693,29 @@ async def delete_status_event(
 ):
     try:
         # resolve user from auth
-        user = resolve_user(auth)
+        user = await resolve_user(auth)
         # make sure status event exists
-        status_event = get_status_event_by_id(status_event_id)
+        status_event = await get_status_event_by_id(status_event_id)
         if not status_event:
             raise HTTPException(status_code=404, detail="Status event not found")
 
         # delete queued task for event if before the event start time
+        # (only status events created before syncs were scheduled per timeline segment have one)
         if status_event.task_id and datetime.now(
             timezone.utc
         ) < status_event.start.replace(tzinfo=timezone.utc):
-            delete_task(status_event.task_id)
+            await scheduler.cancel(status_event.task_id)
 
         # delete status event in DB
-        deleted = delete_db_status_event(status_event_id)
+        deleted = await delete_db_status_event(status_event_id)
         if not deleted:
             raise HTTPException(status_code=500, detail="Error deleting status event")
 
+        # reschedule syncs for the parts of the user's status timeline the event covered
+        timeline = await get_status_timeline(status_event.user_id)
+        timeline.remove(status_event_id)
+        await reschedule_status_syncs(status_event.user_id, timeline)
+
     # bubble up any specific exception raised in the try block
     except HTTPException as http_exception:
         raise http_exception
@@ -441,17 +725,181 @@ async def delete_status_event(
         raise HTTPException(status_code=500, detail="Error deleting status event")
 
 
+# POST /status-events:batch
+# Create many status events for a user at once (i.e., for every occurrence of a recurring meeting)
+# valid status events are saved together, and their syncs queued with a single reschedule of the user's timeline;
+# returns a result for each status event, in the same order as the request
+@app.post("/status-events:batch", response_model=list[StatusEventBatchResult])
+async def post_status_events_batch(
+    req: StatusEventBatchRequest, auth: Authorization = Depends(verify_authorization)
+):
+    try:
+        if len(req.status_events) > MAX_STATUS_EVENTS_PER_BATCH:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {MAX_STATUS_EVENTS_PER_BATCH} status events can be created at once",
+            )
+        # resolve user from auth
+        user = await resolve_user(auth)
+
+        results: list[StatusEventBatchResult] = []
+        status_events: list[StatusEvent] = []
+        for item in req.status_events:
+            if item.end <= item.start:
+                results.append(
+                    StatusEventBatchResult(
+                        status=400, detail="Status event must end after it starts"
+                    )
+                )
+                continue
+            status_event = StatusEvent(
+                id=new_status_event_id(),
+                user_id=user.id,
+                calendar_id=item.calendar_id,
+                event_id=item.event_id,
+                start=item.start,
+                end=item.end,
+                status_text=item.status_text,
+                status_emoji=item.status_emoji,
+                status_expiration=item.end.timestamp(),  # Unix timestamp of end
+            )
+            status_events.append(status_event)
+            results.append(
+                StatusEventBatchResult(
+                    status=200, id=status_event.id, status_event=status_event
+                )
+            )
+
+        if status_events:
+            timeline = await get_status_timeline(user.id)
+            for status_event in status_events:
+                timeline.add(status_event)
+            try:
+                await reschedule_status_syncs(
+                    user.id, timeline, new_status_events=status_events
+                )
+            except Exception:
+                for status_event in status_events:
+                    timeline.remove(status_event.id)
+                raise
+        return results
+
+    # bubble up any specific exception raised in the try block
+    except HTTPException as http_exception:
+        raise http_exception
+    # catch all other exceptions, and raise as a 500
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail="Error creating status events")
+
+
+# DELETE /status-events:batch
+# Delete many of a user's status events at once
+# returns a result for each id, in the same order as the request
+@app.delete("/status-events:batch", response_model=list[StatusEventBatchResult])
+async def delete_status_events_batch(
+    req: StatusEventBatchDeleteRequest,
+    auth: Authorization = Depends(verify_authorization),
+):
+    try:
+        if len(req.ids) > MAX_STATUS_EVENTS_PER_BATCH:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {MAX_STATUS_EVENTS_PER_BATCH} status events can be deleted at once",
+            )
+        # resolve user from auth
+        user = await resolve_user(auth)
+
+        found = await get_status_events_by_ids(list(set(req.ids)))
+        # only the user's own status events can be deleted
+        status_events = {
+            id: status_event
+            for id, status_event in found.items()
+            if status_event.user_id == user.id
+        }
+        results = [
+            (
+                StatusEventBatchResult(status=200, id=id)
+                if id in status_events
+                else StatusEventBatchResult(
+                    status=404, id=id, detail="Status event not found"
+                )
+            )
+            for id in req.ids
+        ]
+        if not status_events:
+            return results
+
+        # delete queued tasks for events created before syncs were scheduled per timeline segment
+        time_now = datetime.now(timezone.utc)
+        await asyncio.gather(
+            *[
+                scheduler.cancel(status_event.task_id)
+                for status_event in status_events.values()
+                if status_event.task_id and time_now < to_utc(status_event.start)
+            ]
+        )
+        await delete_status_events(list(status_events))
+
+        # reschedule syncs for the parts of the user's status timeline the events covered
+        timeline = await get_status_timeline(user.id)
+        for id in status_events:
+            timeline.remove(id)
+        await reschedule_status_syncs(user.id, timeline)
+        return results
+
+    # bubble up any specific exception raised in the try block
+    except HTTPException as http_exception:
+        raise http_exception
+    # catch all other exceptions, and raise as a 500
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail="Error deleting status events")
+
+
 # GET /status-events
-# Returns a list of all status events *for a user*
+# Returns a page of status events *for a user*, ordered by start time
+# start_after / end_before only return status events starting at or after / ending at or before a time,
+# and fields (comma separated) only returns those fields of each status event (along with its id)
+# if there are more status events, the Next-Page-Token header is set; pass it as page_token to get the next page
 @app.get("/status-events", response_model=list[StatusEvent])
 async def get_status_events(
+    start_after: Optional[datetime] = None,
+    end_before: Optional[datetime] = None,
+    page_size: int = Query(
+        DEFAULT_STATUS_EVENTS_PAGE_SIZE, ge=1, le=MAX_STATUS_EVENTS_PAGE_SIZE
+    ),
+    page_token: Optional[str] = None,
+    fields: Optional[str] = None,
     auth: Authorization = Depends(verify_authorization),
 ):
     try:
+        field_list = None
+        if fields is not None:
+            field_list = [field.strip() for field in fields.split(",") if field.strip()]
+            unknown = set(field_list) - set(StatusEvent.model_fields)
+            if unknown:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+                )
+        cursor = decode_page_token(page_token) if page_token else None
+
         # resolve user from auth
-        user = resolve_user(auth)
-        # return all status events for that user
-        return get_status_events_by_user(user.id)
+        user = await resolve_user(auth)
+        events, next_cursor = await get_status_events_page(
+            user.id,
+            page_size,
+            cursor=cursor,
+            start_after=start_after,
+            end_before=end_before,
+            fields=field_list,
+        )
+        headers = {}
+        if next_cursor:
+            headers["Next-Page-Token"] = encode_page_token(next_cursor)
+        # already serialized (and possibly projected), so skip response model validation
+        return JSONResponse(content=events, headers=headers)
 
     # bubble up any specific exception raised in the try block
     except HTTPException as http_exception:
@@ -462,6 +910,96 @@ async def get_status_events(
         raise HTTPException(status_code=500, detail="Error retrieving status events")
 
 
+# Page tokens are the (start time, id) of the last status event on the previous page
+def encode_page_token(cursor: tuple[datetime, str]) -> str:
+    start_at, id = cursor
+    data = json.dumps([to_utc(start_at).isoformat(), id])
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_page_token(page_token: str) -> tuple[datetime, str]:
+    try:
+        start_at, id = json.loads(base64.urlsafe_b64decode(page_token.encode()))
+        return datetime.fromisoformat(start_at), id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid page token")
+
+
+############################################
+# STATUS RULE ROUTES
+############################################
+
+
+# GET /status-rules
+# Returns the user's status rules, in the order they're matched
+@app.get("/status-rules", response_model=list[StatusRule])
+async def get_user_status_rules(auth: Authorization = Depends(verify_authorization)):
+    try:
+        # resolve user from auth
+        user = await resolve_user(auth)
+        return await get_status_rules(user.id)
+
+    # bubble up any specific exception raised in the try block
+    except HTTPException as http_exception:
+        raise http_exception
+    # catch all other exceptions, and raise as a 500
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail="Error retrieving status rules")
+
+
+# PUT /status-rules
+# Replaces the user's status rules, and applies them to their upcoming calendar events right away
+# rules are matched in order, and the first rule matching a calendar event sets the status for it
+@app.put("/status-rules", response_model=list[StatusRule])
+async def put_user_status_rules(
+    req: list[StatusRuleRequest], auth: Authorization = Depends(verify_authorization)
+):
+    try:
+        if len(req) > MAX_STATUS_RULES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {MAX_STATUS_RULES} status rules can be set",
+            )
+        for rule in req:
+            if (
+                rule.summary_pattern
+                and len(rule.summary_pattern) > MAX_SUMMARY_PATTERN_LENGTH
+            ):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Summary patterns can be at most {MAX_SUMMARY_PATTERN_LENGTH} characters",
+                )
+
+        # resolve user from auth
+        user = await resolve_user(auth)
+        rules = await put_status_rules(
+            user.id,
+            [StatusRule(id=status_rule_id(rule), **rule.model_dump()) for rule in req],
+        )
+        await evaluate_status_rules(user.id, rules)
+        return rules
+
+    # bubble up any specific exception raised in the try block
+    except HTTPException as http_exception:
+        raise http_exception
+    # catch all other exceptions, and raise as a 500
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail="Error saving status rules")
+
+
+# Applies the user's status rules to their upcoming calendar events,
+# and reschedules syncs for whatever parts of their status timeline changed
+async def evaluate_status_rules(user_id: str, rules: list[StatusRule]):
+    timeline = await get_status_timeline(user_id)
+    timeline.set_rule_status_events(await get_rule_status_events(user_id, rules))
+    await reschedule_status_syncs(user_id, timeline)
+
+
+rule_evaluator = RuleEvaluator(evaluate_status_rules)
+
+
 ############################################
 # CALENDAR ROUTES
 ############################################
@@ -471,10 +1009,9 @@ async def get_status_events(
 # Returns a list of all Google Calendars for a user
 @app.get("/calendars", response_model=list[Calendar])
 async def get_calendars(auth: Authorization = Depends(verify_authorization)):
-    cred = credentials.Credentials(token=auth.access_token)
-    service = build("calendar", "v3", credentials=cred)
+    service = calendar_service()
     try:
-        calendars = service.calendarList().list().execute()
+        calendars = await execute(service.calendarList().list(), auth.access_token)
         items = calendars.get("items", [])
         return [
             Calendar(
@@ -507,62 +1044,484 @@ async def get_calendars(auth: Authorization = Depends(verify_authorization)):
 
 # GET /calendars/:calendarID/events
 # Returns a list of all events for a given Google Calendar
+# with an "Accept: application/x-ndjson" header, events are streamed as newline-delimited JSON
+# as each page is fetched from Google, instead of being returned once all pages are fetched
 @app.get("/calendars/{calendar_id}/events", response_model=list[CalendarEvent])
 async def get_calendar_events(
-    calendar_id: str, auth: Authorization = Depends(verify_authorization)
+    calendar_id: str,
+    auth: Authorization = Depends(verify_authorization),
+    accept: str = Header(None),
 ):
-    cred = credentials.Credentials(token=auth.access_token)
-    service = build("calendar", "v3", credentials=cred)
     try:
-        calendar = service.calendarList().get(calendarId=calendar_id).execute()
-        # get the timezone for this calendar, to offset events
-        # if no timezone is set, default to UTC
-        time_zone = ZoneInfo(calendar.get("timeZone", "UTC"))
-        # Get color themes for calendar events
-        colors = service.colors().get().execute()
-        event_colors = colors.get("event", {})
-
-        # Set constraints for the current day, and a year from the current day
-        time_now = datetime.now(timezone.utc)
-        # Cloud Tasks only allows scheduling tasks up to 30 days in the future
-        # for this reason, only display events in the next 30 days
-        time_max = time_now + timedelta(days=30)
-        # Get events in the specified calendar, *after* the current time
-        events = (
-            service.events()
-            .list(
-                calendarId=calendar_id,
-                timeMin=time_now.isoformat(),
-                timeMax=time_max.isoformat(),
+        pages = iter_calendar_events(
+            calendar_id, auth.access_token, auth.data["user_id"]
+        )
+        if accept and NDJSON_MEDIA_TYPE in accept:
+            # fetch the first page before responding, so errors fetching the calendar
+            # are still returned with the right status code
+            first_page = await anext(pages)
+            return StreamingResponse(
+                stream_ndjson(first_page, pages), media_type=NDJSON_MEDIA_TYPE
+            )
+        return [event async for page in pages for event in page]
+    # bubble up any specific exception raised in the try block
+    except HTTPException as http_exception:
+        raise http_exception
+    # catch all other exceptions, and raise as a 500
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail="Error retrieving calendars")
+
+
+# Streams pages of events as newline-delimited JSON, one event per line
+async def stream_ndjson(first_page: list[CalendarEvent], pages):
+    for event in first_page:
+        yield event.model_dump_json() + "\n"
+    try:
+        async for page in pages:
+            for event in page:
+                yield event.model_dump_json() + "\n"
+    # the status code has already been sent, so all that can be done is end the stream early
+    except Exception as e:
+        print(e)
+
+
+# GET /events?calendar_ids=...&calendar_ids=...
+# Returns a single list of events across multiple Google Calendars, sorted by start time
+# calendars are fetched concurrently, so this takes as long as the slowest calendar
+@app.get("/events", response_model=list[CalendarEvent])
+async def get_events(
+    calendar_ids: list[str] = Query(...),
+    auth: Authorization = Depends(verify_authorization),
+):
+    try:
+        # ignore duplicate ids, while keeping the requested order
+        calendar_ids = list(dict.fromkeys(calendar_ids))
+        if len(calendar_ids) > MAX_CALENDARS_PER_REQUEST:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Cannot request more than {MAX_CALENDARS_PER_REQUEST} calendars at once",
             )
-            .execute()
+        calendar_events = await asyncio.gather(
+            *[
+                fetch_calendar_events(
+                    calendar_id, auth.access_token, auth.data["user_id"]
+                )
+                for calendar_id in calendar_ids
+            ]
         )
-        items = events.get("items", [])
-        return [
-            CalendarEvent(
-                id=item["id"],
+        return sorted(
+            (event for events in calendar_events for event in events),
+            key=lambda event: event.start,
+        )
+    # bubble up any specific exception raised in the try block
+    except HTTPException as http_exception:
+        raise http_exception
+    # catch all other exceptions, and raise as a 500
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail="Error retrieving events")
+
+
+# Fetches all upcoming events for a given Google Calendar (see iter_calendar_events)
+async def fetch_calendar_events(
+    calendar_id: str, access_token: str, user_id: str, watch: bool = True
+) -> list[CalendarEvent]:
+    return [
+        event
+        async for page in iter_calendar_events(
+            calendar_id, access_token, user_id, watch=watch
+        )
+        for event in page
+    ]
+
+
+# Yields pages of upcoming events for a given Google Calendar
+# the first time a user's calendar is requested (or once the stored window runs out), all events
+# in the window are fetched, following nextPageToken; recurring events are expanded into single events
+# the events and Google's sync token are then stored, so later requests only fetch what changed since
+# always yields at least one (possibly empty) page
+# unless watch is False (i.e., when syncing for a push notification), the calendar is also watched for
+# changes with the user's access token; failing to watch it doesn't fail loading it
+async def iter_calendar_events(
+    calendar_id: str, access_token: str, user_id: str, watch: bool = True
+):
+    from googleapiclient.errors import HttpError
+
+    service = calendar_service()
+    # Set constraints for the current day, and a year from the current day
+    time_now = datetime.now(timezone.utc)
+    # only display events that status events can be scheduled for
+    time_max = time_now + CALENDAR_WINDOW
+
+    # Get events in the specified calendar, *after* the current time
+    def list_events(page_token: str = None):
+        return service.events().list(
+            calendarId=calendar_id,
+            timeMin=time_now.isoformat(),
+            timeMax=time_max.isoformat(),
+            singleEvents=True,
+            orderBy="startTime",
+            maxResults=CALENDAR_EVENTS_PAGE_SIZE,
+            pageToken=page_token,
+        )
+
+    # Get events that changed since the sync token was issued
+    # (sync tokens can't be combined with time constraints or ordering)
+    def list_changed_events(sync_token: str, page_token: str = None):
+        return service.events().list(
+            calendarId=calendar_id,
+            singleEvents=True,
+            maxResults=CALENDAR_EVENTS_PAGE_SIZE,
+            syncToken=sync_token,
+            pageToken=page_token,
+        )
+
+    async def first_page():
+        sync = await get_calendar_sync(user_id, calendar_id)
+        # only sync from the stored events if they cover (nearly) the whole window
+        if sync and sync.sync_token and sync.window_end >= time_max - SYNC_WINDOW_SLACK:
+            try:
+                return (
+                    sync,
+                    True,
+                    await execute(list_changed_events(sync.sync_token), access_token),
+                )
+            except HttpError as e:
+                # Google invalidated the sync token, so fall back to fetching everything
+                if e.resp.status != 410:
+                    raise
+        return sync, False, await execute(list_events(), access_token)
+
+    async def keep_watching():
+        if not watch:
+            return
+        try:
+            await watch_calendar_channel(calendar_id, access_token, user_id)
+        except Exception as e:
+            print(e)
+
+    # The calendar (for its timezone), color themes, first page of events and watch channel don't
+    # depend on each other, so request them concurrently; color themes are usually already cached,
+    # and the channel usually only has to be looked up
+    calendar, colors, (sync, incremental, events), _ = await asyncio.gather(
+        execute(service.calendarList().get(calendarId=calendar_id), access_token),
+        get_colors(access_token),
+        first_page(),
+        keep_watching(),
+    )
+    # get the timezone for this calendar, to offset events
+    # if no timezone is set, default to UTC
+    time_zone = ZoneInfo(calendar.get("timeZone", "UTC"))
+    event_colors = colors.get("event", {})
+
+    # events that moved or were cancelled since the last sync,
+    # so any status events for them can be rescheduled
+    changed_events = {}
+    cancelled_event_ids = set()
+
+    if incremental:
+        # the stored sync is shared with the cache, so changes are merged into a copy of its events
+        merged_events = dict(sync.events)
+        while True:
+            for item in events.get("items", []):
+                if item.get("status") == "cancelled":
+                    merged_events.pop(item["id"], None)
+                    cancelled_event_ids.add(item["id"])
+                    continue
+                event = parse_calendar_event(item, calendar_id, time_zone, event_colors)
+                changed_events[event.id] = event
+                # don't store events past the synced window, since they'd only
+                # be some of the events in that time
+                if event.start < sync.window_end:
+                    merged_events[event.id] = event
+                else:
+                    merged_events.pop(event.id, None)
+            page_token = events.get("nextPageToken")
+            if not page_token:
+                break
+            events = await execute(
+                list_changed_events(sync.sync_token, page_token), access_token
+            )
+        # nothing changed, so the stored sync token is still good to use
+        if changed_events or cancelled_event_ids:
+            await put_calendar_sync(
+                sync.model_copy(
+                    update={
+                        "sync_token": events.get("nextSyncToken"),
+                        "events": merged_events,
+                    }
+                )
+            )
+
+        yield sorted(
+            (
+                event
+                for event in merged_events.values()
+                if event.end > time_now and event.start < time_max
+            ),
+            key=lambda event: event.start,
+        )
+    else:
+        synced_events = {}
+        while True:
+            page = [
+                parse_calendar_event(item, calendar_id, time_zone, event_colors)
+                for item in events.get("items", [])
+                if item.get("status") != "cancelled"
+            ]
+            synced_events.update((event.id, event) for event in page)
+            yield page
+            page_token = events.get("nextPageToken")
+            if not page_token:
+                break
+            events = await execute(list_events(page_token), access_token)
+
+        # without a sync token, changes are found by comparing against the stored events
+        # that are in both the previous and current windows
+        if sync:
+            for id, previous in sync.events.items():
+                if previous.end <= time_now or previous.start >= sync.window_end:
+                    continue
+                event = synced_events.get(id)
+                if not event:
+                    cancelled_event_ids.add(id)
+                elif (event.start, event.end) != (previous.start, previous.end):
+                    changed_events[id] = event
+
+        # store the events, so later requests can sync from here
+        await put_calendar_sync(
+            CalendarSync(
+                id="",
+                user_id=user_id,
                 calendar_id=calendar_id,
-                summary=item.get("summary", ""),
-                description=item.get("description", ""),
-                color=(
-                    CalendarColor(**event_colors.get(item["colorId"], {}))
-                    if "colorId" in item
-                    else None
-                ),
-                start=parse_event_time(item["start"], time_zone),
-                end=parse_event_time(item["end"], time_zone),
-                # True if the "date" field is present, which only occurs for all-day events
-                all_day="date" in item["start"],
+                sync_token=events.get("nextSyncToken"),
+                window_end=time_max,
+                events=synced_events,
             )
-            for item in items
-        ]
+        )
+
+    if changed_events or cancelled_event_ids:
+        await reconcile_status_events(
+            user_id, calendar_id, changed_events, cancelled_event_ids
+        )
+    # status rules are matched against the stored events, so apply them again whenever those change
+    if changed_events or cancelled_event_ids or not incremental:
+        user = await get_user_by_firebase_user_id(user_id)
+        rules = await get_status_rules(user.id) if user else []
+        if rules:
+            await evaluate_status_rules(user.id, rules)
+
+
+# Moves or removes status events after the calendar events they were created for change
+# status events that have already started are left as is
+async def reconcile_status_events(
+    firebase_user_id: str,
+    calendar_id: str,
+    changed_events: dict[str, CalendarEvent],
+    cancelled_event_ids: set[str],
+):
+    user = await get_user_by_firebase_user_id(firebase_user_id)
+    if not user:
+        return
+    time_now = datetime.now(timezone.utc)
+    timeline = None
+    for status_event in await get_status_events_by_calendar(user.id, calendar_id):
+        if to_utc(status_event.start) <= time_now:
+            continue
+        event_id = status_event.event_id
+        if event_id in cancelled_event_ids:
+            if status_event.task_id:
+                await scheduler.cancel(status_event.task_id)
+            await delete_db_status_event(status_event.id)
+            timeline = timeline or await get_status_timeline(user.id)
+            timeline.remove(status_event.id)
+        elif event_id in changed_events:
+            event = changed_events[event_id]
+            if (to_utc(event.start), to_utc(event.end)) == (
+                to_utc(status_event.start),
+                to_utc(status_event.end),
+            ):
+                continue
+            if status_event.task_id:
+                await scheduler.cancel(status_event.task_id)
+            status_event.start = event.start
+            status_event.end = event.end
+            status_event.status_expiration = event.end.timestamp()
+            status_event.task_id = None
+            await update_status_event(status_event)
+            timeline = timeline or await get_status_timeline(user.id)
+            timeline.add(status_event)
+
+    # queue syncs for the new timeline once, after every status event has been moved
+    if timeline:
+        await reschedule_status_syncs(user.id, timeline)
+
+
+# POST /calendars/:calendarID/watch
+# Watches a Google Calendar for changes (see watch_calendar_channel); calendars are already watched
+# whenever their events are loaded, so this is only needed to watch one without loading it
+# push notifications are only acted on within an hour of the user's last visit (see calendar_notification)
+@app.post("/calendars/{calendar_id}/watch")
+async def watch_calendar(
+    calendar_id: str, auth: Authorization = Depends(verify_authorization)
+):
+    try:
+        channel = await watch_calendar_channel(
+            calendar_id, auth.access_token, auth.data["user_id"]
+        )
+        return {"channel_id": channel.channel_id, "expiration": channel.expiration}
+
     # bubble up any specific exception raised in the try block
     except HTTPException as http_exception:
         raise http_exception
     # catch all other exceptions, and raise as a 500
     except Exception as e:
         print(e)
-        raise HTTPException(status_code=500, detail="Error retrieving calendars")
+        raise HTTPException(status_code=500, detail="Error watching calendar")
+
+
+# Watches a Google Calendar for changes, so status events are moved or removed along with their calendar events
+# called whenever the calendar's events are loaded, since that's when the user's access token is at hand;
+# Google only lets channels live for a limited time, so an existing channel is kept (with the latest
+# access token) until it's close to expiring, then replaced
+# the access token is what notifications are synced with, and it's only valid for an hour, so changes
+# are only pushed within an hour of the user's last visit; after that they wait for the next one
+async def watch_calendar_channel(
+    calendar_id: str, access_token: str, user_id: str
+) -> CalendarChannel:
+    id = calendar_channel_id(user_id, calendar_id)
+    # already verified, so this is just a cache lookup
+    token_info = await verify_google_access_token(access_token)
+    access_token_expiration = datetime.fromtimestamp(
+        float(token_info["exp"]), timezone.utc
+    )
+
+    channel = await get_calendar_channel(id)
+    time_now = datetime.now(timezone.utc)
+    if not channel or channel.expiration - time_now < CHANNEL_RENEWAL_WINDOW:
+        service = calendar_service()
+        # channel ids are prefixed with the stored channel's id, so notifications can be matched to it
+        channel_id = f"{id}-{secrets.token_hex(8)}"
+        token = secrets.token_urlsafe(32)
+        watched = await execute(
+            service.events().watch(
+                calendarId=calendar_id,
+                body={
+                    "id": channel_id,
+                    "type": "web_hook",
+                    "address": CALENDAR_NOTIFICATIONS_URL,
+                    "token": token,
+                },
+            ),
+            access_token,
+        )
+        if channel:
+            await stop_calendar_channel(channel, access_token)
+        channel = CalendarChannel(
+            id=id,
+            channel_id=channel_id,
+            user_id=user_id,
+            calendar_id=calendar_id,
+            resource_id=watched["resourceId"],
+            token=token,
+            # expiration is a unix timestamp in milliseconds
+            expiration=datetime.fromtimestamp(
+                int(watched["expiration"]) / 1000, timezone.utc
+            ),
+        )
+    # an existing channel that's already on this access token doesn't need to be saved again
+    elif channel.access_token == access_token:
+        return channel
+
+    channel.access_token = access_token
+    channel.access_token_expiration = access_token_expiration
+    await put_calendar_channel(channel)
+    return channel
+
+
+async def stop_calendar_channel(channel: CalendarChannel, access_token: str):
+    try:
+        await execute(
+            calendar_service()
+            .channels()
+            .stop(body={"id": channel.channel_id, "resourceId": channel.resource_id}),
+            access_token,
+        )
+    # the channel will expire on its own anyway
+    except Exception as e:
+        print(e)
+
+
+# POST /calendar/notifications
+# This endpoint is hit by Google Calendar whenever a watched calendar changes
+# the calendar is synced with the access token stored for the channel, which reschedules or removes
+# any status events whose calendar events changed; that token is the one from the user's last visit,
+# so this only works within an hour of it; once it has expired, the changes are picked up the next
+# time the user loads the calendar instead
+@app.post("/calendar/notifications")
+async def calendar_notification(
+    x_goog_channel_id: str = Header(None),
+    x_goog_channel_token: str = Header(None),
+    x_goog_resource_state: str = Header(None),
+):
+    if not x_goog_channel_id or not x_goog_channel_token:
+        raise HTTPException(status_code=400, detail="Invalid calendar notification")
+    try:
+        channel = await get_calendar_channel(x_goog_channel_id.rsplit("-", 1)[0])
+        # notifications for replaced channels can still arrive until they're stopped
+        if not channel or channel.channel_id != x_goog_channel_id:
+            raise HTTPException(status_code=404, detail="Channel not found")
+        if not secrets.compare_digest(channel.token, x_goog_channel_token):
+            raise HTTPException(status_code=401, detail="Invalid channel token")
+
+        # "sync" is sent once when the channel is created, and doesn't mean anything changed
+        if x_goog_resource_state == "sync":
+            return {}
+
+        time_now = datetime.now(timezone.utc)
+        if (
+            channel.access_token
+            and channel.access_token_expiration
+            and channel.access_token_expiration > time_now + timedelta(minutes=1)
+        ):
+            # the channel is renewed when the user next loads the calendar
+            await fetch_calendar_events(
+                channel.calendar_id,
+                channel.access_token,
+                channel.user_id,
+                watch=False,
+            )
+        return {}
+
+    # bubble up any specific exception raised in the try block
+    except HTTPException as http_exception:
+        raise http_exception
+    # the change will still be picked up on the next sync, so don't have Google retry
+    except Exception as e:
+        print(e)
+        return {}
+
+
+# Helper to convert a Google Calendar event to a CalendarEvent
+def parse_calendar_event(
+    item: dict, calendar_id: str, time_zone: ZoneInfo, event_colors: dict
+) -> CalendarEvent:
+    return CalendarEvent(
+        id=item["id"],
+        calendar_id=calendar_id,
+        summary=item.get("summary", ""),
+        description=item.get("description", ""),
+        color=(
+            CalendarColor(**event_colors.get(item["colorId"], {}))
+            if "colorId" in item
+            else None
+        ),
+        start=parse_event_time(item["start"], time_zone),
+        end=parse_event_time(item["end"], time_zone),
+        # True if the "date" field is present, which only occurs for all-day events
+        all_day="date" in item["start"],
+    )
 
 
 # Helper to parse the event time to datetime, no matter how Google Calendars returns it
@@ -588,92 +1547,29 @@ def parse_event_time(event_time: dict, time_zone: ZoneInfo) -> datetime:
 
 
 ############################################
-# SYNCER (Google Tasks) ROUTES
+# SYNCER ROUTES
 ############################################
 
 
-# Create a Google Tasks API task, and add it to the current queue
-# when triggered (at the schedule_time), this task will hit the "/status-events/{status_event_id}/sync" endpoint
-# with the provided body
-def create_task(status_event_id: str, schedule_time: datetime):
-    # convert schedule time to utc
-    # if the timestamp is not tz-aware, make it tz-aware to utc
-    if schedule_time.tzinfo is None:
-        schedule_time = schedule_time.replace(tzinfo=timezone.utc)
-    # if the timestamp is tz-aware, convert it to utc
-    else:
-        schedule_time = schedule_time.astimezone(timezone.utc)
-
-    # convert timestamp to protobuf for gcloud
-    timestamp = timestamp_pb2.Timestamp()
-    timestamp.FromDatetime(schedule_time)
-
-    # define task payload
-    task = {
-        "http_request": {
-            "http_method": tasks_v2.HttpMethod.POST,
-            "url": f"{SERVER_BASE_URL}/status-events/{status_event_id}/sync",
-            # not necessarily needed since this request has no body, but good to have
-            "headers": {"Content-Type": "application/json"},
-            "oidc_token": {
-                "service_account_email": GOOGLE_CLOUD_SERVICE_ACCOUNT,
-            },
-        },
-        "schedule_time": timestamp,
-    }
-    # configure path for queue
-    path = tasks_client.queue_path(
-        GOOGLE_CLOUD_PROJECT_ID, GOOGLE_CLOUD_LOCATION, GOOGLE_CLOUD_QUEUE_NAME
-    )
-    return tasks_client.create_task(tasks_v2.CreateTaskRequest(parent=path, task=task))
-
-
-def delete_task(task_id: str):
-    # configure path for queue
-    path = tasks_client.queue_path(
-        GOOGLE_CLOUD_PROJECT_ID, GOOGLE_CLOUD_LOCATION, GOOGLE_CLOUD_QUEUE_NAME
-    )
-    # delete task
-    tasks_client.delete_task(tasks_v2.DeleteTaskRequest(name=f"{path}/tasks/{task_id}"))
-
-
-def update_slack_status(event: StatusEvent):
+async def update_slack_status(event: StatusEvent, user: User):
     try:
-        # resolve user from auth
-        user = get_user_by_id(event.user_id)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-
         token = user.slack_access_token
         if not token:
             raise HTTPException(
                 status_code=400, detail="User has not authenticated with Slack"
             )
 
-        path = "https://slack.com/api/users.profile.set"
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json; charset=utf-8",
-        }
-        data = {
-            "profile": {
-                "status_text": event.status_text,
-                "status_emoji": (
-                    f":{event.status_emoji.name}:" if event.status_emoji else ""
-                ),
-                "status_expiration": event.status_expiration,
-            }
-        }
-        response = requests.post(path, headers=headers, json=data)
-        data = response.json()
-
-        if not data.get("ok"):
-            print(data)
-            raise HTTPException(
-                status_code=400, detail="Failed updating status in Slack"
+        data = {"profile": slack_profile(event)}
+        try:
+            return await slack_client.call(
+                "users.profile.set",
+                token=token,
+                team_id=user.slack_team_id,
+                json=data,
             )
-
-        return data
+        except SlackError as e:
+            print(e)
+            raise slack_http_exception(e, "Failed updating status in Slack")
 
     # bubble up any specific exception raised in the try block
     except HTTPException as http_exception:
@@ -684,6 +1580,16 @@ def update_slack_status(event: StatusEvent):
         raise HTTPException(status_code=500, detail="Error updating Slack status")
 
 
+# Converts a failed Slack request to an HTTPException
+# requests that are still rate limited are returned as a 429 with Retry-After,
+# so Cloud Tasks retries them (and clients can back off)
+def slack_http_exception(e: SlackError, detail: str) -> HTTPException:
+    if e.ratelimited:
+        headers = {"Retry-After": str(int(e.retry_after or 1))}
+        return HTTPException(status_code=429, detail=detail, headers=headers)
+    return HTTPException(status_code=400, detail=detail)
+
+
 # POST /status-events/{status_event_id}/sync
 # This endpoint is hit by the Google Tasks API, and syncs the status event with Slack;
 # resolves the status event by the path param, and updates the user's slack status with the status event's details
@@ -696,13 +1602,8 @@ async def sync_status_event(
         if not auth:
             raise HTTPException(status_code=401, detail="Invalid token")
 
-        # get status event by path param
-        status_event = get_status_event_by_id(status_event_id)
-        if not status_event:
-            raise HTTPException(status_code=404, detail="Status event not found")
-
-        # update slack status with status event
-        response = update_slack_status(status_event)
+        # syncs arriving together are batched, see apply_status_event_sync
+        response = await sync_batcher.submit(status_event_id)
         if not response:
             raise HTTPException(status_code=500, detail="Error syncing status event")
 
@@ -713,3 +1614,173 @@ async def sync_status_event(
     except Exception as e:
         print(e)
         raise HTTPException(status_code=500, detail="Error syncing status event")
+
+
+# Schedules a sync for every segment of the user's status timeline that hasn't been scheduled yet,
+# and cancels syncs for segments that no longer exist; one sync per change of the shown status,
+# instead of one per status event
+# scheduled syncs are stored per user, so any instance can tell which ones changed
+# tasks are named after their segment, so retried reschedules don't queue duplicate syncs; new syncs
+# are queued before the stored syncs (and new_status_events, if given) are saved, and old ones are
+# only cancelled after, so a failed reschedule leaves the previous syncs in place
+# a cached timeline that's older than the stored syncs (i.e., another instance changed it since) is
+# reloaded first, and syncs the timeline hasn't seen are kept rather than cancelled
+# if neither the syncs nor the status events they're scheduled from changed, nothing is written,
+# so the version (and every other instance's cached timeline) stays current
+async def reschedule_status_syncs(
+    user_id: str,
+    timeline: StatusTimeline,
+    new_status_events: Optional[list[StatusEvent]] = None,
+):
+    lock = reschedule_locks.setdefault(user_id, asyncio.Lock())
+    async with lock:
+        scheduled, version, stored_digest = await get_status_timeline_syncs(user_id)
+        reloaded = version != timeline.version
+        if reloaded:
+            timeline = await load_status_timeline(user_id)
+            # new status events aren't saved until the syncs are
+            for status_event in new_status_events or []:
+                timeline.add(status_event)
+            scheduled, version, stored_digest = await get_status_timeline_syncs(user_id)
+
+        time_now = datetime.now(timezone.utc)
+        segments = {
+            segment.key: segment for segment in timeline.segments(after=time_now)
+        }
+        # segments that already started have fired, so there's nothing to cancel for them
+        upcoming = {
+            key: task_id
+            for key, task_id in scheduled.items()
+            if key not in segments and segment_start(key) > time_now
+        }
+        # only possible if the syncs changed again while the timeline was being reloaded
+        current = version == timeline.version
+        unseen = {} if current else upcoming
+        stale = [task_id for key, task_id in upcoming.items() if key not in unseen]
+        new = [segment for key, segment in segments.items() if key not in scheduled]
+        digest = timeline.digest(after=time_now)
+        if (
+            current
+            and not new
+            and not new_status_events
+            and digest == stored_digest
+            # i.e., every stored sync is kept
+            and all(key in segments for key in scheduled)
+        ):
+            return
+        results = await asyncio.gather(
+            *[
+                scheduler.schedule(
+                    segment.status_event.id,
+                    max(segment.start, time_now),
+                    task_id=segment.key,
+                )
+                for segment in new
+            ],
+            return_exceptions=True,
+        )
+        created = [id for id in results if not isinstance(id, BaseException)]
+        try:
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            syncs = {key: scheduled[key] for key in segments if key in scheduled}
+            syncs.update(unseen)
+            syncs.update({segment.key: id for segment, id in zip(new, results)})
+            if new_status_events:
+                await put_status_events_with_timeline_syncs(
+                    new_status_events, user_id, syncs, version + 1, digest
+                )
+            else:
+                await put_status_timeline_syncs(user_id, syncs, version + 1, digest)
+        except Exception:
+            # roll back the syncs queued for this reschedule
+            await asyncio.gather(
+                *[scheduler.cancel(id) for id in created], return_exceptions=True
+            )
+            # (callers roll back the timeline they passed in themselves)
+            if reloaded:
+                for status_event in new_status_events or []:
+                    timeline.remove(status_event.id)
+            raise
+        # otherwise the timeline stays behind, and is reloaded by the next reschedule
+        if current:
+            timeline.version = version + 1
+
+        await asyncio.gather(*[scheduler.cancel(task_id) for task_id in stale])
+
+
+# Start time of a timeline segment, from its key (see Segment.key)
+def segment_start(key: str) -> datetime:
+    return datetime.fromtimestamp(int(key.split("-")[-2]), timezone.utc)
+
+
+# user id -> lock, so reschedules for the same user on this instance don't interleave
+reschedule_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+    weakref.WeakValueDictionary()
+)
+
+
+# Syncs a single status event with Slack, as part of a batch of syncs
+# the status event, its user and their status timeline are loaded once for the whole batch, by the SyncBatcher
+# syncs are idempotent: retries of a sync that already ran, syncs ordered before the status last
+# applied to the user (see database.sync_order), and syncs that wouldn't change the user's status are skipped without calling Slack
+async def apply_status_event_sync(
+    status_event_id: str,
+    status_event: StatusEvent,
+    user: User,
+    timeline: Optional[StatusTimeline] = None,
+):
+    # status events created by status rules aren't stored, so there's nothing to load for them
+    if not status_event and not is_rule_status_event_id(status_event_id):
+        raise HTTPException(status_code=404, detail="Status event not found")
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # whichever of the user's syncs fired, apply the status that should be shown right now
+    # (with overlapping status events, that isn't necessarily this one)
+    if timeline is None:
+        timeline = await load_status_timeline(user.id)
+    segment = timeline.segment_at(datetime.now(timezone.utc))
+    if not segment:
+        return {"ok": True, "skipped": "inactive"}
+    status_event = segment.effective_status_event()
+
+    digest = profile_digest(slack_profile(status_event))
+    start = segment.start
+    outcome = await claim_sync_execution(
+        status_event.id, user.id, timeline.version, start, digest, SYNC_CLAIM_TTL
+    )
+    # another request is syncing this status event right now;
+    # fail this one, so it's retried (and skipped) once that sync is done
+    if outcome == "in_progress":
+        raise HTTPException(
+            status_code=409, detail="Status event is already being synced"
+        )
+    if outcome != "claimed":
+        return {"ok": True, "skipped": outcome}
+
+    # update slack status with status event
+    try:
+        response = await update_slack_status(status_event, user)
+    except Exception:
+        await release_sync_execution(status_event.id)
+        raise
+    await complete_sync_execution(
+        status_event.id,
+        user.id,
+        timeline.version,
+        start,
+        digest,
+        status_event.status_expiration,
+    )
+    # how long after the status should have been shown it actually was
+    SYNC_LAG.observe(max((datetime.now(timezone.utc) - start).total_seconds(), 0))
+    return response
+
+
+sync_batcher = SyncBatcher(
+    apply_status_event_sync,
+    user_id_of=rule_status_event_user_id,
+    load_timelines=get_status_timelines,
+)
@@ -0,0 +1,195 @@
+import asyncio
+import os
+import random
+import time
+from typing import Optional
+import httpx
+from src.cache import TTLCache, token_key
+from src.metrics import SLACK_RATE_LIMIT_WAIT, SLACK_REQUESTS, timed
+from src.utils import ssl_context
+
+# Overridable, so the server can be run against a local fake Slack API
+SLACK_API_BASE_URL = os.environ.get("SLACK_API_BASE_URL", "https://slack.com/api")
+
+# Requests allowed per minute for each method, (per user token, per workspace)
+# these stay just under Slack's published limits, so bursts are spread out on our side
+# instead of being rejected by Slack
+SLACK_RATE_LIMITS = {
+    "users.profile.set": (10, 50),
+    "emoji.list": (20, 20),
+}
+# max number of times a rate limited (or failed) request is retried
+SLACK_MAX_RETRIES = 3
+# requests that would have to wait longer than this for a rate limit are failed instead,
+# so callers (i.e., Cloud Tasks) can retry them later
+SLACK_MAX_WAIT = 30.0
+# upper bound (in seconds) of the random delay added to retries, so retries don't all land at once
+SLACK_RETRY_JITTER = 1.0
+
+
+class SlackError(Exception):
+    def __init__(self, method: str, error: str, retry_after: Optional[float] = None):
+        super().__init__(f"Slack {method} failed: {error}")
+        self.method = method
+        self.error = error
+        # seconds until the request can be retried, for rate limited requests
+        self.retry_after = retry_after
+
+    @property
+    def ratelimited(self) -> bool:
+        return self.error == "ratelimited"
+
+
+# Token bucket, allowing `rate` requests per second on average, in bursts of up to `capacity`
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        # requests aren't allowed until this time, after Slack responds with Retry-After
+        self._paused_until = 0.0
+
+    # Takes a token, returning how long (in seconds) the caller has to wait before using it
+    # tokens are reserved up front, so concurrent callers queue up instead of racing
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+        self._tokens -= 1
+        wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        return max(wait, self._paused_until - now)
+
+    # Gives back a token reserved by a caller that didn't end up waiting for it
+    def release(self):
+        self._tokens = min(self.capacity, self._tokens + 1)
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+# Shared Slack Web API client
+# keeps connections to Slack alive between requests, rate limits requests per user token and
+# per workspace, and retries rate limited requests after Slack's Retry-After (plus jitter)
+class SlackClient:
+    def __init__(self, base_url: str = SLACK_API_BASE_URL):
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=10.0,
+            verify=ssl_context(),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+        # buckets for tokens or workspaces that haven't made requests in a while are dropped
+        self._buckets = TTLCache("slack_rate_limits", max_size=10000, ttl=10 * 60)
+
+    async def close(self):
+        await self._http.aclose()
+
+    # Calls a Slack Web API method, returning the response data
+    # raises SlackError if Slack responds with ok: false, or the request is still rate limited after retrying
+    async def call(
+        self,
+        method: str,
+        token: Optional[str] = None,
+        team_id: Optional[str] = None,
+        http_method: str = "POST",
+        params: Optional[dict] = None,
+        data: Optional[dict] = None,
+        json: Optional[dict] = None,
+    ) -> dict:
+        headers = {}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        if json is not None:
+            headers["Content-Type"] = "application/json; charset=utf-8"
+        buckets = self._get_buckets(method, token, team_id)
+
+        for attempt in range(SLACK_MAX_RETRIES + 1):
+            await self._acquire(method, buckets)
+            try:
+                async with timed("slack", method):
+                    response = await self._http.request(
+                        http_method,
+                        f"/{method}",
+                        params=params,
+                        data=data,
+                        json=json,
+                        headers=headers,
+                    )
+            except httpx.TransportError as e:
+                SLACK_REQUESTS.labels(method, "transport_error").inc()
+                if attempt == SLACK_MAX_RETRIES:
+                    raise SlackError(method, "transport_error") from e
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code == 429:
+                retry_after = float(response.headers.get("Retry-After", 1))
+                SLACK_REQUESTS.labels(method, "ratelimited").inc()
+                # hold back every request sharing these limits, not just this one
+                for bucket in buckets:
+                    bucket.pause(retry_after)
+                if attempt == SLACK_MAX_RETRIES or retry_after > SLACK_MAX_WAIT:
+                    raise SlackError(method, "ratelimited", retry_after)
+                await asyncio.sleep(retry_after + self._jitter())
+                continue
+
+            if response.status_code >= 500:
+                SLACK_REQUESTS.labels(method, "server_error").inc()
+                if attempt == SLACK_MAX_RETRIES:
+                    raise SlackError(method, f"http_{response.status_code}")
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            body = response.json()
+            if not body.get("ok"):
+                SLACK_REQUESTS.labels(method, "error").inc()
+                raise SlackError(method, body.get("error", "unknown_error"))
+            SLACK_REQUESTS.labels(method, "ok").inc()
+            return body
+
+    def _get_buckets(
+        self, method: str, token: Optional[str], team_id: Optional[str]
+    ) -> list[TokenBucket]:
+        limits = SLACK_RATE_LIMITS.get(method)
+        if not limits:
+            return []
+        keys = []
+        if token:
+            keys.append((method, "token", token_key(token), limits[0]))
+        if team_id:
+            keys.append((method, "team", team_id, limits[1]))
+
+        buckets = []
+        for *key, per_minute in keys:
+            key = tuple(key)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(rate=per_minute / 60, capacity=per_minute)
+            # refresh the bucket's ttl, so buckets in use aren't dropped
+            self._buckets.set(key, bucket)
+            buckets.append(bucket)
+        return buckets
+
+    async def _acquire(self, method: str, buckets: list[TokenBucket]):
+        waits = [bucket.reserve() for bucket in buckets]
+        wait = max(waits, default=0.0)
+        if wait > SLACK_MAX_WAIT:
+            for bucket in buckets:
+                bucket.release()
+            SLACK_REQUESTS.labels(method, "throttled").inc()
+            raise SlackError(method, "ratelimited", wait)
+        if wait > 0:
+            SLACK_RATE_LIMIT_WAIT.labels(method).inc(wait)
+            await asyncio.sleep(wait)
+
+    def _backoff(self, attempt: int) -> float:
+        return 2**attempt * 0.5 + self._jitter()
+
+    def _jitter(self) -> float:
+        return random.uniform(0, SLACK_RETRY_JITTER)
+
+
+slack_client = SlackClient()
@@ -0,0 +1,150 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Optional
+from src.models import StatusEvent, User
+from src.database import get_status_events_by_ids, get_users_by_ids
+
+# How long sync requests are collected before being run as a batch
+SYNC_BATCH_WINDOW = float(os.environ.get("SYNC_BATCH_WINDOW_MS", 50)) / 1000
+# Batches are run as soon as they reach this size
+SYNC_BATCH_SIZE = int(os.environ.get("SYNC_BATCH_SIZE", 100))
+# Max number of Slack updates in flight at once, across all batches
+SYNC_CONCURRENCY = int(os.environ.get("SYNC_CONCURRENCY", 32))
+# How long a claimed sync holds off duplicate syncs of the same status event;
+# longer than a Slack update can take, including waiting out rate limits
+SYNC_CLAIM_TTL = timedelta(seconds=int(os.environ.get("SYNC_CLAIM_TTL", 120)))
+
+# called with the status event id, its status event, its user, and its user's status timeline
+ApplySync = Callable[
+    [str, Optional[StatusEvent], Optional[User], Optional[Any]], Awaitable[Any]
+]
+# Returns the user id for syncs that aren't for a stored status event (i.e., status rule matches)
+UserIdOf = Callable[[str], Optional[str]]
+# Returns the status timelines of the given users (see timeline.get_status_timelines)
+LoadTimelines = Callable[[list[str]], Awaitable[dict[str, Any]]]
+
+
+# Coalesces status event syncs that arrive together (i.e., every meeting starting on the hour)
+# into batches: each batch loads all of its status events and users with a single bulk read each,
+# and each of its users' status timelines once, then applies the syncs through a bounded pool of
+# concurrent workers
+# each caller still gets back its own result (or exception)
+class SyncBatcher:
+    def __init__(
+        self,
+        apply: ApplySync,
+        window: float = SYNC_BATCH_WINDOW,
+        batch_size: int = SYNC_BATCH_SIZE,
+        concurrency: int = SYNC_CONCURRENCY,
+        user_id_of: UserIdOf = lambda status_event_id: None,
+        load_timelines: Optional[LoadTimelines] = None,
+    ):
+        self.apply = apply
+        self.user_id_of = user_id_of
+        self.load_timelines = load_timelines
+        self.window = window
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        # status event id -> futures waiting on its sync
+        # duplicate requests for the same event (i.e., retries) share a single sync
+        self._pending: dict[str, list[asyncio.Future]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # running batches, kept so they aren't garbage collected mid-run
+        self._batches: set[asyncio.Task] = set()
+
+    async def submit(self, status_event_id: str) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(status_event_id, []).append(future)
+
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        # batches are shared by every request in them, so they run in a fresh context
+        # instead of being traced as part of whichever request happened to start them
+        task = asyncio.create_task(self._run(batch), context=contextvars.Context())
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _run(self, batch: dict[str, list[asyncio.Future]]):
+        try:
+            user_ids = {self.user_id_of(id) for id in batch} - {None}
+            status_events = await get_status_events_by_ids(
+                [id for id in batch if not self.user_id_of(id)]
+            )
+            user_ids.update(event.user_id for event in status_events.values())
+            users = await get_users_by_ids(list(user_ids))
+            timelines = (
+                await self.load_timelines(list(users)) if self.load_timelines else {}
+            )
+        except Exception as e:
+            for futures in batch.values():
+                resolve(futures, exception=e)
+            return
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_one(status_event_id: str, futures: list[asyncio.Future]):
+            status_event = status_events.get(status_event_id)
+            user_id = (
+                status_event.user_id
+                if status_event
+                else self.user_id_of(status_event_id)
+            )
+            user = users.get(user_id) if user_id else None
+            async with self._semaphore:
+                try:
+                    result = await self.apply(
+                        status_event_id, status_event, user, timelines.get(user_id)
+                    )
+                except Exception as e:
+                    resolve(futures, exception=e)
+                else:
+                    resolve(futures, result=result)
+
+        await asyncio.gather(*[run_one(id, futures) for id, futures in batch.items()])
+
+
+def resolve(
+    futures: list[asyncio.Future],
+    result: Any = None,
+    exception: Optional[BaseException] = None,
+):
+    for future in futures:
+        # the caller may have gone away (i.e., the request was cancelled)
+        if future.done():
+            continue
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+
+# The Slack profile fields a status event sets
+def slack_profile(event: StatusEvent) -> dict:
+    return {
+        "status_text": event.status_text,
+        "status_emoji": f":{event.status_emoji.name}:" if event.status_emoji else "",
+        "status_expiration": event.status_expiration,
+    }
+
+
+# Digest of a Slack profile, to tell whether it was already applied
+def profile_digest(profile: dict) -> str:
+    return hashlib.sha256(json.dumps(profile, sort_keys=True).encode()).hexdigest()
@@ -0,0 +1,226 @@
+import asyncio
+import bisect
+import hashlib
+import heapq
+import os
+from datetime import datetime, timezone
+from typing import Callable, NamedTuple, Optional
+from src.models import StatusEvent
+from src.cache import TTLCache
+from src.database import (
+    get_status_events_by_user,
+    get_status_timeline_syncs,
+    get_status_timeline_versions,
+)
+from src.sync import slack_profile, profile_digest
+from src.rules import is_rule_status_event_id, get_rule_status_events
+from src.utils import to_utc
+
+# Which status event is shown when status events for the same user overlap:
+# "latest_start": the one that started most recently (i.e., a meeting booked inside a longer block)
+# "earliest_start": the one that started first, until it ends
+# "shortest": the shortest one
+STATUS_PRIORITY_RULE = os.environ.get("STATUS_PRIORITY_RULE", "latest_start")
+
+# Status timelines are updated in place when this instance creates, updates, or deletes status events;
+# timelines on other instances may be stale for up to STATUS_TIMELINE_CACHE_TTL seconds after a change
+# (reschedules catch that from the timeline's version, and reload it)
+STATUS_TIMELINE_CACHE_TTL = float(os.environ.get("STATUS_TIMELINE_CACHE_TTL", 60))
+STATUS_TIMELINE_CACHE_SIZE = int(os.environ.get("STATUS_TIMELINE_CACHE_SIZE", 10000))
+status_timeline_cache = TTLCache(
+    "status_timelines",
+    max_size=STATUS_TIMELINE_CACHE_SIZE,
+    ttl=STATUS_TIMELINE_CACHE_TTL,
+)
+
+
+# Priority of a status event (higher wins), for each rule
+# status events set up by hand always win over the ones created by status rules
+PriorityRule = Callable[[StatusEvent], tuple]
+PRIORITY_RULES: dict[str, PriorityRule] = {
+    "latest_start": lambda event: (
+        to_utc(event.start).timestamp(),
+        -to_utc(event.end).timestamp(),
+    ),
+    "earliest_start": lambda event: (
+        -to_utc(event.start).timestamp(),
+        to_utc(event.end).timestamp(),
+    ),
+    "shortest": lambda event: (
+        -(to_utc(event.end) - to_utc(event.start)).total_seconds(),
+        to_utc(event.start).timestamp(),
+    ),
+}
+
+
+# A span of time where a single status event is shown
+class Segment(NamedTuple):
+    start: datetime
+    end: datetime
+    status_event: StatusEvent
+
+    # The status event as it should be synced for this segment;
+    # it expires when the segment ends, whether that's at the status event's end or when another one takes over
+    def effective_status_event(self) -> StatusEvent:
+        return self.status_event.model_copy(
+            update={"status_expiration": self.end.timestamp()}
+        )
+
+    # Identifies the sync for this segment; changes whenever the segment's span or status does,
+    # so only segments that actually changed are rescheduled
+    @property
+    def key(self) -> str:
+        digest = profile_digest(slack_profile(self.effective_status_event()))
+        return f"{self.status_event.id}-{int(self.start.timestamp())}-{digest[:16]}"
+
+
+# Index of a user's status events, sorted by start time,
+# which resolves overlapping status events into the timeline of statuses actually shown
+# version is the stored version of the timeline (see database.get_status_timeline_syncs) its status events
+# are at least as new as
+class StatusTimeline:
+    def __init__(
+        self,
+        status_events: Optional[list[StatusEvent]] = None,
+        rule: str = STATUS_PRIORITY_RULE,
+        version: int = 0,
+    ):
+        if rule not in PRIORITY_RULES:
+            raise ValueError(f"Unknown status priority rule: {rule}")
+        self.priority = PRIORITY_RULES[rule]
+        self.version = version
+        # (start, id), sorted
+        self._order: list[tuple[datetime, str]] = []
+        self._events: dict[str, StatusEvent] = {}
+        for event in status_events or []:
+            self.add(event)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    # Adds a status event, or replaces it if it's already in the timeline
+    def add(self, event: StatusEvent):
+        self.remove(event.id)
+        event = event.model_copy(
+            update={"start": to_utc(event.start), "end": to_utc(event.end)}
+        )
+        self._events[event.id] = event
+        bisect.insort(self._order, (event.start, event.id))
+
+    def remove(self, status_event_id: str):
+        event = self._events.pop(status_event_id, None)
+        if event:
+            index = bisect.bisect_left(self._order, (event.start, event.id))
+            del self._order[index]
+
+    # Replaces every status event created by status rules
+    def set_rule_status_events(self, status_events: list[StatusEvent]):
+        for id in [id for id in self._events if is_rule_status_event_id(id)]:
+            self.remove(id)
+        for event in status_events:
+            self.add(event)
+
+    # Returns the segments of the timeline that haven't ended by a given time, in order
+    # sweeps the start and end times of the status events, keeping the ones in progress
+    # in a heap by priority; consecutive spans where the same status event wins are merged
+    def segments(self, after: datetime) -> list[Segment]:
+        after = to_utc(after)
+        events = [
+            self._events[id] for _, id in self._order if self._events[id].end > after
+        ]
+        boundaries = sorted(
+            {event.start for event in events} | {event.end for event in events}
+        )
+
+        segments: list[Segment] = []
+        active = []
+        next_event = 0
+        for start, end in zip(boundaries, boundaries[1:]):
+            while next_event < len(events) and events[next_event].start <= start:
+                event = events[next_event]
+                priority = (
+                    is_rule_status_event_id(event.id),
+                    *(-value for value in self.priority(event)),
+                )
+                heapq.heappush(active, (priority, event.id, event))
+                next_event += 1
+            # drop status events that have ended
+            while active and active[0][2].end <= start:
+                heapq.heappop(active)
+            if not active:
+                continue
+            winner = active[0][2]
+            if (
+                segments
+                and segments[-1].status_event.id == winner.id
+                and segments[-1].end == start
+            ):
+                segments[-1] = segments[-1]._replace(end=end)
+            else:
+                segments.append(Segment(start, end, winner))
+        return [segment for segment in segments if segment.end > after]
+
+    # Digest of the status events that haven't ended by a given time (their ids, spans and statuses),
+    # which changes whenever they do, even if none of the segments they're shown in did
+    # (i.e., a status event hidden behind another one was deleted)
+    def digest(self, after: datetime) -> str:
+        after = to_utc(after)
+        digest = hashlib.sha256()
+        for start, id in self._order:
+            event = self._events[id]
+            if event.end <= after:
+                continue
+            profile = profile_digest(slack_profile(event))
+            digest.update(
+                f"{id}:{start.timestamp()}:{event.end.timestamp()}:{profile}\n".encode()
+            )
+        return digest.hexdigest()
+
+    # Returns the segment shown at a given time, if any
+    def segment_at(self, time: datetime) -> Optional[Segment]:
+        time = to_utc(time)
+        for segment in self.segments(after=time):
+            return segment if segment.start <= time else None
+        return None
+
+
+# Returns the user's status timeline, from the cache or loaded from Firestore
+async def get_status_timeline(user_id: str) -> StatusTimeline:
+    return await status_timeline_cache.get_or_load(
+        user_id, lambda: load_status_timeline(user_id)
+    )
+
+
+# Returns the status timelines of several users (i.e., everyone in a batch of syncs)
+# their versions are read with a single bulk read; cached timelines are reused while their version is
+# current, and only the rest are loaded (each once, along with the status events from its user's rules)
+async def get_status_timelines(user_ids: list[str]) -> dict[str, StatusTimeline]:
+    versions = await get_status_timeline_versions(user_ids)
+    timelines = {}
+    for user_id, version in versions.items():
+        cached = status_timeline_cache.get(user_id)
+        if cached is not None and cached.version == version:
+            timelines[user_id] = cached
+    stale = [user_id for user_id in versions if user_id not in timelines]
+    loaded = await asyncio.gather(
+        *[load_status_timeline(user_id, versions[user_id]) for user_id in stale]
+    )
+    timelines.update(zip(stale, loaded))
+    return timelines
+
+
+# Loads the user's status timeline from Firestore (along with the status events from their rules),
+# replacing any cached copy
+# the version (unless already read) is read before the status events, so they're at least as new as it
+async def load_status_timeline(
+    user_id: str, version: Optional[int] = None
+) -> StatusTimeline:
+    if version is None:
+        _, version, _ = await get_status_timeline_syncs(user_id)
+    status_events, rule_status_events = await asyncio.gather(
+        get_status_events_by_user(user_id, ending_after=datetime.now(timezone.utc)),
+        get_rule_status_events(user_id),
+    )
+    timeline = StatusTimeline(status_events + rule_status_events, version=version)
+    status_timeline_cache.set(user_id, timeline)
+    return timeline
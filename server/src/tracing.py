@@ -0,0 +1,294 @@
+import contextvars
+import json
+import os
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+# File sampled requests' spans are appended to, one OTLP/JSON ExportTraceServiceRequest per line
+# (readable by the OpenTelemetry Collector's otlpjsonfile receiver); spans aren't exported if unset
+TRACE_EXPORT_PATH = os.environ.get("TRACE_EXPORT_PATH")
+# Fraction of requests whose spans are exported; requests whose traceparent header is sampled are always exported
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", 0.01))
+TRACE_SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "slack-status-sync-server")
+
+# Order of the entries in Server-Timing headers; anything else timed during a request follows these
+SERVER_TIMING_ORDER = (
+    "auth",
+    "user",
+    "firestore",
+    "calendar",
+    "tokeninfo",
+    "firebase_keys",
+    "cloud_tasks",
+    "slack",
+)
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_CODE_ERROR = 2
+
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+# Everything timed while handling a single request: totals per name (for the Server-Timing header),
+# and, if the request is sampled, every span (for export)
+class Trace:
+    def __init__(
+        self,
+        name: str,
+        sampled: bool,
+        trace_id: Optional[str] = None,
+        parent_span_id: Optional[str] = None,
+    ):
+        self.name = name
+        self.sampled = sampled
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        # name -> [total seconds, count]
+        self.timings: dict[str, list] = {}
+        self.spans: list[dict] = []
+
+    def add(
+        self,
+        name: str,
+        seconds: float,
+        parent_span_id: Optional[str],
+        span_id: Optional[str] = None,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: Optional[dict] = None,
+        exception: Optional[BaseException] = None,
+    ):
+        timing = self.timings.setdefault(name, [0.0, 0])
+        timing[0] += seconds
+        timing[1] += 1
+        if not self.sampled:
+            return
+        end_ns = time.time_ns()
+        self.spans.append(
+            otlp_span(
+                self.trace_id,
+                span_id or secrets.token_hex(8),
+                parent_span_id or self.span_id,
+                name,
+                end_ns - int(seconds * 1e9),
+                end_ns,
+                kind,
+                attributes,
+                exception,
+            )
+        )
+
+    # Server-Timing header value, i.e. `auth;dur=1.2, firestore;dur=20.4;desc="3 calls", total;dur=25.0`
+    def server_timing(self) -> str:
+        names = sorted(
+            self.timings,
+            key=lambda name: (
+                SERVER_TIMING_ORDER.index(name)
+                if name in SERVER_TIMING_ORDER
+                else len(SERVER_TIMING_ORDER)
+            ),
+        )
+        entries = []
+        for name in names:
+            seconds, count = self.timings[name]
+            entry = f"{name};dur={seconds * 1000:.1f}"
+            if count > 1:
+                entry += f';desc="{count} calls"'
+            entries.append(entry)
+        entries.append(f"total;dur={(time.perf_counter() - self._start) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+# Span new spans are nested under (the request's own span if unset)
+current_span_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "current_span_id", default=None
+)
+
+
+# Starts tracing the current request; everything timed in this context (and tasks started from it) is added to it
+# continues the caller's trace if the request has a W3C traceparent header
+def start_trace(name: str, traceparent: Optional[str] = None) -> Trace:
+    trace_id = parent_span_id = None
+    sampled = False
+    match = TRACEPARENT_PATTERN.match(traceparent or "")
+    if match:
+        trace_id, parent_span_id = match.group(1), match.group(2)
+        sampled = bool(int(match.group(3), 16) & 1)
+    sampled = bool(TRACE_EXPORT_PATH) and (
+        sampled or random.random() < TRACE_SAMPLE_RATE
+    )
+    trace = Trace(name, sampled, trace_id, parent_span_id)
+    current_trace.set(trace)
+    current_span_id.set(None)
+    return trace
+
+
+# Ends a request's trace, exporting its spans if it's sampled
+def finish_trace(
+    trace: Trace,
+    attributes: Optional[dict] = None,
+    exception: Optional[BaseException] = None,
+):
+    if not trace.sampled:
+        return
+    root = otlp_span(
+        trace.trace_id,
+        trace.span_id,
+        trace.parent_span_id,
+        trace.name,
+        trace.start_ns,
+        time.time_ns(),
+        SPAN_KIND_SERVER,
+        attributes,
+        exception,
+    )
+    span_exporter.export([root, *trace.spans])
+
+
+# Times a step of handling a request (i.e., auth), nesting anything timed inside it under its span
+@asynccontextmanager
+async def span(name: str, **attributes):
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    span_id = secrets.token_hex(8)
+    parent_span_id = current_span_id.get()
+    token = current_span_id.set(span_id)
+    start = time.perf_counter()
+    exception = None
+    try:
+        yield
+    except BaseException as e:
+        exception = e
+        raise
+    finally:
+        current_span_id.reset(token)
+        trace.add(
+            name,
+            time.perf_counter() - start,
+            parent_span_id,
+            span_id=span_id,
+            attributes=attributes,
+            exception=exception,
+        )
+
+
+# Adds a call to another service (timed by metrics.timed) to the current request's trace, if there is one
+def record_upstream(
+    upstream: str,
+    operation: str,
+    seconds: float,
+    exception: Optional[BaseException],
+):
+    trace = current_trace.get()
+    if trace is None:
+        return
+    trace.add(
+        upstream,
+        seconds,
+        current_span_id.get(),
+        kind=SPAN_KIND_CLIENT,
+        attributes={"operation": operation},
+        exception=exception,
+    )
+
+
+def otlp_span(
+    trace_id: str,
+    span_id: str,
+    parent_span_id: Optional[str],
+    name: str,
+    start_ns: int,
+    end_ns: int,
+    kind: int,
+    attributes: Optional[dict],
+    exception: Optional[BaseException],
+) -> dict:
+    span = {
+        "traceId": trace_id,
+        "spanId": span_id,
+        "name": name,
+        "kind": kind,
+        # 64 bit integers are strings in OTLP/JSON
+        "startTimeUnixNano": str(start_ns),
+        "endTimeUnixNano": str(end_ns),
+        "attributes": otlp_attributes(attributes or {}),
+    }
+    if parent_span_id:
+        span["parentSpanId"] = parent_span_id
+    if exception is not None:
+        span["status"] = {
+            "code": STATUS_CODE_ERROR,
+            "message": f"{type(exception).__name__}: {exception}",
+        }
+    return span
+
+
+def otlp_attributes(attributes: dict) -> list[dict]:
+    values = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            values.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            values.append({"key": key, "value": {"intValue": str(value)}})
+        else:
+            values.append({"key": key, "value": {"stringValue": str(value)}})
+    return values
+
+
+# Appends spans to TRACE_EXPORT_PATH from a background thread, so requests never wait on the file
+class SpanExporter:
+    def __init__(self, path: Optional[str] = TRACE_EXPORT_PATH):
+        self.path = path
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, spans: list[dict]):
+        if not self.path:
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, daemon=True)
+                    self._thread.start()
+        self._queue.put(spans)
+
+    def _run(self):
+        resource = {"attributes": otlp_attributes({"service.name": TRACE_SERVICE_NAME})}
+        scope = {"name": "slack-status-sync"}
+        while True:
+            spans = self._queue.get()
+            line = json.dumps(
+                {
+                    "resourceSpans": [
+                        {
+                            "resource": resource,
+                            "scopeSpans": [{"scope": scope, "spans": spans}],
+                        }
+                    ]
+                }
+            )
+            try:
+                with open(self.path, "a") as file:
+                    file.write(line + "\n")
+            except Exception as e:
+                print(e)
+
+
+span_exporter = SpanExporter()
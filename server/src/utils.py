@@ -0,0 +1,20 @@
+import functools
+import ssl
+from datetime import datetime, timezone
+import httpx
+
+
+# Helper to convert a timestamp to utc
+def to_utc(dt: datetime) -> datetime:
+    # if the timestamp is not tz-aware, make it tz-aware to utc
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    # if the timestamp is tz-aware, convert it to utc
+    return dt.astimezone(timezone.utc)
+
+
+# Loading the CA bundle into an SSL context takes tens of milliseconds,
+# so every httpx client shares one instead of loading its own on startup
+@functools.cache
+def ssl_context() -> ssl.SSLContext:
+    return httpx.create_ssl_context()
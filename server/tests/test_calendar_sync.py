@@ -0,0 +1,67 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pydantic
+import pytest
+import src.database as database
+from bench.fake_firestore import FakeFirestore
+from src.database import calendar_sync_cache, get_calendar_sync, put_calendar_sync
+from src.models import CalendarEvent, CalendarSync
+
+START = datetime(2025, 1, 6, 9, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def db(monkeypatch):
+    fake = FakeFirestore()
+    monkeypatch.setattr(database, "db", fake)
+    calendar_sync_cache.clear()
+    return fake
+
+
+def event(id: str) -> CalendarEvent:
+    return CalendarEvent(
+        id=id,
+        calendar_id="primary",
+        summary=id,
+        description="",
+        start=START,
+        end=START + timedelta(hours=1),
+        all_day=False,
+    )
+
+
+def test_cached_sync_is_shared_and_its_events_are_frozen():
+    saved = asyncio.run(
+        put_calendar_sync(
+            CalendarSync(
+                id="",
+                user_id="user",
+                calendar_id="primary",
+                sync_token="token",
+                window_end=START + timedelta(days=30),
+                events={"a": event("a")},
+            )
+        )
+    )
+    sync = asyncio.run(get_calendar_sync("user", "primary"))
+    assert sync is saved
+    with pytest.raises(pydantic.ValidationError):
+        sync.events["a"].summary = "changed"
+
+
+def test_sync_is_loaded_from_firestore_once():
+    asyncio.run(
+        put_calendar_sync(
+            CalendarSync(
+                id="",
+                user_id="user",
+                calendar_id="primary",
+                window_end=START,
+                events={"a": event("a")},
+            )
+        )
+    )
+    calendar_sync_cache.clear()
+    first = asyncio.run(get_calendar_sync("user", "primary"))
+    assert first.events == {"a": event("a")}
+    assert asyncio.run(get_calendar_sync("user", "primary")) is first
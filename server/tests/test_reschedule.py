@@ -0,0 +1,132 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+import src.database as database
+import src.server as server
+from bench.fake_firestore import FakeFirestore
+from src.database import get_status_timeline_syncs
+from src.models import StatusEvent
+from src.scheduler import Scheduler
+from src.timeline import StatusTimeline, status_timeline_cache
+
+
+class FakeScheduler(Scheduler):
+    def __init__(self):
+        # task id -> status event id
+        self.tasks: dict[str, str] = {}
+        self.cancelled: list[str] = []
+
+    async def schedule(self, status_event_id: str, at: datetime, task_id: str) -> str:
+        self.tasks[task_id] = status_event_id
+        return task_id
+
+    async def cancel(self, task_id: str):
+        self.tasks.pop(task_id, None)
+        self.cancelled.append(task_id)
+
+
+@pytest.fixture(autouse=True)
+def scheduler(monkeypatch):
+    monkeypatch.setattr(database, "db", FakeFirestore())
+    fake = FakeScheduler()
+    monkeypatch.setattr(server, "scheduler", fake)
+    status_timeline_cache.clear()
+    return fake
+
+
+def status_event(id: str, hours: int) -> StatusEvent:
+    start = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(hours=hours)
+    end = start + timedelta(minutes=30)
+    return StatusEvent(
+        id=id,
+        user_id="user",
+        calendar_id="primary",
+        event_id=id,
+        start=start,
+        end=end,
+        status_text=id,
+        status_expiration=end.timestamp(),
+    )
+
+
+# Adds a status event the way POST /status-events does, from a given copy of the timeline
+def add(timeline: StatusTimeline, status_event: StatusEvent):
+    timeline.add(status_event)
+    asyncio.run(
+        server.reschedule_status_syncs(
+            "user", timeline, new_status_events=[status_event]
+        )
+    )
+
+
+def scheduled_status_event_ids(scheduler: FakeScheduler) -> set[str]:
+    return set(scheduler.tasks.values())
+
+
+def cached_status_event_ids() -> set[str]:
+    timeline = status_timeline_cache.get("user")
+    return {
+        segment.status_event.id
+        for segment in timeline.segments(after=datetime.now(timezone.utc))
+    }
+
+
+def test_reschedule_bumps_the_timeline_version(scheduler):
+    timeline = StatusTimeline()
+    add(timeline, status_event("a", 1))
+    add(timeline, status_event("b", 2))
+    assert timeline.version == 2
+    assert asyncio.run(get_status_timeline_syncs("user"))[1] == 2
+    assert scheduled_status_event_ids(scheduler) == {"a", "b"}
+
+
+# another instance added a status event since this one cached the timeline:
+# its sync isn't cancelled, and it's part of the reloaded timeline
+def test_stale_timeline_is_reloaded_before_rescheduling(scheduler):
+    stale = StatusTimeline()
+    add(StatusTimeline(), status_event("a", 1))
+
+    add(stale, status_event("b", 2))
+    assert scheduler.cancelled == []
+    assert scheduled_status_event_ids(scheduler) == {"a", "b"}
+    assert asyncio.run(get_status_timeline_syncs("user"))[1] == 2
+    assert cached_status_event_ids() == {"a", "b"}
+    assert status_timeline_cache.get("user").version == 2
+
+
+def test_failed_reschedule_leaves_the_reloaded_timeline_unchanged(
+    scheduler, monkeypatch
+):
+    stale = StatusTimeline()
+    add(StatusTimeline(), status_event("a", 1))
+
+    async def fail(*args):
+        raise RuntimeError("write failed")
+
+    monkeypatch.setattr(server, "put_status_events_with_timeline_syncs", fail)
+    with pytest.raises(RuntimeError):
+        add(stale, status_event("b", 2))
+    assert cached_status_event_ids() == {"a"}
+    assert scheduled_status_event_ids(scheduler) == {"a"}
+
+
+def test_reschedule_that_changes_nothing_writes_nothing(scheduler):
+    timeline = StatusTimeline()
+    add(timeline, status_event("a", 1))
+    for _ in range(3):
+        asyncio.run(server.reschedule_status_syncs("user", timeline))
+    assert timeline.version == 1
+    assert asyncio.run(get_status_timeline_syncs("user"))[1] == 1
+
+
+# the syncs stay the same, but other instances' timelines still have the deleted status event
+def test_removing_a_hidden_status_event_bumps_the_version(scheduler):
+    timeline = StatusTimeline()
+    add(timeline, status_event("a", 1))
+    add(timeline, status_event("b", 1))
+    tasks = dict(scheduler.tasks)
+
+    timeline.remove("b")
+    asyncio.run(server.reschedule_status_syncs("user", timeline))
+    assert scheduler.tasks == tasks
+    assert timeline.version == 3
@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+import src.database as database
+from bench.fake_firestore import FakeFirestore
+from src.database import (
+    claim_sync_execution,
+    get_status_events_by_user,
+    get_status_events_page,
+    migrations_cache,
+)
+from src.retention import run
+
+
+@pytest.fixture(autouse=True)
+def db(monkeypatch):
+    fake = FakeFirestore()
+    monkeypatch.setattr(database, "db", fake)
+    migrations_cache.clear()
+    return fake
+
+
+# A status event as saved before start_at, end_at and expire_at were stored
+def legacy_status_event(db: FakeFirestore, id: str, end: datetime):
+    db.collections.setdefault("status_events", {})[id] = (
+        1,
+        {
+            "user_id": "user",
+            "calendar_id": "primary",
+            "event_id": id,
+            "start": (end - timedelta(minutes=30)).isoformat(),
+            "end": end.isoformat(),
+            "status_text": id,
+            "status_emoji": None,
+            "status_expiration": end.timestamp(),
+            "task_id": None,
+        },
+    )
+
+
+def test_status_events_without_end_at_are_found_until_backfilled(db):
+    now = datetime.now(timezone.utc)
+    legacy_status_event(db, "ended", now - timedelta(hours=1))
+    legacy_status_event(db, "upcoming", now + timedelta(hours=1))
+
+    status_events = asyncio.run(get_status_events_by_user("user", ending_after=now))
+    assert [event.id for event in status_events] == ["upcoming"]
+
+    asyncio.run(run(backfill=True))
+    assert "end_at" in db.collections["status_events"]["upcoming"][1]
+    status_events = asyncio.run(get_status_events_by_user("user", ending_after=now))
+    assert [event.id for event in status_events] == ["upcoming"]
+    assert asyncio.run(database.status_event_times_backfilled())
+
+
+def list_status_events(end_before: datetime) -> list[list[str]]:
+    pages, cursor = [], None
+    while True:
+        events, cursor = asyncio.run(
+            get_status_events_page(
+                "user", 2, cursor, end_before=end_before, fields=["status_text"]
+            )
+        )
+        pages.append([event["id"] for event in events])
+        if not cursor:
+            return pages
+
+
+def test_status_events_without_start_at_are_listed_until_backfilled(db):
+    now = datetime.now(timezone.utc)
+    for id, hours in [("c", 3), ("a", 1), ("b", 2), ("later", 6)]:
+        legacy_status_event(db, id, now + timedelta(hours=hours))
+
+    end_before = now + timedelta(hours=4)
+    assert list_status_events(end_before) == [["a", "b"], ["c"]]
+
+    asyncio.run(run(backfill=True))
+    assert list_status_events(end_before) == [["a", "b"], ["c"]]
+
+
+def claim(status_event_id: str):
+    start = datetime.now(timezone.utc)
+    return asyncio.run(
+        claim_sync_execution(
+            status_event_id, "user", 1, start, "digest", timedelta(minutes=2)
+        )
+    )
+
+
+# statuses created by rules aren't stored, so nothing else removes their execution records
+def test_expired_sync_executions_are_removed(db, monkeypatch):
+    claim("rule_user_current")
+    monkeypatch.setattr(database, "STATUS_EVENT_RETENTION", timedelta(days=-1))
+    claim("rule_user_old")
+
+    asyncio.run(run(backfill=False))
+    assert set(db.collections["sync_executions"]) == {"rule_user_current"}
+
+
+def test_backfill_adds_expire_at_to_sync_executions(db):
+    db.collections["sync_executions"] = {"rule_user_old": (1, {"state": "applied"})}
+    asyncio.run(run(backfill=True))
+    assert "expire_at" in db.collections["sync_executions"]["rule_user_old"][1]
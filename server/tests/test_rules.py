@@ -0,0 +1,73 @@
+import time
+from datetime import datetime, timedelta, timezone
+from src.models import CalendarEvent, StatusRule
+from src.rules import CompiledRules
+
+START = datetime(2025, 1, 6, 9, tzinfo=timezone.utc)
+
+
+def event(summary: str, calendar_id: str = "primary", all_day: bool = False):
+    return CalendarEvent(
+        id=summary,
+        calendar_id=calendar_id,
+        summary=summary,
+        description="",
+        start=START,
+        end=START + timedelta(hours=1),
+        all_day=all_day,
+    )
+
+
+def rule(id: str, **conditions) -> StatusRule:
+    return StatusRule(id=id, status_text=id, **conditions)
+
+
+def test_summary_pattern_matches_anywhere_case_insensitive():
+    rules = CompiledRules([rule("standup", summary_pattern="STANDUP")])
+    assert rules.match(event("Daily standup")) is not None
+    assert rules.match(event("Stand up")) is None
+
+
+def test_summary_pattern_wildcards():
+    rules = CompiledRules([rule("one_on_one", summary_pattern="1:1 * max")])
+    assert rules.match(event("1:1 with Max")) is not None
+    assert rules.match(event("1:1 Max")) is None
+
+    rules = CompiledRules([rule("q", summary_pattern="q? planning")])
+    assert rules.match(event("Q3 planning")) is not None
+    assert rules.match(event("Q planning")) is None
+
+
+# patterns aren't regular expressions, so regex syntax is matched literally
+def test_summary_pattern_is_not_a_regex():
+    rules = CompiledRules([rule("literal", summary_pattern="(a+)+$")])
+    assert rules.match(event("aaaa")) is None
+    assert rules.match(event("ping (a+)+$")) is not None
+
+
+# summaries come from whoever sends the invite, so no pattern can make matching blow up
+def test_summary_pattern_matches_in_linear_time():
+    rules = CompiledRules(
+        [
+            rule("nested", summary_pattern="*a*a*a*a*a*a*a*a*b"),
+            rule("any", summary_pattern="?*?*?*?*?*?*?*?*!"),
+        ]
+    )
+    start = time.perf_counter()
+    assert rules.match(event("a" * 10000)) is None
+    assert time.perf_counter() - start < 0.5
+
+
+def test_first_matching_rule_wins():
+    rules = CompiledRules(
+        [
+            rule("all_day", all_day=True),
+            rule("work", calendar_id="work"),
+            rule("focus", summary_pattern="focus"),
+            rule("fallback"),
+        ]
+    )
+    assert rules.match(event("Focus", all_day=True)).id == "all_day"
+    assert rules.match(event("Focus", calendar_id="work")).id == "work"
+    assert rules.match(event("Focus time")).id == "focus"
+    assert rules.match(event("Lunch")).id == "fallback"
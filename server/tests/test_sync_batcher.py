@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+import src.database as database
+from bench.fake_firestore import FakeFirestore
+from src.database import cache_user, put_status_events_with_timeline_syncs
+from src.models import StatusEvent, User
+from src.sync import SyncBatcher
+from src.timeline import get_status_timelines, status_timeline_cache
+
+
+@pytest.fixture(autouse=True)
+def db(monkeypatch):
+    fake = FakeFirestore()
+    monkeypatch.setattr(database, "db", fake)
+    status_timeline_cache.clear()
+    for id in ["alice", "bob"]:
+        cache_user(
+            User(
+                id=id,
+                firebase_user_id=id,
+                email=f"{id}@example.com",
+                display_name=id,
+            )
+        )
+    return fake
+
+
+def status_event(id: str, user_id: str) -> StatusEvent:
+    start = datetime.now(timezone.utc).replace(microsecond=0)
+    end = start + timedelta(minutes=30)
+    return StatusEvent(
+        id=id,
+        user_id=user_id,
+        calendar_id="primary",
+        event_id=id,
+        start=start,
+        end=end,
+        status_text=id,
+        status_expiration=end.timestamp(),
+    )
+
+
+def save(status_events: list[StatusEvent], user_id: str, version: int):
+    asyncio.run(
+        put_status_events_with_timeline_syncs(
+            status_events, user_id, {}, version, digest=""
+        )
+    )
+
+
+# Runs syncs for the given status events as a single batch, returning the timeline each sync was given
+def run_batch(status_event_ids: list[str]) -> dict[str, object]:
+    timelines = {}
+
+    async def apply(status_event_id, status_event, user, timeline):
+        timelines[status_event_id] = timeline
+        return {"ok": True}
+
+    batcher = SyncBatcher(
+        apply, window=0.01, batch_size=100, load_timelines=get_status_timelines
+    )
+
+    async def run():
+        await asyncio.gather(*[batcher.submit(id) for id in status_event_ids])
+
+    asyncio.run(run())
+    return timelines
+
+
+def test_each_user_timeline_is_loaded_once_per_batch(db):
+    save([status_event(f"a{i}", "alice") for i in range(5)], "alice", 1)
+    save([status_event("b", "bob")], "bob", 1)
+
+    timelines = run_batch(["a0", "a1", "a2", "a3", "a4", "b"])
+    assert len({id(timelines[f"a{i}"]) for i in range(5)}) == 1
+    assert len(timelines["a0"]) == 5
+    assert timelines["a0"].version == 1
+    assert len(timelines["b"]) == 1
+
+
+# once cached, a batch only reads its status events and its users' timeline versions
+def test_cached_timelines_are_reused_while_their_version_is_current(db):
+    save([status_event(f"a{i}", "alice") for i in range(5)], "alice", 1)
+    first = run_batch(["a0"])["a0"]
+
+    round_trips = db.round_trips
+    timelines = run_batch(["a1", "a2", "a3"])
+    assert db.round_trips - round_trips == 2
+    assert timelines["a1"] is first
+
+    # another instance changed alice's timeline
+    save([status_event("a5", "alice")], "alice", 2)
+    reloaded = run_batch(["a5"])["a5"]
+    assert reloaded is not first
+    assert reloaded.version == 2
+    assert len(reloaded) == 6
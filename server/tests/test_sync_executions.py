@@ -0,0 +1,175 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+import src.database as database
+from bench.fake_firestore import FakeFirestore
+from src.database import claim_sync_execution, complete_sync_execution
+from src.models import StatusEvent
+from src.sync import profile_digest, slack_profile
+from src.timeline import StatusTimeline
+
+CLAIM_TTL = timedelta(minutes=5)
+
+
+@pytest.fixture(autouse=True)
+def db(monkeypatch):
+    fake = FakeFirestore()
+    monkeypatch.setattr(database, "db", fake)
+    return fake
+
+
+def status_event(id: str, start: datetime, minutes: int) -> StatusEvent:
+    end = start + timedelta(minutes=minutes)
+    return StatusEvent(
+        id=id,
+        user_id="user",
+        calendar_id="primary",
+        event_id=id,
+        start=start,
+        end=end,
+        status_text=id,
+        status_expiration=end.timestamp(),
+    )
+
+
+# Runs a sync of whatever the timeline shows at a given time, the way apply_status_event_sync does
+# (without calling Slack), returning the claim's outcome
+def sync(timeline: StatusTimeline, time: datetime, complete: bool = True) -> str:
+    segment = timeline.segment_at(time)
+    status_event = segment.effective_status_event()
+    digest = profile_digest(slack_profile(status_event))
+
+    async def run():
+        outcome = await claim_sync_execution(
+            status_event.id,
+            "user",
+            timeline.version,
+            segment.start,
+            digest,
+            CLAIM_TTL,
+        )
+        if outcome == "claimed" and complete:
+            await complete_sync_execution(
+                status_event.id,
+                "user",
+                timeline.version,
+                segment.start,
+                digest,
+                status_event.status_expiration,
+            )
+        return outcome
+
+    return asyncio.run(run())
+
+
+def watermark(db: FakeFirestore) -> dict:
+    return db.collections["slack_watermarks"]["user"][1]
+
+
+# a block that started 75 minutes ago, with a meeting inside it that's in progress
+@pytest.fixture
+def now():
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+@pytest.fixture
+def block(now):
+    return status_event("block", now - timedelta(minutes=75), 120)
+
+
+@pytest.fixture
+def meeting(now):
+    return status_event("meeting", now - timedelta(minutes=15), 30)
+
+
+def test_retries_of_an_applied_sync_are_skipped(now, block):
+    timeline = StatusTimeline([block], version=1)
+    assert sync(timeline, now) == "claimed"
+    assert sync(timeline, now) == "applied"
+
+
+def test_unfinished_sync_is_in_progress(now, block):
+    timeline = StatusTimeline([block], version=1)
+    assert sync(timeline, now, complete=False) == "claimed"
+    assert sync(timeline, now) == "in_progress"
+
+
+def test_sync_from_the_same_timeline_starting_earlier_is_superseded(
+    db, now, block, meeting
+):
+    timeline = StatusTimeline([block, meeting], version=1)
+    assert sync(timeline, now) == "claimed"
+    assert watermark(db)["status_event_id"] == "meeting"
+    # i.e., a delayed sync for the block's first segment
+    assert sync(timeline, now - timedelta(minutes=30)) == "superseded"
+    assert watermark(db)["status_event_id"] == "meeting"
+
+
+def test_sync_setting_the_same_profile_is_unchanged(db, now, block):
+    assert sync(StatusTimeline([block], version=1), now) == "claimed"
+    # an unrelated change bumped the version; the block's status is already set
+    assert sync(StatusTimeline([block], version=2), now) == "unchanged"
+
+
+# the meeting inside the block is deleted while it's shown: the block's status has to come back,
+# even though its (merged) segment starts before the meeting's
+def test_deleting_the_status_shown_restores_the_one_under_it(db, now, block, meeting):
+    assert sync(StatusTimeline([block, meeting], version=1), now) == "claimed"
+
+    timeline = StatusTimeline([block], version=2)
+    assert sync(timeline, now) == "claimed"
+    assert watermark(db)["status_event_id"] == "block"
+    assert watermark(db)["version"] == 2
+
+    # a late sync resolved from the old timeline can't bring the meeting back
+    assert sync(StatusTimeline([block, meeting], version=1), now) != "claimed"
+    assert watermark(db)["status_event_id"] == "block"
+
+
+# same as above, but the block had already been applied with the exact same span before the meeting was
+# added, so only the timeline version tells the restored block apart from a retry
+def test_restored_status_with_the_same_profile_is_applied_again(
+    db, now, block, meeting
+):
+    alone = StatusTimeline([block], version=1)
+    assert sync(alone, now - timedelta(minutes=30)) == "claimed"
+    assert sync(StatusTimeline([block, meeting], version=2), now) == "claimed"
+    assert sync(StatusTimeline([block], version=3), now) == "claimed"
+    assert watermark(db)["status_event_id"] == "block"
+
+
+def test_watermarks_from_before_versions_are_ordered_first(db, now, block, meeting):
+    db.collections["slack_watermarks"] = {
+        "user": (
+            1,
+            {
+                "status_event_id": "meeting",
+                "digest": "old",
+                "start": meeting.start.isoformat(),
+                "expiration": meeting.end.timestamp(),
+            },
+        )
+    }
+    assert sync(StatusTimeline([block], version=1), now) == "claimed"
+
+
+def test_completing_an_older_sync_keeps_the_watermark(db, now, block, meeting):
+    newer = StatusTimeline([block, meeting], version=2)
+    older = StatusTimeline([block], version=1)
+    # both are claimed before either completes
+    assert sync(older, now, complete=False) == "claimed"
+    assert sync(newer, now) == "claimed"
+
+    segment = older.segment_at(now)
+    status_event = segment.effective_status_event()
+    asyncio.run(
+        complete_sync_execution(
+            status_event.id,
+            "user",
+            older.version,
+            segment.start,
+            profile_digest(slack_profile(status_event)),
+            status_event.status_expiration,
+        )
+    )
+    assert watermark(db)["status_event_id"] == "meeting"
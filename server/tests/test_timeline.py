@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from src.models import StatusEvent
+from src.rules import RULE_STATUS_EVENT_PREFIX
+from src.timeline import StatusTimeline
+
+NINE = datetime(2025, 1, 6, 9, tzinfo=timezone.utc)
+
+
+def status_event(id: str, start: datetime, minutes: int) -> StatusEvent:
+    end = start + timedelta(minutes=minutes)
+    return StatusEvent(
+        id=id,
+        user_id="user",
+        calendar_id="primary",
+        event_id=id,
+        start=start,
+        end=end,
+        status_text=id,
+        status_expiration=end.timestamp(),
+    )
+
+
+def at(minutes: int) -> datetime:
+    return NINE + timedelta(minutes=minutes)
+
+
+# (status event id, start, end) of every segment
+def spans(timeline: StatusTimeline, after: datetime = NINE - timedelta(days=1)):
+    return [
+        (segment.status_event.id, segment.start, segment.end)
+        for segment in timeline.segments(after=after)
+    ]
+
+
+def test_separate_status_events_each_get_a_segment():
+    timeline = StatusTimeline(
+        [status_event("b", at(60), 30), status_event("a", at(0), 30)]
+    )
+    assert spans(timeline) == [("a", at(0), at(30)), ("b", at(60), at(90))]
+
+
+def test_latest_start_shows_a_meeting_inside_a_longer_block():
+    timeline = StatusTimeline(
+        [status_event("a", at(0), 120), status_event("b", at(60), 30)],
+        rule="latest_start",
+    )
+    assert spans(timeline) == [
+        ("a", at(0), at(60)),
+        ("b", at(60), at(90)),
+        ("a", at(90), at(120)),
+    ]
+
+
+def test_earliest_start_keeps_the_first_status_event_until_it_ends():
+    timeline = StatusTimeline(
+        [status_event("a", at(0), 120), status_event("b", at(60), 90)],
+        rule="earliest_start",
+    )
+    assert spans(timeline) == [("a", at(0), at(120)), ("b", at(120), at(150))]
+
+
+def test_shortest_shows_the_shortest_status_event():
+    timeline = StatusTimeline(
+        [status_event("a", at(0), 60), status_event("b", at(30), 120)],
+        rule="shortest",
+    )
+    assert spans(timeline) == [("a", at(0), at(60)), ("b", at(60), at(150))]
+
+
+def test_status_events_set_by_hand_win_over_rules():
+    rule_event = status_event(f"{RULE_STATUS_EVENT_PREFIX}user_1", at(30), 30)
+    timeline = StatusTimeline([status_event("a", at(0), 120), rule_event])
+    assert spans(timeline) == [("a", at(0), at(120))]
+
+
+def test_segments_that_ended_are_dropped():
+    timeline = StatusTimeline(
+        [status_event("a", at(0), 120), status_event("b", at(60), 30)]
+    )
+    # the segment in progress keeps its start
+    assert spans(timeline, after=at(75)) == [
+        ("b", at(60), at(90)),
+        ("a", at(90), at(120)),
+    ]
+    assert timeline.segment_at(at(75)).status_event.id == "b"
+    assert timeline.segment_at(at(150)) is None
+
+
+def test_removing_a_status_event_merges_the_segments_around_it():
+    timeline = StatusTimeline(
+        [status_event("a", at(0), 120), status_event("b", at(60), 30)]
+    )
+    first = timeline.segments(after=at(0))[0]
+    timeline.remove("b")
+    assert spans(timeline) == [("a", at(0), at(120))]
+
+    merged = timeline.segments(after=at(0))[0]
+    # same start, but it now expires later, so it's a different sync
+    assert merged.key != first.key
+    assert merged.effective_status_event().status_expiration == at(120).timestamp()
+
+
+def test_adding_replaces_a_status_event_with_the_same_id():
+    timeline = StatusTimeline([status_event("a", at(0), 60)])
+    timeline.add(status_event("a", at(30), 60))
+    assert len(timeline) == 1
+    assert spans(timeline) == [("a", at(30), at(90))]
+
+
+def test_unknown_priority_rule():
+    with pytest.raises(ValueError):
+        StatusTimeline(rule="loudest")